@@ -0,0 +1,13 @@
+"""
+Server entry point: ``python3 backend`` from the project root.
+Analytics workers started with forkserver/spawn re-run the ``__main__``
+script unless it is a package ``__main__`` like this one, so the app is only
+imported by uvicorn and never rebuilt inside a worker.
+"""
+import os
+
+if __name__ == "__main__":
+    import uvicorn
+    from config import SERVER_PORT
+
+    uvicorn.run("api_server:app", host="0.0.0.0", port=int(os.getenv("PORT", SERVER_PORT)), reload=False)
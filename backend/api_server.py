@@ -3,15 +3,22 @@ Enhanced ProTrade API Server
 Optimized, Organized, and Simplified for high-performance trading analytics.
 """
 
+if __name__ == "__main__":
+    # `python3 backend/api_server.py`: hand over to the package entry point (backend/__main__.py)
+    # before anything is imported, so analytics workers do not re-run this file as their __main__
+    import runpy
+    from pathlib import Path
+    runpy.run_path(str(Path(__file__).resolve().parent), run_name="__main__")
+    raise SystemExit(0)
+
 import os
 import asyncio
 import logging
 import httpx
 import pandas as pd
-import io
 import socketio
-from datetime import datetime, date
-from typing import Any, Optional, List
+from datetime import date
+from typing import Any, Dict, Optional, List
 from contextlib import asynccontextmanager
 from logging.config import dictConfig
 from urllib.parse import unquote
@@ -20,44 +27,39 @@ import re
 from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from config import LOGGING_CONFIG, INITIAL_INSTRUMENTS, SERVER_PORT
+from config import LOGGING_CONFIG, INITIAL_INSTRUMENTS, API_CACHE_CONFIG, INTRADAY_BATCH_CONFIG
 from core import data_engine
-from core.provider_registry import initialize_default_providers, historical_data_registry, options_data_registry
+from core.socket_emitter import SocketJSONCodec
+from core.json_response import FastJSONResponse, dumps
+from core.api_cache import APICache
+from core.intraday_indicators import intraday_states, intraday_indicator_ids
+from core.analytics_pool import analytics_pool, pack_candles
+from core.db_export import db_exporter, ExportBusy, FORMATS as EXPORT_FORMATS
+from core.metrics import metrics
+from core.provider_registry import initialize_default_providers, historical_data_registry, options_data_registry, live_stream_registry
 from core.options_manager import options_manager
 from core.symbol_mapper import symbol_mapper
+from core.instrument_index import instrument_index
 from core.greeks_calculator import greeks_calculator
 from core.strategy_builder import strategy_builder, StrategyType
 from core.alert_system import alert_system, AlertType
 from brain.nse_confluence_scalper import scalper
 from external.tv_api import tv_api
 from external.tv_scanner import search_options
+from external.tick_replay import TickReplayProvider
 from db.local_db import db
+from db.gateway import db_gateway, QueryTimeout, MAINTENANCE
 
 # ==================== UTILS & CACHING ====================
 
-class APICache:
-    """Simple TTL cache to reduce redundant computations and DB queries."""
-    def __init__(self, ttl_seconds=60):
-        self.cache = {}
-        self.ttl = ttl_seconds
-
-    def get(self, key):
-        if key in self.cache:
-            val, ts = self.cache[key]
-            if datetime.now().timestamp() - ts < self.ttl:
-                return val
-            del self.cache[key]
-        return None
-
-    def set(self, key, value):
-        self.cache[key] = (value, datetime.now().timestamp())
-
 # Specialized caches
-hist_cache = APICache(ttl_seconds=30)
-pcr_cache = APICache(ttl_seconds=60)
+hist_cache = APICache("intraday", **API_CACHE_CONFIG.get("intraday", {}))
+pcr_cache = APICache("pcr", **API_CACHE_CONFIG.get("pcr", {}))
+option_streams_cache = APICache("symmetry_options", **API_CACHE_CONFIG.get("symmetry_options", {}))
+_provider_slots: Dict[str, asyncio.Semaphore] = {}
 
 def format_error(e: Exception, message: str = "Internal Server Error"):
     logging.error(f"{message}: {str(e)}")
@@ -87,7 +89,16 @@ async def lifespan(app: FastAPI):
     """Lifecycle management for the Trading Terminal."""
     logger.info("Initializing ProTrade Terminal Services...")
     global main_loop
+
+    # Analytics workers (forked from a clean fork server, not from this process)
+    analytics_pool.start()
     
+    # Instrument key <-> HRN index (memory-mapped snapshot, rebuilt if the metadata table changed)
+    try:
+        await db_gateway.run(instrument_index.load, priority=MAINTENANCE)
+    except Exception as e:
+        logger.error(f"Failed to load instrument index: {e}")
+
     # Sync instruments from Upstox in the background
     from core.instrument_manager import instrument_manager
     asyncio.create_task(instrument_manager.fetch_and_store_instruments())
@@ -108,12 +119,13 @@ async def lifespan(app: FastAPI):
     logger.info("Shutting down ProTrade Terminal...")
     try:
         await options_manager.stop()
-        data_engine.flush_tick_buffer()
+        data_engine.tick_writer.stop()
+        analytics_pool.stop()
     except Exception as e:
         logger.error(f"Shutdown error: {e}")
 
 fastapi_app = FastAPI(title="ProTrade Enhanced API", lifespan=lifespan)
-sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*', ping_timeout=60, ping_interval=25)
+sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*', ping_timeout=60, ping_interval=25, json=SocketJSONCodec)
 main_loop = None
 
 # SECURITY: Restricted CORS origins to prevent cross-site request forgery and unauthorized access
@@ -126,6 +138,10 @@ fastapi_app.add_middleware(
     allow_headers=["*"],
 )
 
+@fastapi_app.exception_handler(QueryTimeout)
+async def query_timeout_handler(request: Request, exc: QueryTimeout):
+    return FastJSONResponse({"status": "error", "message": str(exc)}, status_code=504)
+
 templates = Jinja2Templates(directory="backend/templates")
 
 # ==================== SOCKET.IO HANDLERS ====================
@@ -171,7 +187,29 @@ async def handle_unsubscribe(sid, data):
 
 @fastapi_app.get("/health")
 async def health_check():
-    return {"status": "healthy", "version": "3.0-optimized"}
+    return {
+        "status": "healthy",
+        "version": "3.0-optimized",
+        "ingestion": data_engine.tick_writer.stats(),
+        "emitter": data_engine.emitter.stats(),
+        "db": db.connections.stats(),
+        "query_cache": db.cache.stats(),
+        "db_gateway": db_gateway.stats(),
+        "instrument_index": instrument_index.stats(),
+        "api_cache": {
+            "intraday": hist_cache.stats(),
+            "pcr": pcr_cache.stats(),
+            "symmetry_options": option_streams_cache.stats(),
+        },
+        "intraday_indicators": intraday_states.stats(),
+        "analytics_pool": analytics_pool.stats(),
+        "db_export": db_exporter.stats(),
+    }
+
+@fastapi_app.get("/api/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Tick pipeline latency histograms, rates and queue depths (Prometheus text format)."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @fastapi_app.get("/api/tv/search")
 async def tv_search(text: str = Query(..., min_length=1)):
@@ -214,6 +252,207 @@ async def tv_search(text: str = Query(..., min_length=1)):
     
     return tv_results
 
+def provider_slot(provider) -> asyncio.Semaphore:
+    """Bounds concurrent historical fetches per provider (single and batch intraday requests)."""
+    name = type(provider).__name__
+    slot = _provider_slots.get(name)
+    if slot is None:
+        slot = _provider_slots[name] = asyncio.Semaphore(INTRADAY_BATCH_CONFIG.get("provider_concurrency", 4))
+    return slot
+
+async def fetch_intraday_candles(clean_key: str, interval: str) -> tuple:
+    """(candles, is_index) from the first historical provider that returns data."""
+    candles = []
+
+    # Prioritize Upstox for BSE (delay) and all Indices (speed/sync)
+    providers = historical_data_registry.get_all()
+    hrn = symbol_mapper.get_hrn(clean_key)
+    is_index = "INDEX" in clean_key or hrn in ["NIFTY", "BANKNIFTY", "FINNIFTY", "INDIA VIX"] or "BSE:" in clean_key
+    if is_index:
+        providers = sorted(providers, key=lambda p: 20 if "Upstox" in type(p).__name__ else 10, reverse=True)
+
+    for provider in providers:
+        try:
+            async with provider_slot(provider):
+                candles = await provider.get_hist_candles(clean_key, interval, 1000)
+            if candles and len(candles) > 0:
+                break
+        except Exception as e:
+            logger.warning(f"Historical provider {type(provider).__name__} failed: {e}")
+            continue
+    return candles, is_index
+
+async def atm_option_streams(ce_sym: str, pe_sym: str) -> tuple:
+    """
+    (ce_candles, pe_candles, oi_dict) for a CE/PE pair. Shared through a short-lived
+    cache so concurrent charts of the same underlying fetch the options once.
+    """
+    async def compute():
+        # Fetch candles for CE and PE in parallel
+        primary = historical_data_registry.get_primary()
+        async with provider_slot(primary):
+            ce_candles, pe_candles = await asyncio.gather(primary.get_hist_candles(ce_sym, '1', 1000),
+                                                          primary.get_hist_candles(pe_sym, '1', 1000))
+        # Fetch OI change data from DuckDB for 'Panic' filter
+        oi_dict = {}
+        if ce_candles and pe_candles:
+            try:
+                # Match timestamps to candle granularity (1m)
+                snaps = await db_gateway.query("""
+                    SELECT timestamp, symbol, oi_change FROM options_snapshots
+                    WHERE symbol IN (?, ?)
+                    ORDER BY timestamp ASC
+                """, (ce_sym, pe_sym))
+                for s in snaps:
+                    ts = int(pd.to_datetime(s['timestamp']).timestamp())
+                    if ts not in oi_dict: oi_dict[ts] = {}
+                    if s['symbol'] == ce_sym: oi_dict[ts]['ce_oi_chg'] = s['oi_change']
+                    else: oi_dict[ts]['pe_oi_chg'] = s['oi_change']
+            except Exception as e:
+                logger.warning(f"OI Data fetch failed for symmetry: {e}")
+        return ce_candles, pe_candles, oi_dict
+
+    return await option_streams_cache.get_or_compute((ce_sym, pe_sym), compute, cacheable=lambda r: bool(r[0] and r[1]))
+
+async def symmetry_indicator(clean_key: str, candles: list) -> Optional[Dict[str, Any]]:
+    """Triple-Stream Symmetry & Panic markers for an index chart (ATM CE/PE candles plus OI change)."""
+    try:
+        # Determine ATM strike
+        last_spot = candles[-1][4]
+        strike_interval = 50 if "NIFTY" in clean_key and "BANK" not in clean_key else 100
+        atm_strike = round(last_spot / strike_interval) * strike_interval
+
+        # Ensure symbols are cached
+        if clean_key not in options_manager.symbol_map_cache:
+            await options_manager._refresh_wss_symbols(clean_key)
+
+        ce_sym = options_manager.symbol_map_cache.get(clean_key, {}).get(f"{float(atm_strike)}_call") or \
+                 options_manager.symbol_map_cache.get(clean_key, {}).get(f"{int(atm_strike)}_call")
+        pe_sym = options_manager.symbol_map_cache.get(clean_key, {}).get(f"{float(atm_strike)}_put") or \
+                 options_manager.symbol_map_cache.get(clean_key, {}).get(f"{int(atm_strike)}_put")
+
+        if ce_sym and pe_sym:
+            ce_candles, pe_candles, oi_dict = await atm_option_streams(ce_sym, pe_sym)
+            if ce_candles and pe_candles:
+                symmetry_signals = await analytics_pool.run('symmetry', clean_key, pack_candles(candles),
+                                                            pack_candles(ce_candles), pack_candles(pe_candles), oi_dict)
+
+                if symmetry_signals:
+                    sym_markers = []
+                    for sig in symmetry_signals:
+                        sym_markers.append({
+                            "time": int(sig['time']),
+                            "position": "belowBar" if sig['type'] == 'BUY_CE' else "aboveBar",
+                            "color": "#10b981" if sig['type'] == 'BUY_CE' else "#ef4444",
+                            "shape": "arrowUp" if sig['type'] == 'BUY_CE' else "arrowDown",
+                            "text": f"SYM:{sig['type']} (S:{sig['score']})",
+                            "id": f"sym_{sig['time']}_{sig['type']}",
+                            "sl": sig.get('sl'),
+                            "tp": sig.get('tp'),
+                            "score": sig.get('score'),
+                            "signal_type": sig['type'],
+                            "entry_price": sig.get('price')
+                        })
+
+                    return {
+                        "id": "symmetry_signals", "type": "markers", "title": "Symmetry Signals",
+                        "data": sym_markers
+                    }
+    except Exception as e:
+        logger.error(f"Symmetry analysis error for {clean_key}: {e}")
+    return None
+
+def clean_instrument_key(instrument_key: str) -> str:
+    """URL-decoded, upper-case instrument key (``nse%3Anifty`` -> ``NSE:NIFTY``)."""
+    return unquote(str(instrument_key)).upper()
+
+async def intraday_payload(clean_key: str, interval: str, requested: List[str], settings: Dict[str, Any]) -> Dict[str, Any]:
+    """Candles plus the requested indicators for one chart (uncached); ``clean_key`` is already normalised."""
+    try:
+        # Use registry for historical data with automatic fallback
+        candles, is_index = await fetch_intraday_candles(clean_key, interval)
+
+        if not candles:
+            return {"status": "error", "message": "No historical data available from any provider"}
+
+        indicators = []
+        engine_ids = [i for i in requested if i != 'symmetry_signals']
+        # Sort candles once ascending (oldest first)
+        candles = sorted(candles, key=lambda x: x[0])
+        # Symmetry analysis (options fetch + process pool) runs alongside the indicator
+        # engine, whose per-chart state only recomputes appended/amended candles
+        symmetry_task = None
+        if is_index and interval == '1' and 'symmetry_signals' in requested:
+            symmetry_task = asyncio.create_task(symmetry_indicator(clean_key, candles))
+        state = intraday_states.get((clean_key, interval, tuple(sorted(settings.items()))), settings)
+        engine_indicators, rvol = await asyncio.to_thread(state.compute, candles, engine_ids)
+        indicators.extend(engine_indicators)
+        if symmetry_task is not None:
+            symmetry = await symmetry_task
+            if symmetry:
+                indicators.append(symmetry)
+
+        # RVOL column for candle coloring
+        if rvol and 'rvol' in requested:
+            candles = [list(c) + [r] for c, r in zip(candles, rvol)]
+
+        return {"instrumentKey": clean_key, "hrn": symbol_mapper.get_hrn(clean_key), "candles": candles, "indicators": indicators}
+    except Exception as e: return format_error(e, "Intraday fetch failed")
+
+async def cached_intraday(instrument_key: str, interval: str, requested: List[str], settings: Dict[str, Any]) -> Dict[str, Any]:
+    clean_key = clean_instrument_key(instrument_key)
+    # Cache key covers every request parameter, with the key normalised so nse:nifty, NSE:NIFTY
+    # and NSE%3ANIFTY share one entry
+    cache_key = ("intraday", clean_key, interval, tuple(requested), tuple(sorted(settings.items())))
+    # Concurrent requests for the same chart share one provider fetch; errors are not cached
+    return await hist_cache.get_or_compute(cache_key, lambda: intraday_payload(clean_key, interval, requested, settings),
+                                           cacheable=lambda r: r.get("status") != "error")
+
+def intraday_settings(**values) -> Dict[str, Any]:
+    """Analyzer settings overrides, without unset values."""
+    return {k: v for k, v in values.items() if v is not None}
+
+@fastapi_app.post("/api/tv/intraday/batch")
+async def get_intraday_batch(req: Request):
+    """
+    Many charts in one request: {"instruments": [...], "intervals": ["1", "5"], "indicators": ...,
+    plus the /api/tv/intraday settings}. Every instrument x interval is fetched with bounded
+    concurrency and streamed back as NDJSON, one {"instrument_key", "interval", ...payload}
+    line per chart as soon as it completes. Keys are normalised (URL-decoded, upper-case), so
+    spellings of the same instrument are fetched once.
+    """
+    b = await req.json()
+    instruments = [clean_instrument_key(k) for k in (b.get('instruments') or []) if k]
+    intervals = [str(i) for i in (b.get('intervals') or ['1'])]
+    if not instruments: raise HTTPException(400, "instruments required")
+    charts = list(dict.fromkeys((k, i) for k in instruments for i in intervals))
+    max_items = INTRADAY_BATCH_CONFIG.get("max_items", 80)
+    if len(charts) > max_items: raise HTTPException(400, f"At most {max_items} instrument/interval pairs per batch")
+    try:
+        requested = intraday_indicator_ids(b.get('indicators'), b.get('ema_9'), b.get('ema_20'))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    settings = intraday_settings(**{k: b.get(k) for k in ('rvol_len', 'rvol_threshold', 'bubble_threshold', 'ray_wick_ratio', 'max_rays')})
+
+    slots = asyncio.Semaphore(INTRADAY_BATCH_CONFIG.get("concurrency", 8))
+
+    async def chart(instrument_key: str, interval: str):
+        async with slots:
+            return instrument_key, interval, await cached_intraday(instrument_key, interval, requested, settings)
+
+    async def stream():
+        tasks = [asyncio.create_task(chart(k, i)) for k, i in charts]
+        try:
+            for done in asyncio.as_completed(tasks):
+                instrument_key, interval, payload = await done
+                yield dumps({"instrument_key": instrument_key, "interval": interval, **payload}) + b"\n"
+        finally:
+            # Client went away: stop the remaining fetches
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
 @fastapi_app.get("/api/tv/intraday/{instrument_key}")
 async def get_intraday(
     instrument_key: str,
@@ -224,219 +463,27 @@ async def get_intraday(
     ray_wick_ratio: Optional[float] = None,
     max_rays: Optional[int] = None,
     ema_9: Optional[int] = None,
-    ema_20: Optional[int] = None
+    ema_20: Optional[int] = None,
+    indicators: Optional[str] = None
 ):
-    """Fetch intraday candles with automated technical indicators."""
-    # Settings object for analyzer
-    settings = {
-        'rvol_len': rvol_len,
-        'rvol_threshold': rvol_threshold,
-        'bubble_threshold': bubble_threshold,
-        'ray_wick_ratio': ray_wick_ratio,
-        'max_rays': max_rays
-    }
-    # Filter None values
-    settings = {k: v for k, v in settings.items() if v is not None}
-
-    # Cache key should include settings
-    cache_key = f"intraday_{instrument_key}_{interval}_{hash(frozenset(settings.items()))}"
-    cached = hist_cache.get(cache_key)
-    if cached: return cached
-
+    """
+    Fetch intraday candles with automated technical indicators. ``indicators``
+    is an optional comma-separated subset of indicator ids (e.g.
+    ``ema_9,volume_bubbles,rvol``); by default all chart indicators are returned.
+    """
     try:
-        clean_key = unquote(instrument_key).upper()
-        # Use registry for historical data with automatic fallback
-        candles = []
-
-        # Prioritize Upstox for BSE (delay) and all Indices (speed/sync)
-        providers = historical_data_registry.get_all()
-        hrn = symbol_mapper.get_hrn(clean_key)
-        is_index = "INDEX" in clean_key or hrn in ["NIFTY", "BANKNIFTY", "FINNIFTY", "INDIA VIX"] or "BSE:" in clean_key
-        if is_index:
-            providers = sorted(providers, key=lambda p: 20 if "Upstox" in type(p).__name__ else 10, reverse=True)
-
-        for provider in providers:
-            try:
-                candles = await provider.get_hist_candles(clean_key, interval, 1000)
-                if candles and len(candles) > 0:
-                    break
-            except Exception as e:
-                logger.warning(f"Historical provider {type(provider).__name__} failed: {e}")
-                continue
-
-        if not candles:
-            return {"status": "error", "message": "No historical data available from any provider"}
-        
-        indicators = []
-        if candles:
-            # Sort candles once ascending (oldest first)
-            candles = sorted(candles, key=lambda x: x[0])
-            df = pd.DataFrame(candles, columns=['ts', 'o', 'h', 'l', 'c', 'v'])
-            # Standard EMAs
-            ema_spans = [(ema_9 or 9, "#3b82f6"), (ema_20 or 20, "#f97316")]
-            for span, color in ema_spans:
-                ema = df['c'].ewm(span=span, adjust=False).mean()
-                indicators.append({
-                    "id": f"ema_{span}", "title": f"EMA {span}", "type": "line",
-                    "style": {"color": color, "lineWidth": 1},
-                    "data": [{"time": int(df['ts'][i]), "value": float(val)} for i, val in enumerate(ema) if i >= span-1],
-                    "hideLabel": True
-                })
-
-            # Market Psychology Signals
-            try:
-                from brain.MarketPsychologyAnalyzer import MarketPsychologyAnalyzer
-                zones, signals = MarketPsychologyAnalyzer().analyze(candles)
-                psych_markers = []
-                for ts, sig_type in signals.items():
-                    psych_markers.append({
-                        "time": int(ts.timestamp()),
-                        "position": "aboveBar" if "SHORT" in sig_type else "belowBar",
-                        "color": "#ef4444" if "SHORT" in sig_type else "#22c55e",
-                        "shape": "arrowDown" if "SHORT" in sig_type else "arrowUp",
-                        "text": sig_type
-                    })
-                if psych_markers:
-                    indicators.append({
-                        "id": "psych_signals", "type": "markers", "title": "Psychology",
-                        "data": psych_markers
-                    })
-            except Exception: pass
-
-            # Symmetry Analysis for Indices (Triple-Stream Symmetry & Panic)
-            if is_index and interval == '1':
-                try:
-                    from brain.SymmetryAnalyzer import SymmetryAnalyzer
-                    # Determine ATM strike
-                    last_spot = candles[-1][4]
-                    strike_interval = 50 if "NIFTY" in clean_key and "BANK" not in clean_key else 100
-                    atm_strike = round(last_spot / strike_interval) * strike_interval
-
-                    # Ensure symbols are cached
-                    if clean_key not in options_manager.symbol_map_cache:
-                        await options_manager._refresh_wss_symbols(clean_key)
-
-                    ce_sym = options_manager.symbol_map_cache.get(clean_key, {}).get(f"{float(atm_strike)}_call") or \
-                             options_manager.symbol_map_cache.get(clean_key, {}).get(f"{int(atm_strike)}_call")
-                    pe_sym = options_manager.symbol_map_cache.get(clean_key, {}).get(f"{float(atm_strike)}_put") or \
-                             options_manager.symbol_map_cache.get(clean_key, {}).get(f"{int(atm_strike)}_put")
-
-                    if ce_sym and pe_sym:
-                        # Fetch candles for CE and PE in parallel
-                        ce_task = historical_data_registry.get_primary().get_hist_candles(ce_sym, '1', 1000)
-                        pe_task = historical_data_registry.get_primary().get_hist_candles(pe_sym, '1', 1000)
-                        ce_candles, pe_candles = await asyncio.gather(ce_task, pe_task)
-
-                        if ce_candles and pe_candles:
-                            # Fetch OI change data from DuckDB for 'Panic' filter
-                            oi_dict = {}
-                            try:
-                                # Match timestamps to candle granularity (1m)
-                                snaps = await asyncio.to_thread(db.query, """
-                                    SELECT timestamp, symbol, oi_change FROM options_snapshots
-                                    WHERE symbol IN (?, ?)
-                                    ORDER BY timestamp ASC
-                                """, (ce_sym, pe_sym))
-                                for s in snaps:
-                                    ts = int(pd.to_datetime(s['timestamp']).timestamp())
-                                    if ts not in oi_dict: oi_dict[ts] = {}
-                                    if s['symbol'] == ce_sym: oi_dict[ts]['ce_oi_chg'] = s['oi_change']
-                                    else: oi_dict[ts]['pe_oi_chg'] = s['oi_change']
-                            except Exception as e:
-                                logger.warning(f"OI Data fetch failed for symmetry: {e}")
-
-                            analyzer = SymmetryAnalyzer(clean_key)
-                            symmetry_signals = analyzer.analyze(candles, ce_candles, pe_candles, oi_data=oi_dict)
-
-                            if symmetry_signals:
-                                sym_markers = []
-                                for sig in symmetry_signals:
-                                    sym_markers.append({
-                                        "time": int(sig['time']),
-                                        "position": "belowBar" if sig['type'] == 'BUY_CE' else "aboveBar",
-                                        "color": "#10b981" if sig['type'] == 'BUY_CE' else "#ef4444",
-                                        "shape": "arrowUp" if sig['type'] == 'BUY_CE' else "arrowDown",
-                                        "text": f"SYM:{sig['type']} (S:{sig['score']})",
-                                        "id": f"sym_{sig['time']}_{sig['type']}",
-                                        "sl": sig.get('sl'),
-                                        "tp": sig.get('tp'),
-                                        "score": sig.get('score'),
-                                        "signal_type": sig['type'],
-                                        "entry_price": sig.get('price')
-                                    })
-
-                                indicators.append({
-                                    "id": "symmetry_signals", "type": "markers", "title": "Symmetry Signals",
-                                    "data": sym_markers
-                                })
-                except Exception as e:
-                    logger.error(f"Symmetry analysis error for {clean_key}: {e}")
-
-            # RVOL & High Volume Node Indicators
-            try:
-                from brain.VolumeAnalyzer import VolumeAnalyzer
-                vol_data = VolumeAnalyzer().analyze(candles, settings=settings)
-
-                # 1. RVOL Markers (Bubbles)
-                if vol_data['markers']:
-                    indicators.append({
-                        "id": "volume_bubbles", "type": "markers", "title": "Vol Bubbles",
-                        "data": vol_data['markers']
-                    })
-
-                # 2. High Volume Nodes (Lines)
-                if vol_data['lines']:
-                    indicators.append({
-                        "id": "volume_nodes", "type": "price_lines", "title": "High Vol Nodes",
-                        "data": vol_data['lines']
-                    })
-
-                # 3. Volume Rays (Requested Levels)
-                if vol_data.get('volume_rays'):
-                    indicators.append({
-                        "id": "volume_rays",
-                        "type": "price_lines",
-                        "title": "V-Ray",
-                        "data": vol_data['volume_rays'],
-                        "hideLabel": True # Requested: REMOVE LABELS from Y AXIS
-                    })
-
-                # 4. EVWMA & Dynamic Pivot
-                if vol_data['evwma']:
-                    indicators.append({
-                        "id": "evwma", "type": "line", "title": "EVWMA",
-                        "style": {"color": "#63c58c", "lineWidth": 2},
-                        "data": vol_data['evwma'],
-                        "hideLabel": True
-                    })
-                if vol_data['dyn_pivot']:
-                    indicators.append({
-                        "id": "dyn_pivot", "type": "line", "title": "DynPivot",
-                        "style": {"color": "#e44451", "lineWidth": 2},
-                        "data": vol_data['dyn_pivot'],
-                        "hideLabel": True
-                    })
-
-                # 4. Add RVOL to candles for coloring
-                for i, rvol in enumerate(vol_data['rvol']):
-                    if i < len(candles):
-                        # Convert list to list if it's already a list, to be safe
-                        c_list = list(candles[i])
-                        c_list.append(rvol)
-                        candles[i] = c_list
-            except Exception as e:
-                logger.error(f"Volume analysis failed: {e}")
-
-        result = {"instrumentKey": clean_key, "hrn": symbol_mapper.get_hrn(clean_key), "candles": candles or [], "indicators": indicators}
-        hist_cache.set(cache_key, result)
-        return result
-    except Exception as e: return format_error(e, "Intraday fetch failed")
+        requested = intraday_indicator_ids(indicators, ema_9, ema_20)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    settings = intraday_settings(rvol_len=rvol_len, rvol_threshold=rvol_threshold, bubble_threshold=bubble_threshold,
+                                 ray_wick_ratio=ray_wick_ratio, max_rays=max_rays)
+    return await cached_intraday(instrument_key, interval, requested, settings)
 
 # ==================== OPTIONS API ====================
 
 @fastapi_app.get("/api/options/chain/{underlying}/with-greeks")
 async def get_chain_with_greeks(underlying: str, spot_price: Optional[float] = None):
-    chain_data = options_manager.get_chain_with_greeks(underlying)
+    chain_data = await options_manager.get_chain_with_greeks(underlying)
     spot = spot_price or await options_manager.get_spot_price(underlying)
     
     for item in chain_data.get('chain', []):
@@ -448,61 +495,59 @@ async def get_chain_with_greeks(underlying: str, spot_price: Optional[float] = N
 
 @fastapi_app.get("/api/options/pcr-trend/{underlying}")
 async def get_pcr_trend(underlying: str):
-    cache_key = f"pcr_trend_{underlying}"
-    cached = pcr_cache.get(cache_key)
-    if cached: return cached
-
-    history = await asyncio.to_thread(db.query, """
-        SELECT timestamp, AVG(pcr_oi) as pcr_oi, AVG(pcr_vol) as pcr_vol, AVG(pcr_oi_change) as pcr_oi_change,
-               AVG(underlying_price) as underlying_price, MAX(max_pain) as max_pain, AVG(spot_price) as spot_price,
-               MAX(total_oi) as total_oi, MAX(total_oi_change) as total_oi_change
-        FROM pcr_history WHERE underlying = ?
-        AND CAST((timestamp AT TIME ZONE 'UTC') AT TIME ZONE 'Asia/Kolkata' AS DATE) =
-            (SELECT CAST(MAX(timestamp) AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Kolkata' AS DATE) FROM pcr_history WHERE underlying = ?)
-        GROUP BY timestamp ORDER BY timestamp ASC
-    """, (underlying, underlying), json_serialize=True)
-    
-    result = {"history": history}
-    pcr_cache.set(cache_key, result)
-    return result
+    async def compute():
+        history = await db_gateway.query_arrow("""
+            SELECT timestamp, AVG(pcr_oi) as pcr_oi, AVG(pcr_vol) as pcr_vol, AVG(pcr_oi_change) as pcr_oi_change,
+                   AVG(underlying_price) as underlying_price, MAX(max_pain) as max_pain, AVG(spot_price) as spot_price,
+                   MAX(total_oi) as total_oi, MAX(total_oi_change) as total_oi_change
+            FROM pcr_history WHERE underlying = ?
+            AND CAST((timestamp AT TIME ZONE 'UTC') AT TIME ZONE 'Asia/Kolkata' AS DATE) =
+                (SELECT CAST(MAX(timestamp) AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Kolkata' AS DATE) FROM pcr_history WHERE underlying = ?)
+            GROUP BY timestamp ORDER BY timestamp ASC
+        """, (underlying, underlying))
+
+        return {"history": history}
+
+    # The payload is cached; responses are mutable (middleware edits headers), so each request gets its own
+    return FastJSONResponse(await pcr_cache.get_or_compute(f"pcr_trend_{underlying}", compute))
 
 @fastapi_app.get("/api/options/oi-analysis/{underlying}")
 async def get_oi_analysis(underlying: str):
-    latest = await asyncio.to_thread(db.query, "SELECT MAX(timestamp) as ts FROM options_snapshots WHERE underlying = ?", (underlying,))
-    if not latest or not latest[0]['ts']: return {"data": []}
+    latest = await db_gateway.query_arrow("SELECT MAX(timestamp) as ts FROM options_snapshots WHERE underlying = ?", (underlying,))
+    ts = latest.column('ts')[0].as_py()
+    if ts is None: return {"data": []}
 
-    ts = latest[0]['ts']
-    data = await asyncio.to_thread(db.query, """
+    data = await db_gateway.query_arrow("""
         SELECT strike, SUM(CASE WHEN option_type = 'call' THEN oi ELSE 0 END) as call_oi,
                SUM(CASE WHEN option_type = 'put' THEN oi ELSE 0 END) as put_oi,
                SUM(CASE WHEN option_type = 'call' THEN oi_change ELSE 0 END) as call_oi_change,
                SUM(CASE WHEN option_type = 'put' THEN oi_change ELSE 0 END) as put_oi_change
         FROM options_snapshots WHERE underlying = ? AND timestamp = ? GROUP BY strike ORDER BY strike ASC
-    """, (underlying, ts), json_serialize=True)
+    """, (underlying, ts))
 
     # Get aggregate totals for sidebars
-    totals = await asyncio.to_thread(db.query, """
+    totals = await db_gateway.query_arrow("""
         SELECT
             SUM(CASE WHEN option_type = 'call' THEN oi ELSE 0 END) as total_call_oi,
             SUM(CASE WHEN option_type = 'put' THEN oi ELSE 0 END) as total_put_oi,
             SUM(CASE WHEN option_type = 'call' THEN oi_change ELSE 0 END) as total_call_oi_chg,
             SUM(CASE WHEN option_type = 'put' THEN oi_change ELSE 0 END) as total_put_oi_chg
         FROM options_snapshots WHERE underlying = ? AND timestamp = ?
-    """, (underlying, ts), json_serialize=True)
+    """, (underlying, ts))
 
-    return {
+    return FastJSONResponse({
         "timestamp": ts,
         "data": data,
-        "totals": totals[0] if totals else {
+        "totals": totals.to_pylist()[0] if totals.num_rows else {
             "total_call_oi": 0, "total_put_oi": 0,
             "total_call_oi_chg": 0, "total_put_oi_chg": 0
         }
-    }
+    })
 
 @fastapi_app.get("/api/options/oi-trend-detailed/{underlying}")
 async def get_oi_trend_detailed(underlying: str):
     """Provides CE vs PE OI Change and Spot Price over time for the current session."""
-    history = await asyncio.to_thread(db.query, """
+    history = await db_gateway.query_arrow("""
         SELECT
             s.timestamp,
             SUM(CASE WHEN s.option_type = 'call' THEN s.oi_change ELSE 0 END) as ce_oi_change,
@@ -515,23 +560,23 @@ async def get_oi_trend_detailed(underlying: str):
             (SELECT CAST(MAX(timestamp) AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Kolkata' AS DATE) FROM options_snapshots WHERE underlying = ?)
         GROUP BY s.timestamp
         ORDER BY s.timestamp ASC
-    """, (underlying, underlying), json_serialize=True)
-    return {"history": history}
+    """, (underlying, underlying))
+    return FastJSONResponse({"history": history})
 
 @fastapi_app.get("/api/options/genie-insights/{underlying}")
 async def get_genie_insights(underlying: str): return await options_manager.get_genie_insights(underlying)
 
 @fastapi_app.get("/api/options/oi-buildup/{underlying}")
-async def get_oi_buildup(underlying: str): return options_manager.get_oi_buildup_analysis(underlying)
+async def get_oi_buildup(underlying: str): return await options_manager.get_oi_buildup_analysis(underlying)
 
 @fastapi_app.get("/api/options/iv-analysis/{underlying}")
 async def get_iv_analysis(underlying: str): return options_manager.get_iv_analysis(underlying)
 
 @fastapi_app.get("/api/options/support-resistance/{underlying}")
-async def get_sr_levels(underlying: str): return options_manager.get_support_resistance(underlying)
+async def get_sr_levels(underlying: str): return await options_manager.get_support_resistance(underlying)
 
 @fastapi_app.get("/api/options/high-activity/{underlying}")
-async def get_high_activity(underlying: str): return options_manager.get_high_activity_strikes(underlying)
+async def get_high_activity(underlying: str): return await options_manager.get_high_activity_strikes(underlying)
 
 @fastapi_app.post("/api/options/backfill")
 async def trigger_backfill():
@@ -599,20 +644,82 @@ async def get_scalper_status():
 # ==================== TICK & DASHBOARD API ====================
 
 @fastapi_app.get("/api/ticks/history/{instrument_key}")
-async def get_tick_history(instrument_key: str, limit: int = 10000):
-    history = await asyncio.to_thread(db.query, "SELECT ts_ms, price, qty FROM ticks WHERE instrumentKey = ? ORDER BY ts_ms DESC LIMIT ?", (unquote(instrument_key), limit), json_serialize=True)
-    return {"history": history[::-1]}
+async def get_tick_history(instrument_key: str, limit: int = 10000, interval: Optional[str] = None):
+    """Raw ticks, or OHLCV bars from bars_1m when an interval ('1', '5', ..., 'D') is given."""
+    if interval:
+        try:
+            bars = await db_gateway.run(db.get_bars, unquote(instrument_key), interval, None, None, limit)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+        return FastJSONResponse({"history": bars})
+    history = await db_gateway.query_arrow("""
+        SELECT ts_ms, price, qty FROM (
+            SELECT ts_ms, price, qty FROM ticks_all WHERE instrumentKey = ? ORDER BY ts_ms DESC LIMIT ?
+        ) ORDER BY ts_ms
+    """, (unquote(instrument_key), limit))
+    return FastJSONResponse({"history": history})
+
+
+# ==================== TICK REPLAY API ====================
+
+def _get_replay_provider() -> TickReplayProvider:
+    provider = live_stream_registry.get_provider("replay")
+    if provider is None:
+        provider = TickReplayProvider()
+        live_stream_registry.register("replay", provider, priority=0)
+    return provider
+
+@fastapi_app.post("/api/replay/start")
+async def start_replay(req: Request):
+    """Replays a stored session (ticks table) through the live pipeline at 0-100x speed."""
+    body = await req.json()
+    if not body.get('date'):
+        raise HTTPException(400, "date (YYYY-MM-DD) is required")
+    provider = _get_replay_provider()
+    await asyncio.to_thread(provider.stop)
+    try:
+        provider.configure(
+            body['date'],
+            speed=body.get('speed', 1),
+            instruments=body.get('instruments'),
+            start_ms=body.get('start_ms'),
+            end_ms=body.get('end_ms'),
+            rebase_time=bool(body.get('rebase_time', False))
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    provider.set_callback(data_engine.on_message)
+    provider.start()
+    return {"status": "success", "replay": provider.status()}
+
+@fastapi_app.post("/api/replay/speed")
+async def set_replay_speed(speed: float):
+    provider = _get_replay_provider()
+    try:
+        provider.set_speed(speed)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {"status": "success", "replay": provider.status()}
+
+@fastapi_app.post("/api/replay/stop")
+async def stop_replay():
+    provider = _get_replay_provider()
+    await asyncio.to_thread(provider.stop)
+    return {"status": "success", "replay": provider.status()}
 
+@fastapi_app.get("/api/replay/status")
+async def get_replay_status():
+    return _get_replay_provider().status()
 
 # ==================== DATABASE API ====================
 
 @fastapi_app.get("/api/db/tables")
 async def get_db_tables():
-    tables = await asyncio.to_thread(db.get_tables)
+    tables = await db_gateway.run(db.get_tables)
     results = []
     for t in tables:
-        row_count = (await asyncio.to_thread(db.query, f'SELECT COUNT(*) as c FROM "{t}"'))[0]['c']
-        schema = await asyncio.to_thread(db.get_table_schema, t)
+        row_count = (await db_gateway.query(f'SELECT COUNT(*) as c FROM "{t}"'))[0]['c']
+        schema = await db_gateway.run(db.get_table_schema, t)
         results.append({
             "name": t,
             "row_count": row_count,
@@ -625,20 +732,31 @@ async def run_db_query(req: Request):
     sql = (await req.json()).get("sql")
     if not sql: raise HTTPException(400, "SQL required")
     validate_sql(sql)
-    return {"results": await asyncio.to_thread(db.query, sql, json_serialize=True)}
+    return FastJSONResponse({"results": await db_gateway.query_arrow(sql)})
 
 @fastapi_app.post("/api/db/export")
 async def export_db_query(req: Request):
-    sql = (await req.json()).get("sql")
+    """Streams the result as CSV (default), Parquet or Arrow IPC: {"sql": ..., "format": "parquet", "batch_size": 50000}."""
+    body = await req.json()
+    sql = body.get("sql")
     if not sql: raise HTTPException(400, "SQL required")
     validate_sql(sql)
-    res = await asyncio.to_thread(db.query, sql, json_serialize=False)
-    if not res: raise HTTPException(400, "No data")
-
-    stream = io.StringIO()
-    pd.DataFrame(res).to_csv(stream, index=False)
-    resp = StreamingResponse(iter([stream.getvalue()]), media_type="text/csv")
-    resp.headers["Content-Disposition"] = "attachment; filename=export.csv"
+    fmt = str(body.get("format") or "csv").lower()
+    if fmt not in EXPORT_FORMATS: raise HTTPException(400, f"Unsupported export format: {fmt}")
+    try:
+        batch_size = int(body["batch_size"]) if body.get("batch_size") else None
+    except (TypeError, ValueError):
+        raise HTTPException(400, "batch_size must be an integer")
+    try:
+        stream = await db_exporter.open(sql, fmt, batch_size)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except ExportBusy as e:
+        raise HTTPException(429, str(e))
+    if stream is None: raise HTTPException(400, "No data")
+
+    resp = StreamingResponse(stream.chunks(), media_type=stream.media_type)
+    resp.headers["Content-Disposition"] = f"attachment; filename={stream.filename}"
     return resp
 
 # ==================== STATIC ROUTES ====================
@@ -663,7 +781,3 @@ async def serve_db(request: Request): return templates.TemplateResponse("db_view
 
 fastapi_app.mount("/static", StaticFiles(directory="backend/static"), name="static")
 app = socketio.ASGIApp(sio, fastapi_app)
-
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run("api_server:app", host="0.0.0.0", port=int(os.getenv("PORT", SERVER_PORT)), reload=False)
@@ -248,15 +248,15 @@ class SignalGenerator:
     def __init__(self, scalper):
         self.scalper = scalper
 
-    def check_signals(self):
+    async def check_signals(self):
         spot = self.scalper.current_spot
         in_zone, level = self.scalper.engine.is_in_signal_zone(spot)
 
-        oi_levels = options_manager.get_support_resistance(self.scalper.underlying)
+        oi_levels = await options_manager.get_support_resistance(self.scalper.underlying)
         sup_oi = [x['strike'] for x in oi_levels.get('support_levels', [])]
         res_oi = [x['strike'] for x in oi_levels.get('resistance_levels', [])]
 
-        chain_res = options_manager.get_chain_with_greeks(self.scalper.underlying)
+        chain_res = await options_manager.get_chain_with_greeks(self.scalper.underlying)
         chain_data = chain_res.get('chain', [])
         if spot == 0: spot = chain_res.get('spot_price', 0)
 
@@ -562,7 +562,7 @@ class NSEConfluenceScalper:
     async def _main_loop(self):
         while self.is_running:
             try:
-                self.signal_generator.check_signals()
+                await self.signal_generator.check_signals()
                 self.order_manager.manage_risk()
             except Exception as e: logger.error(f"Scalper Loop Error: {e}")
             await asyncio.sleep(0.5)
@@ -135,7 +135,69 @@ TV_STUDY_ID = os.getenv("TV_STUDY_ID", "USER:f9c7fa68b382417ba34df4122c632dcf")
 DATABASE_CONFIG = {
     "path": "data/protrade.db",
     "backup_interval_hours": 24,
-    "retention_days": 30
+    "retention_days": 30,
+    # Trading days older than this many calendar days (IST) move from DuckDB
+    # to the Parquet archive (TICK_ARCHIVE_PATH); 0 keeps everything in DuckDB
+    "hot_days": 2
+}
+
+# API response caches: fresh for ttl_seconds, then served stale for up to
+# stale_seconds while one background request refreshes them; LRU-bounded
+API_CACHE_CONFIG = {
+    "intraday": {"ttl_seconds": 30, "stale_seconds": 30, "max_entries": 256},
+    "pcr": {"ttl_seconds": 60, "stale_seconds": 60, "max_entries": 64},
+    # ATM CE/PE candles + OI for symmetry analysis, shared by charts of one underlying
+    "symmetry_options": {"ttl_seconds": 30, "stale_seconds": 0, "max_entries": 32}
+}
+
+# Async DB gateway: worker threads and per-priority call timeouts in seconds
+# (None = no timeout). Interactive UI reads are dequeued before snapshot
+# writes, which run before maintenance (archiving, retention, clustering).
+# At most background_workers snapshot/maintenance jobs run at once (0 = workers - 1),
+# so a long maintenance job never occupies every worker.
+DB_GATEWAY_CONFIG = {
+    "workers": 4,
+    "background_workers": 3,
+    "timeouts": {"interactive": 15, "snapshot": 60, "maintenance": None}
+}
+
+# Socket.IO live updates: raw_tick/chart_update are conflated per room and
+# flushed at most this often
+SOCKET_EMIT_CONFIG = {
+    "max_flush_rate_hz": 20
+}
+
+# Synthetic market feed (offline load testing). When enabled it is registered as
+# a live stream provider next to TradingView/Upstox.
+SYNTHETIC_FEED_CONFIG = {
+    "enabled": os.getenv("SYNTHETIC_FEED", "false").lower() == "true",
+    "ticks_per_second": float(os.getenv("SYNTHETIC_FEED_RATE", "1000")),
+    "strikes_per_side": 10,
+    "chart_update_ratio": 0.05
+}
+
+# Server-side OHLCV bars built incrementally from the live tick stream
+BAR_BUILDER_CONFIG = {
+    "enabled": True,
+    "intervals": ["1", "3", "5", "15", "30", "60", "D"],
+    # Intervals that still get a dedicated upstream chart session; every other
+    # builder interval is served from the 1m stream. None keeps one session per
+    # requested interval.
+    "upstream_intervals": ["1"],
+    # Per-instrument bar state is dropped after this long without a tick
+    "max_idle_seconds": 86400
+}
+
+# Tick ingestion (single writer thread + bounded per-instrument buffers)
+TICK_WRITER_CONFIG = {
+    "buffer_initial_capacity": 256,   # Ticks per instrument before the first grow
+    "buffer_max_capacity": 8192,      # Hard cap per instrument (bounded queue)
+    "overflow_policy": "drop_oldest", # drop_oldest | drop_newest when a buffer is full
+    "min_batch_size": 100,
+    "max_batch_size": 20000,
+    "min_flush_interval_seconds": 0.5,
+    "max_flush_interval_seconds": 10,
+    "max_retries": 3
 }
 
 # TradingView API Configuration
@@ -194,3 +256,37 @@ UI_CONFIG = {
 }
 
 
+
+# Incremental intraday indicator state (one entry per chart: instrument, interval, settings)
+INTRADAY_INDICATOR_CONFIG = {
+    "max_states": 256
+}
+
+# Process pool for CPU-heavy chart analysis (SymmetryAnalyzer).
+# workers: 0 = one less than the CPU count; disabled or broken pools run tasks in a thread.
+# start_method: "forkserver" (spawn where unavailable); needs the `python3 backend` entry point
+ANALYTICS_POOL_CONFIG = {
+    "enabled": True,
+    "workers": 0,
+    "start_method": "forkserver",
+    "task_timeout": 30
+}
+
+# /api/tv/intraday/batch: charts per request, charts computed at once, and concurrent
+# historical fetches per provider (also applied to single intraday requests)
+INTRADAY_BATCH_CONFIG = {
+    "max_items": 80,
+    "concurrency": 8,
+    "provider_concurrency": 4
+}
+
+# /api/db/export: rows per Arrow record batch (and per Parquet row group), encoded
+# chunks buffered ahead of a slow client, and exports running at once
+DB_EXPORT_CONFIG = {
+    "batch_size": 100000,
+    "max_batch_size": 1000000,
+    "buffered_chunks": 4,
+    "max_concurrent": 2,
+    "open_timeout": 15,
+    "stall_timeout": 120
+}
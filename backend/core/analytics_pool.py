@@ -0,0 +1,233 @@
+"""
+Analytics Process Pool
+CPU-heavy chart analysis (SymmetryAnalyzer's row-by-row swing scan) runs in a
+managed ProcessPoolExecutor instead of on the asyncio event loop, so one slow
+chart request no longer stalls Socket.IO traffic. Workers are forked from a fork
+server started at startup with the analyzer pre-imported, and candles are
+shipped as compact float64 arrays rather than lists of lists. If the pool is
+disabled or breaks, tasks run in a thread of this process instead. A task that
+overruns ``task_timeout`` in a worker gets the pool recycled and its workers
+terminated, so runaway scans cannot pile up. Per-task timings are exported on
+/api/metrics.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from core.metrics import metrics
+
+try:
+    from config import ANALYTICS_POOL_CONFIG
+except ImportError:
+    ANALYTICS_POOL_CONFIG = {"enabled": True, "workers": 0, "start_method": "forkserver", "task_timeout": 30}
+
+logger = logging.getLogger(__name__)
+
+task_ms = metrics.histogram('protrade_analytics_task_ms', 'Analytics task wall time by task and where it ran',
+                            buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000), labels=('task', 'mode'))
+
+
+def pack_candles(candles: List[List[float]]) -> np.ndarray:
+    """[[ts, o, h, l, c, v], ...] -> contiguous (n, 6) float64 array (one buffer when pickled)."""
+    return np.array([c[:6] for c in candles], dtype=np.float64).reshape(-1, 6)
+
+
+def _unpack(candles: np.ndarray) -> List[list]:
+    return [[int(row[0]), *row[1:]] for row in candles.tolist()]
+
+
+# ==================== WORKER SIDE ====================
+
+# Imported once by the fork server, so every worker forked from it starts warm
+PRELOAD = ['numpy', 'pandas', 'brain.SymmetryAnalyzer']
+
+
+def _warm():
+    """Pool initializer: import the analyzer (and pandas) once per worker (a no-op if preloaded)."""
+    import brain.SymmetryAnalyzer  # noqa: F401
+
+
+def _ready() -> int:
+    return os.getpid()
+
+
+def _symmetry(underlying: str, idx: np.ndarray, ce: np.ndarray, pe: np.ndarray, oi_data: Optional[Dict] = None):
+    from brain.SymmetryAnalyzer import SymmetryAnalyzer
+    return SymmetryAnalyzer(underlying).analyze(_unpack(idx), _unpack(ce), _unpack(pe), oi_data=oi_data)
+
+
+TASKS = {
+    'symmetry': _symmetry,
+}
+
+
+# ==================== PARENT SIDE ====================
+
+def _main_reimported() -> bool:
+    """
+    True if spawn/forkserver workers would re-run the ``__main__`` script (as
+    ``__mp_main__``) on start-up, which would rebuild the app, DuckDB included,
+    in every worker. The ``python3 backend`` entry point (backend/__main__.py)
+    is not re-run, and ``python3 backend/api_server.py`` hands over to it.
+    """
+    main = sys.modules.get('__main__')
+    spec_name = getattr(getattr(main, '__spec__', None), 'name', None)
+    if spec_name:
+        return spec_name != '__main__' and not spec_name.endswith('.__main__')
+    return getattr(main, '__file__', None) is not None
+
+
+class AnalyticsPool:
+    """
+    ``start()`` at startup, ``await run(task, *args)`` per request, ``stop()``
+    at shutdown. Workers are forked from a clean fork server rather than from
+    this process, whose tick-writer, maintenance and DuckDB threads may hold
+    locks at the moment of a fork; that also makes re-creating the pool after
+    a worker died safe at any time.
+    """
+
+    def __init__(self, config: Dict[str, Any] = ANALYTICS_POOL_CONFIG):
+        self.enabled = config.get("enabled", True)
+        self.workers = config.get("workers") or max(1, (os.cpu_count() or 2) - 1)
+        self.start_method = config.get("start_method") or "forkserver"
+        if self.start_method not in multiprocessing.get_all_start_methods():
+            self.start_method = "spawn"
+        self.task_timeout = config.get("task_timeout", 30)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+        # Stats
+        self.completed = {'process': 0, 'inline': 0}
+        self.failed = 0
+        self.fallbacks = 0
+        self.restarts = 0
+        self.timeouts = {'process': 0, 'inline': 0}
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            if self._pool is None:
+                if self.start_method != "fork" and _main_reimported():
+                    logger.error(f"Analytics pool disabled: {self.start_method} workers would re-import the __main__ script; "
+                                   f"start the server with `python3 backend` to run analyzers in worker processes")
+                    self.enabled = False
+                    return None
+                try:
+                    ctx = multiprocessing.get_context(self.start_method)
+                    if self.start_method == "forkserver":
+                        ctx.set_forkserver_preload(PRELOAD)
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx, initializer=_warm)
+                except Exception as e:
+                    logger.error(f"Analytics pool unavailable, running analyzers inline: {e}")
+                    self.enabled = False
+                    return None
+            return self._pool
+
+    def start(self):
+        """Launches and warms every worker; blocks until they have imported the analyzer."""
+        pool = self._executor()
+        if pool is None:
+            return
+        started = time.perf_counter()
+        try:
+            pids = {f.result(timeout=60) for f in [pool.submit(_ready) for _ in range(self.workers)]}
+            logger.info(f"Analytics pool: {len(pids)} of {self.workers} workers warm in {(time.perf_counter() - started) * 1000:.0f}ms")
+        except Exception as e:
+            logger.error(f"Analytics pool failed to start, running analyzers inline: {e}")
+            self._discard(pool)
+
+    def stop(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _discard(self, pool: ProcessPoolExecutor, terminate: bool = False):
+        """Drops the pool; the next task creates a new one. ``terminate`` also kills workers still running a task."""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+                self.restarts += 1
+        processes = list((getattr(pool, '_processes', None) or {}).values()) if terminate else []
+        pool.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            try:
+                process.terminate()
+            except Exception as e:
+                logger.debug(f"Could not terminate analytics worker: {e}")
+
+    async def run(self, task: str, *args) -> Any:
+        """Runs ``TASKS[task](*args)`` in a worker, or in a thread if the pool is unavailable."""
+        fn = TASKS[task]
+        started = time.perf_counter()
+        pool = self._executor()
+        if pool is not None:
+            future = None
+            try:
+                future = pool.submit(fn, *args)
+                result = await asyncio.wait_for(asyncio.wrap_future(future), self.task_timeout)
+                self._done(task, 'process', started)
+                return result
+            except asyncio.TimeoutError:
+                self.timeouts['process'] += 1
+                self.failed += 1
+                if not future.cancel():
+                    # Already handed to a worker, which would stay busy until the scan ends
+                    logger.warning(f"Analytics task {task} exceeded {self.task_timeout}s, recycling the pool")
+                    self._discard(pool, terminate=True)
+                raise
+            except BrokenProcessPool as e:
+                # A worker died (e.g. OOM-killed); the pool is recreated on the next task
+                logger.error(f"Analytics pool broken while running {task}, retrying inline: {e}")
+                self._discard(pool)
+                self.fallbacks += 1
+            except Exception:
+                self.failed += 1
+                raise
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(asyncio.to_thread(fn, *args), self.task_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts['inline'] += 1
+            self.failed += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        self._done(task, 'inline', started)
+        return result
+
+    def _done(self, task: str, mode: str, started: float):
+        task_ms.observe((time.perf_counter() - started) * 1000, task, mode)
+        self.completed[mode] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'running': self._pool is not None,
+            'workers': self.workers,
+            'start_method': self.start_method,
+            'completed': dict(self.completed),
+            'failed': self.failed,
+            'fallbacks': self.fallbacks,
+            'restarts': self.restarts,
+            'timeouts': dict(self.timeouts),
+        }
+
+
+analytics_pool = AnalyticsPool()
+
+metrics.counter_fn('protrade_analytics_timeouts_total', 'Analytics tasks that exceeded task_timeout, by where they ran',
+                   lambda: {(mode, ): count for mode, count in analytics_pool.timeouts.items()}, labels=('mode',))
+metrics.counter_fn('protrade_analytics_fallbacks_total', 'Analytics tasks run inline because the process pool was broken',
+                   lambda: analytics_pool.fallbacks)
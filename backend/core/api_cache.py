@@ -0,0 +1,160 @@
+"""
+API Response Cache
+Size-bounded LRU cache with a TTL for API results. ``get_or_compute`` coalesces
+concurrent misses for the same key into one computation (single-flight) and,
+for a short window after expiry, serves the stale value while a background
+task refreshes it (stale-while-revalidate). Hit/miss counts are exported on
+/api/metrics.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+_caches: Dict[str, "APICache"] = {}
+
+
+class APICache:
+    """
+    ``ttl_seconds``: how long a value is fresh. ``stale_seconds``: how long after
+    that it may still be served while being refreshed. ``max_entries``: LRU bound.
+    """
+
+    def __init__(self, name: str, ttl_seconds: float = 60, max_entries: int = 256, stale_seconds: float = 0):
+        self.name = name
+        self.ttl = ttl_seconds
+        self.stale_ttl = stale_seconds
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, stored_at)
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._refreshing: Dict[Hashable, asyncio.Task] = {}
+
+        # Stats
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.refresh_errors = 0
+        _caches[name] = self
+
+    def _lookup(self, key: Hashable):
+        """Returns (value, age) or (_MISSING, None); drops entries past the stale window."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING, None
+        value, stored_at = entry
+        age = time.monotonic() - stored_at
+        if age >= self.ttl + self.stale_ttl:
+            del self._entries[key]
+            return _MISSING, None
+        self._entries.move_to_end(key)
+        return value, age
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Fresh value or None."""
+        value, age = self._lookup(key)
+        if value is _MISSING or age >= self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable = _MISSING):
+        if key is _MISSING:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    async def get_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]],
+                             cacheable: Callable[[Any], bool] = lambda value: True) -> Any:
+        """
+        Cached value for ``key``, computing it with ``compute()`` on a miss. Concurrent
+        callers for the same key share one computation; results for which
+        ``cacheable(result)`` is false (e.g. error payloads) are returned but not stored.
+        """
+        value, age = self._lookup(key)
+        if value is not _MISSING:
+            if age < self.ttl:
+                self.hits += 1
+                return value
+            self.stale_hits += 1
+            if key not in self._refreshing and key not in self._inflight:
+                task = asyncio.create_task(self._refresh(key, compute, cacheable))
+                self._refreshing[key] = task
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.create_task(self._compute(key, compute, cacheable))
+            # Retrieved here so a failure nobody is waiting for any more is not logged by asyncio
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        # The computation belongs to the cache: a cancelled caller stops waiting but does not
+        # cancel it for the other callers sharing it
+        return await asyncio.shield(task)
+
+    async def _compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]], cacheable: Callable[[Any], bool]) -> Any:
+        try:
+            result = await compute()
+            if cacheable(result):
+                self.set(key, result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _refresh(self, key: Hashable, compute: Callable[[], Awaitable[Any]], cacheable: Callable[[Any], bool]):
+        try:
+            result = await compute()
+            if cacheable(result):
+                self.set(key, result)
+        except Exception as e:
+            self.refresh_errors += 1
+            logger.warning(f"Background refresh of {self.name} cache entry failed: {e}")
+        finally:
+            self._refreshing.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'refresh_errors': self.refresh_errors,
+            'hit_rate': round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+def _request_counts():
+    counts = {}
+    for name, cache in list(_caches.items()):
+        counts[(name, 'hit')] = cache.hits
+        counts[(name, 'stale')] = cache.stale_hits
+        counts[(name, 'miss')] = cache.misses
+        counts[(name, 'coalesced')] = cache.coalesced
+    return counts
+
+
+metrics.counter_fn('protrade_api_cache_requests_total', 'API cache lookups by cache and result', _request_counts, labels=('cache', 'result'))
+metrics.gauge_fn('protrade_api_cache_entries', 'Entries held per API cache',
+                 lambda: {(name, ): len(cache._entries) for name, cache in list(_caches.items())}, labels=('cache',))
@@ -0,0 +1,244 @@
+"""
+Incremental Bar Builder
+Maintains open/high/low/close/volume state per instrument for several
+intervals from the live tick stream, so one tick subscription can serve
+every chart timeframe without extra upstream chart sessions.
+"""
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+IST_OFFSET_SECONDS = 19800
+# NSE session opens at 09:15 IST; intraday bars are anchored there like TradingView's
+SESSION_OPEN_SECONDS = 9 * 3600 + 15 * 60
+SESSION_ANCHOR_UTC = SESSION_OPEN_SECONDS - IST_OFFSET_SECONDS
+
+INTERVAL_SECONDS = {
+    '1': 60,
+    '3': 180,
+    '5': 300,
+    '15': 900,
+    '30': 1800,
+    '60': 3600,
+    'D': 86400,
+}
+
+# Bar layout matches the chart_update ohlcv rows: [ts_sec, open, high, low, close, volume]
+TS, OPEN, HIGH, LOW, CLOSE, VOLUME = range(6)
+
+
+def bar_start(ts_sec: int, interval: str) -> int:
+    """Start (epoch seconds) of the bar containing ts_sec for the given interval."""
+    if interval == 'D':
+        # Daily bars are stamped at the session open of the IST trading day
+        day_start = ts_sec - (ts_sec + IST_OFFSET_SECONDS) % 86400
+        return day_start + SESSION_OPEN_SECONDS
+    span = INTERVAL_SECONDS[interval]
+    return ts_sec - (ts_sec - SESSION_ANCHOR_UTC) % span
+
+
+class BarBuilder:
+    """
+    O(1)-per-tick OHLCV aggregation for a fixed set of intervals.
+
+    With a ``seed`` callback (instrument, start_ts, end_ts) -> Future of the
+    stored 1m rows before end_ts, an instrument's live bars are seeded from
+    history when its first tick arrives. The callback must not block: the
+    rows are merged into the live bars whenever they arrive, and the bars
+    that became complete are handed to ``on_seeded(instrument, changes)``.
+    Until then (and without a seed, or if seeding fails) a bar is only
+    reported once it is complete from its open, i.e. it started after the
+    builder began observing the instrument; a partially observed bar would
+    otherwise overwrite correct history on the client.
+
+    State is dropped when an instrument's last chart room closes (``discard``)
+    and for instruments that have not ticked for ``max_idle_seconds``.
+    """
+
+    def __init__(self, intervals: Optional[List[str]] = None, max_idle_seconds: int = 86400,
+                 seed: Optional[Callable[[str, int, int], Future]] = None,
+                 on_seeded: Optional[Callable[[str, List[Tuple[str, List[list]]]], None]] = None):
+        intervals = intervals or list(INTERVAL_SECONDS.keys())
+        unknown = [i for i in intervals if i not in INTERVAL_SECONDS]
+        if unknown:
+            raise ValueError(f"Unsupported bar intervals: {unknown}")
+        self.intervals = [str(i) for i in intervals]
+        self.max_idle_seconds = max_idle_seconds
+        self.seed = seed
+        self.on_seeded = on_seeded
+        self._lock = threading.Lock()
+        self._bars: Dict[str, Dict[str, list]] = {}  # instrumentKey -> interval -> bar
+        self._first_seen: Dict[str, int] = {}  # instrumentKey -> first tick ts (sec)
+        self._last_seen: Dict[str, int] = {}  # instrumentKey -> latest tick ts (sec)
+        self._seeding: Dict[str, object] = {}  # instrumentKey -> token of the seed in flight
+        self._next_sweep = 0
+        self.evicted = 0
+
+    def update(self, instrument_key: str, ts_ms: int, price: float, qty: float = 0) -> List[Tuple[str, List[list]]]:
+        """
+        Applies one tick to every interval.
+
+        Returns (interval, rows) for each interval whose bar changed; rows holds the
+        just-closed bar first when the tick rolled the interval over, then the live bar.
+        """
+        if not price or price <= 0:
+            return []
+        ts_sec = int(ts_ms // 1000)
+        qty = qty if qty and qty > 0 else 0
+        changes = []
+        token = None
+
+        with self._lock:
+            if ts_sec >= self._next_sweep:
+                self._evict_idle(ts_sec)
+            bars = self._bars.get(instrument_key)
+            if bars is None:
+                bars = self._bars[instrument_key] = {}
+                self._first_seen[instrument_key] = ts_sec
+                if self.seed:
+                    token = self._seeding[instrument_key] = object()
+            first_seen = self._first_seen[instrument_key]
+            if ts_sec > self._last_seen.get(instrument_key, 0):
+                self._last_seen[instrument_key] = ts_sec
+
+            for interval in self.intervals:
+                start = bar_start(ts_sec, interval)
+                bar = bars.get(interval)
+
+                if bar is None or start > bar[TS]:
+                    bars[interval] = new_bar = [start, price, price, price, price, qty]
+                    rows = []
+                    if bar is not None and self._complete(bar, first_seen):
+                        rows.append(list(bar))
+                    if self._complete(new_bar, first_seen):
+                        rows.append(list(new_bar))
+                    if rows:
+                        changes.append((interval, rows))
+                    continue
+
+                if start < bar[TS]:
+                    # Late tick for an already closed bar
+                    continue
+
+                changed = price != bar[CLOSE] or qty
+                if price > bar[HIGH]:
+                    bar[HIGH] = price
+                elif price < bar[LOW]:
+                    bar[LOW] = price
+                bar[CLOSE] = price
+                bar[VOLUME] += qty
+                if changed and self._complete(bar, first_seen):
+                    changes.append((interval, [list(bar)]))
+
+        if token is not None:
+            self._request_seed(instrument_key, token, ts_sec)
+        return changes
+
+    def _request_seed(self, instrument_key: str, token: object, ts_sec: int):
+        """Asks for the stored 1m rows from the earliest current bar open up to the first tick."""
+        start = min(bar_start(ts_sec, interval) for interval in self.intervals)
+        try:
+            future = self.seed(instrument_key, start, ts_sec)
+        except Exception as e:
+            logger.warning(f"Could not seed bars for {instrument_key}: {e}")
+            self._apply_seed(instrument_key, token, ts_sec, None)
+            return
+        future.add_done_callback(lambda f: self._seed_done(instrument_key, token, ts_sec, f))
+
+    def _seed_done(self, instrument_key: str, token: object, ts_sec: int, future: Future):
+        try:
+            rows = future.result()
+        except Exception as e:
+            logger.warning(f"Could not seed bars for {instrument_key}: {e}")
+            rows = None
+        changes = self._apply_seed(instrument_key, token, ts_sec, rows)
+        if changes and self.on_seeded is not None:
+            self.on_seeded(instrument_key, changes)
+
+    def _apply_seed(self, instrument_key: str, token: object, ts_sec: int,
+                    rows: Optional[List[list]]) -> List[Tuple[str, List[list]]]:
+        """
+        Folds stored rows (before the first tick at ts_sec) into the live bars
+        they precede and returns every current bar, now complete from its open.
+        Ignored if the instrument was dropped meanwhile or the rows could not be read.
+        """
+        with self._lock:
+            if self._seeding.get(instrument_key) is not token:
+                return []
+            del self._seeding[instrument_key]
+            bars = self._bars.get(instrument_key)
+            if rows is None or bars is None:
+                return []
+            for interval, stored in self._seed_bars(rows, ts_sec).items():
+                bar = bars.get(interval)
+                if bar is None or bar[TS] != stored[TS]:
+                    continue  # the live bar has rolled over since the first tick
+                bar[OPEN] = stored[OPEN]
+                bar[HIGH] = max(bar[HIGH], stored[HIGH])
+                bar[LOW] = min(bar[LOW], stored[LOW])
+                bar[VOLUME] += stored[VOLUME]
+            # Seeded bars are complete from their open
+            self._first_seen[instrument_key] = 0
+            return [(interval, [list(bar)]) for interval, bar in bars.items()]
+
+    def _seed_bars(self, rows: List[list], ts_sec: int) -> Dict[str, list]:
+        """Current bar per interval folded from 1m rows (ordered by time)."""
+        bars = {}
+        for interval in self.intervals:
+            start = bar_start(ts_sec, interval)
+            bar = None
+            for row in rows:
+                if row[TS] > ts_sec or bar_start(row[TS], interval) != start:
+                    continue
+                if bar is None:
+                    bar = [start, row[OPEN], row[HIGH], row[LOW], row[CLOSE], row[VOLUME] or 0]
+                else:
+                    bar[HIGH] = max(bar[HIGH], row[HIGH])
+                    bar[LOW] = min(bar[LOW], row[LOW])
+                    bar[CLOSE] = row[CLOSE]
+                    bar[VOLUME] += row[VOLUME] or 0
+            if bar is not None:
+                bars[interval] = bar
+        return bars
+
+    @staticmethod
+    def _complete(bar: list, first_seen: int) -> bool:
+        return bar[TS] >= first_seen
+
+    def get_bar(self, instrument_key: str, interval: str) -> Optional[list]:
+        """Current (live) bar for an instrument/interval, or None."""
+        with self._lock:
+            bar = self._bars.get(instrument_key, {}).get(str(interval))
+            return list(bar) if bar else None
+
+    def _evict_idle(self, now: int):
+        """Drops instruments without a tick for ``max_idle_seconds`` (expired strikes, rotated expiries)."""
+        if self.max_idle_seconds:
+            cutoff = now - self.max_idle_seconds
+            for key in [k for k, seen in self._last_seen.items() if seen < cutoff]:
+                self._drop(key)
+                self.evicted += 1
+        self._next_sweep = now + min(3600, self.max_idle_seconds or 3600)
+
+    def _drop(self, instrument_key: str):
+        self._bars.pop(instrument_key, None)
+        self._first_seen.pop(instrument_key, None)
+        self._last_seen.pop(instrument_key, None)
+        self._seeding.pop(instrument_key, None)
+
+    def discard(self, instrument_key: str):
+        """
+        Drops all state for an instrument that is no longer streamed. Matched
+        case-insensitively: chart rooms are upper-case, feed keys may not be.
+        """
+        wanted = instrument_key.upper()
+        with self._lock:
+            for key in [k for k in self._bars if k.upper() == wanted]:
+                self._drop(key)
+
+    def instruments(self) -> List[str]:
+        with self._lock:
+            return list(self._bars.keys())
@@ -2,106 +2,168 @@
 ProTrade Data Engine
 Manages real-time data ingestion and OHLC aggregation.
 """
-import asyncio
 import json
 import logging
 import threading
 import time
+from concurrent.futures import Future
 from datetime import datetime
-from typing import Dict, Any, List, Optional, Union
-from db.local_db import db, LocalDBJSONEncoder
+from typing import Dict, Any, List, Optional, Tuple, Union
+from db.local_db import db
+from db.gateway import db_gateway, MAINTENANCE, SNAPSHOT
 from core.symbol_mapper import symbol_mapper
 from core.utils import safe_int, safe_float
 from core.provider_registry import live_stream_registry
+from core.tick_buffer import TickBufferPool, NAN
+from core.tick_writer import TickWriter
+from core.bar_builder import BarBuilder, TS
+from core.socket_emitter import CoalescingEmitter
+from core.subscription_registry import SubscriptionRegistry
+from core.metrics import metrics, observe_stage, tick_rates
 
 logger = logging.getLogger(__name__)
 
 # Configuration
 try:
-    from config import INITIAL_INSTRUMENTS, UPSTOX_INDEX_MAP
+    from config import INITIAL_INSTRUMENTS, UPSTOX_INDEX_MAP, TICK_WRITER_CONFIG, BAR_BUILDER_CONFIG, SOCKET_EMIT_CONFIG
 except ImportError:
     INITIAL_INSTRUMENTS = ["NSE:NIFTY"]
     UPSTOX_INDEX_MAP = {}
+    TICK_WRITER_CONFIG = {}
+    BAR_BUILDER_CONFIG = {}
+    SOCKET_EMIT_CONFIG = {}
 
 socketio_instance = None
 main_event_loop = None
 latest_total_volumes = {}
-# Track subscribers per (instrumentKey, interval)
-room_subscribers = {} # (instrumentKey, interval) -> set of sids
+
+def _stored_bars_1m(instrument_key: str, start_ts: int, end_ts: int) -> List[list]:
+    """
+    1m rows that seed the bar builder's live bars: complete minutes from bars_1m,
+    plus the minute of the first live tick (end_ts) from ticks stored before it.
+    Ticks flushed since that tick are left out, as the live bars already count them.
+    """
+    minute = end_ts - end_ts % 60
+    table = db.get_bars(instrument_key, '1', start_ts=start_ts, end_ts=minute - 1)
+    rows = [list(row) for row in zip(*(table.column(c).to_pylist() for c in ('ts', 'open', 'high', 'low', 'close', 'volume')))]
+    current = db.connections.reader().execute("""
+        SELECT arg_min(price, ts_ms), max(price), min(price), arg_max(price, ts_ms), sum(qty)
+        FROM ticks WHERE instrumentKey = ? AND ts_ms >= ? AND ts_ms < ? AND price > 0
+    """, (instrument_key, minute * 1000, end_ts * 1000)).fetchall()[0]
+    if current[0] is not None:
+        rows.append([minute, *current[:4], current[4] or 0])
+    return rows
+
+def _request_seed(instrument_key: str, start_ts: int, end_ts: int) -> Future:
+    """Reads the seed rows on a DB gateway worker, so the feed thread never waits on DuckDB."""
+    return db_gateway.submit(_stored_bars_1m, instrument_key, start_ts, end_ts, priority=SNAPSHOT).future
+
+def _publish_bar_changes(inst_key: str, changes: List[Tuple[str, List[list]]]):
+    """Sends built-interval bar rows to the chart rooms that stream them."""
+    for interval, rows in changes:
+        if is_built_interval(interval) and (inst_key.upper(), interval) in room_subscribers:
+            emitter.publish(
+                'chart_update',
+                {'instrumentKey': inst_key, 'interval': interval, 'ohlcv': rows},
+                room=inst_key.upper(), coalesce_key=interval, merge=_merge_bar_updates
+            )
+
+# Incremental OHLCV bars for every configured interval, fed from the tick stream
+bar_builder = BarBuilder(BAR_BUILDER_CONFIG.get('intervals'), BAR_BUILDER_CONFIG.get('max_idle_seconds', 86400),
+                         seed=_request_seed, on_seeded=_publish_bar_changes) if BAR_BUILDER_CONFIG.get('enabled', True) else None
+UPSTREAM_INTERVALS = BAR_BUILDER_CONFIG.get('upstream_intervals')
+
+def get_upstream_interval(interval: str) -> str:
+    """Interval of the upstream chart session that backs a requested interval."""
+    interval = str(interval)
+    if bar_builder is None or not UPSTREAM_INTERVALS or interval in UPSTREAM_INTERVALS:
+        return interval
+    if interval not in bar_builder.intervals:
+        return interval
+    return str(UPSTREAM_INTERVALS[0])
+
+def is_built_interval(interval: str) -> bool:
+    """True if chart updates for this interval come from the bar builder rather than upstream."""
+    return get_upstream_interval(interval) != str(interval)
+
+# Track subscribers per (instrumentKey, interval), indexed both ways
+room_subscribers = SubscriptionRegistry(interval_mapper=get_upstream_interval)
+
+def has_built_subscriber(instrument_key: str) -> bool:
+    """True if a chart room streams one of the instrument's intervals from the bar builder."""
+    return any(is_built_interval(i) for i in room_subscribers.intervals(instrument_key.upper()))
 
 def get_primary_interval(instrument_key: str) -> str:
-    """Find the smallest active interval for an instrument to act as the primary tick source."""
-    instrument_key = instrument_key.upper()
-    active = []
-    for (ik, interval) in room_subscribers.keys():
-        if ik == instrument_key:
-            if interval.isdigit():
-                active.append(int(interval))
-            elif interval == 'D':
-                active.append(1440)
-    if not active: return "1"
-    return str(min(active))
+    """Smallest active (upstream) interval for an instrument; acts as the primary tick source."""
+    return room_subscribers.primary_interval(instrument_key.upper())
 
 # Track last processed state to avoid redundant ticks
 last_processed_tick = {} # instrumentKey -> {ts_ms, price, volume}
 
-TICK_BATCH_SIZE = 100
-tick_buffer = []
-buffer_lock = threading.Lock()
+# Pending ticks are staged column-wise per instrument (bounded) and written by a
+# single writer thread as one Arrow batch; producers never wait on DuckDB.
+tick_buffers = TickBufferPool(
+    initial_capacity=TICK_WRITER_CONFIG.get('buffer_initial_capacity', 256),
+    max_capacity=TICK_WRITER_CONFIG.get('buffer_max_capacity', 8192),
+    keep_raw=db.store_raw_ticks,
+    overflow=TICK_WRITER_CONFIG.get('overflow_policy', 'drop_oldest')
+)
+tick_writer = TickWriter(
+    tick_buffers,
+    db.insert_tick_batch,
+    min_batch_size=TICK_WRITER_CONFIG.get('min_batch_size', 100),
+    max_batch_size=TICK_WRITER_CONFIG.get('max_batch_size', 20000),
+    min_flush_interval=TICK_WRITER_CONFIG.get('min_flush_interval_seconds', 0.5),
+    max_flush_interval=TICK_WRITER_CONFIG.get('max_flush_interval_seconds', 10),
+    max_retries=TICK_WRITER_CONFIG.get('max_retries', 3)
+)
+
+def _optional_float(val) -> float:
+    """Float value for an optional tick column; NaN marks it as not provided."""
+    return NAN if val is None else safe_float(val, NAN)
+
+# Conflates outgoing updates per room; flushed from the event loop at a bounded rate
+emitter = CoalescingEmitter(max_rate_hz=SOCKET_EMIT_CONFIG.get('max_flush_rate_hz', 20))
 
 def set_socketio(sio, loop=None):
     global socketio_instance, main_event_loop
     socketio_instance = sio
     main_event_loop = loop
+    emitter.attach(sio, loop)
 
 def emit_event(event: str, data: Any, room: Optional[str] = None):
-    global socketio_instance, main_event_loop
-    if not socketio_instance: return
-    if isinstance(data, (dict, list)):
-        data = json.loads(json.dumps(data, cls=LocalDBJSONEncoder))
-    try:
-        if main_event_loop and main_event_loop.is_running():
-            asyncio.run_coroutine_threadsafe(socketio_instance.emit(event, data, to=room), main_event_loop)
-            if room:
-                logger.info(f"Emitted {event} to room {room}")
-    except Exception as e:
-        logger.error(f"Emit Error: {e}")
+    """Queues an event for the next emitter flush (delivered in order, not conflated)."""
+    emitter.publish(event, data, room=room)
 
-def flush_tick_buffer():
-    global tick_buffer
-    to_insert = []
-    with buffer_lock:
-        if tick_buffer:
-            to_insert = tick_buffer
-            tick_buffer = []
-
-    if to_insert:
-        # Retry logic for DB insertion
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                db.insert_ticks(to_insert)
-                logger.debug(f"Flushed {len(to_insert)} ticks to DB")
-                return
-            except Exception as e:
-                logger.error(f"DB Insert Attempt {attempt+1} failed: {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(1) # Wait before retry
-                else:
-                    # Final failure - put data back into buffer so it's not lost
-                    logger.error("Final DB insert failure. Returning ticks to buffer.")
-                    with buffer_lock:
-                        tick_buffer = to_insert + tick_buffer
+def _merge_quotes(previous: Dict[str, Any], latest: Dict[str, Any]) -> Dict[str, Any]:
+    """Keeps the latest quote but carries the traded quantity of conflated ticks."""
+    return {**latest, 'ltq': safe_int(previous.get('ltq')) + safe_int(latest.get('ltq'))}
 
-def periodic_flush():
-    """Background task to flush ticks every 10 seconds."""
-    while True:
-        try:
-            time.sleep(10)
-            flush_tick_buffer()
-        except Exception as e:
-            logger.error(f"Error in periodic_flush: {e}")
-            time.sleep(5)
+def _merge_bar_updates(previous: Dict[str, Any], latest: Dict[str, Any]) -> Dict[str, Any]:
+    """Combines pending chart_update bar rows by bar time so closed bars are not lost."""
+    rows = {row[TS]: row for row in previous['ohlcv']}
+    for row in latest['ohlcv']:
+        rows[row[TS]] = row
+    return {**latest, 'ohlcv': [rows[ts] for ts in sorted(rows)]}
+
+def flush_tick_buffer():
+    """Synchronously writes all pending ticks (used on shutdown)."""
+    tick_writer.flush()
+
+def enqueue_tick(tick: Dict[str, Any]):
+    """Stages a dict-shaped tick (e.g. from the options WSS) for the writer thread."""
+    pending = tick_buffers.append(
+        tick['instrumentKey'],
+        safe_int(tick.get('ts_ms') or time.time() * 1000),
+        safe_float(tick.get('last_price')),
+        safe_int(tick.get('ltq')),
+        tick.get('source', 'live'),
+        oi=_optional_float(tick.get('oi')),
+        bid=_optional_float(tick.get('bid')),
+        ask=_optional_float(tick.get('ask')),
+        raw=tick
+    )
+    tick_writer.notify(pending)
 
 def periodic_maintenance():
     """Background task to optimize DB and cleanup old data."""
@@ -111,22 +173,55 @@ def periodic_maintenance():
         try:
             from config import DATABASE_CONFIG
             retention = DATABASE_CONFIG.get('retention_days', 30)
-            db.cleanup_old_data(retention)
-            db.optimize_storage()
+            hot_days = DATABASE_CONFIG.get('hot_days', 2)
+            # Queued behind interactive reads and snapshot writes on the DB gateway
+            if hot_days:
+                db_gateway.call(db.archive_sealed_days, hot_days, priority=MAINTENANCE)
+            db_gateway.call(db.cleanup_old_data, retention, priority=MAINTENANCE)
+            db_gateway.call(db.optimize_storage, priority=MAINTENANCE)
             # Run every 24 hours
             time.sleep(24 * 3600)
         except Exception as e:
             logger.error(f"Error in periodic_maintenance: {e}")
             time.sleep(3600)
 
+def _register_metrics():
+    """Exposes queue depths and writer/emitter counters on /api/metrics."""
+    metrics.gauge_fn('protrade_tick_buffer_pending', 'Ticks staged for the DB writer', lambda: tick_buffers.pending)
+    metrics.gauge_fn('protrade_tick_buffer_instruments', 'Instruments with an active tick buffer', lambda: tick_buffers.stats()['instruments'])
+    metrics.counter_fn('protrade_tick_buffer_dropped_total', 'Ticks lost to a full buffer',
+                       lambda: {('drop_oldest',): tick_buffers.overwritten, ('drop_newest',): tick_buffers.rejected}, labels=('policy',))
+    metrics.counter_fn('protrade_tick_writer_rows_total', 'Ticks written to DuckDB', lambda: tick_writer.rows_written)
+    metrics.counter_fn('protrade_tick_writer_flushes_total', 'Successful tick batch writes', lambda: tick_writer.flushes)
+    metrics.counter_fn('protrade_tick_writer_failed_attempts_total', 'Failed tick batch write attempts', lambda: tick_writer.failed_attempts)
+    metrics.gauge_fn('protrade_tick_writer_batch_size', 'Current adaptive writer batch size', lambda: tick_writer.batch_size)
+    metrics.gauge_fn('protrade_tick_writer_flush_interval_seconds', 'Current adaptive writer flush interval', lambda: tick_writer.flush_interval)
+    metrics.gauge_fn('protrade_tick_writer_last_flush_ms', 'Duration of the last tick batch write', lambda: tick_writer.last_flush_ms)
+    metrics.gauge_fn('protrade_emitter_pending', 'Socket.IO updates waiting for the next flush', lambda: emitter.stats()['pending'])
+    metrics.counter_fn('protrade_emitter_published_total', 'Socket.IO updates published', lambda: emitter.published)
+    metrics.counter_fn('protrade_emitter_conflated_total', 'Socket.IO updates superseded before sending', lambda: emitter.conflated)
+    metrics.counter_fn('protrade_emitter_emitted_total', 'Socket.IO emits sent', lambda: emitter.emitted)
+    metrics.gauge_fn('protrade_subscriptions', 'Active (instrument, interval) chart subscriptions', lambda: len(room_subscribers))
+    metrics.counter_fn('protrade_ticks_total', 'Ticks ingested per instrument', tick_rates.totals, labels=('instrument',))
+    metrics.gauge_fn('protrade_tick_rate', 'Ticks per second per instrument since the previous scrape', tick_rates.rates, labels=('instrument',))
+    metrics.gauge_fn('protrade_db_reader_cursors', 'Per-thread DuckDB reader cursors', lambda: db.connections.stats()['readers'])
+    metrics.counter_fn('protrade_db_query_cache_requests_total', 'LocalDB query cache lookups by result',
+                       lambda: {('hit',): db.cache.hits, ('miss',): db.cache.misses}, labels=('result',))
+    metrics.gauge_fn('protrade_db_query_cache_bytes', 'Estimated size of cached query results', lambda: db.cache.bytes)
+    metrics.counter_fn('protrade_db_writer_contended_total', 'DuckDB writer lock acquisitions that had to wait', lambda: db.connections.contended)
+    metrics.gauge_fn('protrade_db_gateway_pending', 'DB gateway calls waiting for a worker',
+                     lambda: {(p,): n for p, n in db_gateway.stats()['pending'].items()}, labels=('priority',))
+    metrics.counter_fn('protrade_db_gateway_timeouts_total', 'DB gateway calls that exceeded their timeout',
+                       lambda: {(p,): n for p, n in db_gateway.stats()['timed_out'].items()}, labels=('priority',))
+
+_register_metrics()
+
 # Start background threads
-threading.Thread(target=periodic_flush, daemon=True).start()
+tick_writer.start()
 threading.Thread(target=periodic_maintenance, daemon=True).start()
 
-last_emit_times = {}
-
 def on_message(message: Union[Dict, str]):
-    global tick_buffer
+    started = time.perf_counter()
     try:
         data = json.loads(message) if isinstance(message, str) else message
         feeds_map = {}
@@ -175,6 +270,9 @@ def on_message(message: Union[Dict, str]):
         sym_feeds = {}
         today_str = current_time.strftime("%Y-%m-%d")
 
+        # Replayed ticks already carry their ltq; they are neither stored again nor built into live bars
+        replay = bool(data.get('replay'))
+
         for inst_key, feed_datum in feeds_map.items():
             # Standard Quote Feed Deduplication (in addition to Chart)
             if feed_datum.get('source') != 'tv_chart_fallback':
@@ -188,6 +286,10 @@ def on_message(message: Union[Dict, str]):
                     continue # Skip redundant quote
                 last_processed_tick[inst_key] = {'ts_ms': ts_ms, 'price': price, 'volume': volume}
 
+            # Keep the provider's own timestamp (ms) before falling back to local time
+            provider_ts = safe_int(feed_datum.get('ts_ms'))
+            if 0 < provider_ts < 10000000000: provider_ts *= 1000
+
             # Use technical symbol as is
             feed_datum.update({
                 'instrumentKey': inst_key,
@@ -199,6 +301,12 @@ def on_message(message: Union[Dict, str]):
             ts_val = safe_int(feed_datum.get('ts_ms') or time.time() * 1000)
             if 0 < ts_val < 10000000000: ts_val *= 1000
             feed_datum['ts_ms'] = ts_val
+            feed_datum['provider_ts_ms'] = provider_ts
+
+            if replay:
+                feed_datum['ltq'] = safe_int(feed_datum.get('ltq'))
+                sym_feeds[inst_key] = feed_datum
+                continue
 
             delta_vol = 0
             is_index = inst_key in UPSTOX_INDEX_MAP or "INDEX" in inst_key.upper()
@@ -249,68 +357,90 @@ def on_message(message: Union[Dict, str]):
             feed_datum['ltq'] = safe_int(delta_vol)
             sym_feeds[inst_key] = feed_datum
 
-        # Throttled UI Emission
-        now = time.time()
-        if now - last_emit_times.get('GLOBAL_TICK', 0) > 0.05:
+        # Latest quote per instrument room; intermediate ticks are conflated by the emitter
+        for inst_key, feed in sym_feeds.items():
+            emitter.publish_keyed('raw_tick', inst_key.upper(), inst_key, feed, merge=_merge_quotes)
+
+        # Replayed history must not reach the live bar state or the live chart rooms' bars
+        if bar_builder is not None and not replay:
             for inst_key, feed in sym_feeds.items():
-                # Emit to specific technical symbol room
-                emit_event('raw_tick', {inst_key: feed}, room=inst_key.upper())
-            last_emit_times['GLOBAL_TICK'] = now
-
-        with buffer_lock:
-            tick_buffer.extend(list(sym_feeds.values()))
-            if len(tick_buffer) >= TICK_BATCH_SIZE:
-                threading.Thread(target=flush_tick_buffer, daemon=True).start()
+                # Bar state is only kept while a built interval is charted
+                if not has_built_subscriber(inst_key):
+                    continue
+                _publish_bar_changes(inst_key, bar_builder.update(inst_key, feed['ts_ms'], feed['last_price'], feed['ltq']))
+
+        pending = 0
+        for inst_key, feed in sym_feeds.items():
+            tick_rates.mark(inst_key)
+            if replay:
+                continue
+            # Candle volume from chart fallbacks is not a cumulative session volume
+            cum_vol = None
+            if feed['source'] != 'tv_chart_fallback':
+                cum_vol = feed.get('tv_volume')
+                if cum_vol is None:
+                    cum_vol = feed.get('upstox_volume')
+            pending = tick_buffers.append(
+                inst_key, feed['ts_ms'], feed['last_price'], feed['ltq'], feed['source'],
+                oi=_optional_float(feed.get('oi')),
+                volume=_optional_float(cum_vol),
+                bid=_optional_float(feed.get('bid')),
+                ask=_optional_float(feed.get('ask')),
+                provider_ts_ms=feed['provider_ts_ms'],
+                raw=feed
+            )
+        if pending:
+            tick_writer.notify(pending)
+
+        observe_stage('on_message', started)
+        if data.get('recv_ts'):
+            observe_stage('ingest', data['recv_ts'])
     except Exception as e:
         logger.error(f"Error in data_engine on_message: {e}")
 
 def subscribe_instrument(instrument_key: str, sid: str, interval: str = "1"):
     instrument_key = instrument_key.upper()
-    key = (instrument_key, str(interval))
-    if key not in room_subscribers:
-        room_subscribers[key] = set()
-    if sid not in room_subscribers[key]:
-        room_subscribers[key].add(sid)
-        logger.info(f"Room {instrument_key} ({interval}m) now has {len(room_subscribers[key])} subscribers")
+    interval = str(interval)
+    count = room_subscribers.add(instrument_key, interval, sid)
+    logger.info(f"Room {instrument_key} ({interval}m) now has {count} subscribers")
     for provider in live_stream_registry.get_all():
         try:
             provider.set_callback(on_message)
             provider.start()
-            provider.subscribe([instrument_key], interval=interval)
+            provider.subscribe([instrument_key], interval=get_upstream_interval(interval))
         except Exception as e:
             logger.error(f"Error subscribing via provider: {e}")
 
 def is_sid_using_instrument(sid: str, instrument_key: str) -> bool:
     """Check if a specific client is still using this instrument in any interval."""
-    instrument_key = instrument_key.upper()
-    for (r_key, r_interval), sids in room_subscribers.items():
-        if r_key == instrument_key and sid in sids:
-            return True
-    return False
+    return room_subscribers.is_sid_using(sid, instrument_key.upper())
 
 def unsubscribe_instrument(instrument_key: str, sid: str, interval: str = "1"):
     instrument_key = instrument_key.upper()
-    key = (instrument_key, str(interval))
-    if key in room_subscribers and sid in room_subscribers[key]:
-        room_subscribers[key].remove(sid)
-        logger.info(f"Room {instrument_key} ({interval}m) now has {len(room_subscribers[key])} subscribers")
-        if len(room_subscribers[key]) == 0:
-            logger.info(f"Unsubscribing from {instrument_key} ({interval}m) as no more subscribers")
+    interval = str(interval)
+    remaining = room_subscribers.remove(instrument_key, interval, sid)
+    if remaining is None:
+        return
+    logger.info(f"Room {instrument_key} ({interval}m) now has {remaining} subscribers")
+    if remaining == 0:
+        active_intervals = room_subscribers.intervals(instrument_key)
+        if bar_builder is not None and not any(is_built_interval(i) for i in active_intervals):
+            # Last built-interval room for the instrument closed: its bars are re-seeded if one reopens
+            bar_builder.discard(instrument_key)
+        upstream = get_upstream_interval(interval)
+        # Built intervals share an upstream session; only release it once nothing needs it
+        still_needed = any(get_upstream_interval(i) == upstream for i in active_intervals)
+        if not still_needed:
+            logger.info(f"Unsubscribing from {instrument_key} ({upstream}m) as no more subscribers")
             for provider in live_stream_registry.get_all():
                 try:
-                    provider.unsubscribe(instrument_key, interval=interval)
+                    provider.unsubscribe(instrument_key, interval=upstream)
                 except Exception as e:
                     logger.error(f"Error unsubscribing via provider: {e}")
-            del room_subscribers[key]
 
 def handle_disconnect(sid: str):
     """Cleanup all subscriptions for a disconnected client."""
-    to_cleanup = []
-    for (key, interval), sids in room_subscribers.items():
-        if sid in sids:
-            to_cleanup.append((key, interval))
-
-    for key, interval in to_cleanup:
+    for key, interval in room_subscribers.keys_for_sid(sid):
         unsubscribe_instrument(key, sid, interval)
 
 def start_websocket_thread(token: str, keys: List[str]):
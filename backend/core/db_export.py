@@ -0,0 +1,275 @@
+"""
+Streaming DB Export
+/api/db/export runs the query on its own DuckDB cursor in a dedicated thread
+and pulls the result as Arrow record batches (``fetch_record_batch``),
+encoding each batch as CSV, Parquet (one row group per batch) or Arrow IPC as
+it arrives. Encoded chunks reach the response through a small bounded queue,
+so memory stays at a few batches however large the result, and a slow client
+pauses the query instead of buffering it. Exports bypass the DB gateway so a
+long download never occupies one of its workers. Row, byte and outcome counts
+are exported on /api/metrics.
+"""
+import asyncio
+import io
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Dict, Optional
+
+import duckdb
+import pyarrow.csv as pa_csv
+import pyarrow.ipc as pa_ipc
+import pyarrow.parquet as pa_parquet
+
+from core.metrics import metrics
+from db.local_db import db
+from db.gateway import QueryTimeout
+
+try:
+    from config import DB_EXPORT_CONFIG
+except ImportError:
+    DB_EXPORT_CONFIG = {"batch_size": 100000, "max_batch_size": 1000000, "buffered_chunks": 4,
+                        "max_concurrent": 2, "open_timeout": 15, "stall_timeout": 120}
+
+logger = logging.getLogger(__name__)
+
+# format -> (media type, file extension, writer factory(sink, schema))
+FORMATS = {
+    'csv': ('text/csv', 'csv', lambda sink, schema: pa_csv.CSVWriter(sink, schema)),
+    'parquet': ('application/vnd.apache.parquet', 'parquet',
+                lambda sink, schema: pa_parquet.ParquetWriter(sink, schema, compression='zstd')),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows', lambda sink, schema: pa_ipc.new_stream(sink, schema)),
+}
+
+_DONE = object()
+
+
+class ExportBusy(Exception):
+    """Raised when every export slot is in use."""
+
+
+def select_statement(sql: str) -> duckdb.Statement:
+    """The parsed statement if ``sql`` is exactly one SELECT, else ValueError (a cursor would run every statement)."""
+    try:
+        statements = duckdb.extract_statements(sql)
+    except duckdb.Error as e:
+        raise ValueError(str(e)) from None
+    if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+        raise ValueError("Only a single SELECT statement can be exported")
+    return statements[0]
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write target for the pyarrow writers; ``drain()`` hands over everything written since the last call."""
+
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._parts = b''.join(self._parts), []
+        return data
+
+
+class ExportStream:
+    """
+    One running export. The producer thread (``_run``) executes the query,
+    reports whether it returned any rows through ``_opened`` and then encodes
+    batch after batch into ``_chunks``; ``chunks()`` is the response body.
+    """
+
+    def __init__(self, exporter: "DBExporter", statement: duckdb.Statement, fmt: str, batch_size: int):
+        self.exporter = exporter
+        self.statement = statement
+        self.batch_size = batch_size
+        self.media_type, extension, self._make_writer = FORMATS[fmt]
+        self.filename = f"export.{extension}"
+        self.rows = 0
+        self._chunks: queue.Queue = queue.Queue(maxsize=exporter.buffered_chunks)
+        self._opened: Future = Future()
+        self._cancelled = threading.Event()
+        self._cursor = None
+
+    def _put(self, item: Any) -> bool:
+        """Blocks while the client is behind; False once the export was cancelled or the client stalled."""
+        deadline = time.monotonic() + self.exporter.stall_timeout
+        while not self._cancelled.is_set():
+            try:
+                self._chunks.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                if time.monotonic() > deadline:
+                    logger.warning(f"DB export abandoned: client read nothing for {self.exporter.stall_timeout}s")
+                    self._cancelled.set()
+        return False
+
+    def _run(self):
+        if not self._opened.set_running_or_notify_cancel():
+            self.exporter._finished(self, 'cancelled')
+            return
+        outcome = 'failed'
+        writer = None
+        try:
+            self._cursor = db.connections.cursor()
+            result = self._cursor.execute(self.statement)
+            to_reader = getattr(result, 'to_arrow_reader', None) or result.fetch_record_batch
+            reader = to_reader(self.batch_size)
+            batch = next(reader, None)
+            self._opened.set_result(batch is not None)
+            if batch is None:
+                outcome = 'completed'
+                return
+            sink = _ChunkSink()
+            writer = self._make_writer(sink, reader.schema)
+            while batch is not None:
+                writer.write_batch(batch)
+                self.rows += batch.num_rows
+                chunk = sink.drain()
+                if chunk and not self._put(chunk):
+                    return
+                batch = next(reader, None)
+            writer.close()
+            writer = None
+            tail = sink.drain()
+            if (not tail or self._put(tail)) and self._put(_DONE):
+                outcome = 'completed'
+        except Exception as e:
+            if not self._opened.done():
+                self._opened.set_exception(e)
+            elif not self._cancelled.is_set():
+                logger.error(f"DB export failed after {self.rows} rows: {e}")
+                self._put(e)
+        finally:
+            if self._cancelled.is_set() and outcome != 'completed':
+                outcome = 'cancelled'
+            if writer is not None:
+                try:
+                    writer.close()
+                except Exception:
+                    pass
+            if self._cursor is not None:
+                try:
+                    self._cursor.close()
+                except Exception:
+                    pass
+            self.exporter._finished(self, outcome)
+
+    def cancel(self):
+        """Stops the producer: interrupts the running statement and unblocks a waiting reader."""
+        if self._cancelled.is_set():
+            return
+        self._cancelled.set()
+        cursor = self._cursor
+        if cursor is not None:
+            try:
+                cursor.interrupt()
+            except Exception as e:
+                logger.debug(f"Could not interrupt export query: {e}")
+        try:
+            self._chunks.put_nowait(_DONE)
+        except queue.Full:
+            pass
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        """Response body; closing it early (client disconnect) cancels the export."""
+        try:
+            while True:
+                item = await asyncio.to_thread(self._chunks.get)
+                if item is _DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                self.exporter.bytes += len(item)
+                yield item
+        finally:
+            self.cancel()
+
+
+class DBExporter:
+    """``await open(sql, fmt, batch_size)`` -> ExportStream, or None when the query returns no rows."""
+
+    def __init__(self, config: Dict[str, Any] = DB_EXPORT_CONFIG):
+        self.batch_size = config.get("batch_size", 100000)
+        self.max_batch_size = config.get("max_batch_size", 1000000)
+        self.buffered_chunks = max(1, config.get("buffered_chunks", 4))
+        self.max_concurrent = max(1, config.get("max_concurrent", 2))
+        self.open_timeout = config.get("open_timeout", 15)
+        self.stall_timeout = config.get("stall_timeout", 120)
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        self._stats_lock = threading.Lock()
+
+        # Stats
+        self.active = 0
+        self.outcomes = {'completed': 0, 'cancelled': 0, 'failed': 0}
+        self.rows = 0
+        self.bytes = 0
+
+    async def open(self, sql: str, fmt: str = 'csv', batch_size: Optional[int] = None) -> Optional[ExportStream]:
+        """
+        Starts the query and waits for its first batch, so SQL errors and empty
+        results surface before the response starts. Raises ValueError for an
+        unknown format or anything but a single SELECT statement (exports read
+        on a plain cursor, outside the writer lock and the query cache),
+        ExportBusy when all slots are taken and QueryTimeout if the first
+        batch takes longer than ``open_timeout``.
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}")
+        statement = select_statement(sql)
+        batch_size = min(max(1, int(batch_size or self.batch_size)), self.max_batch_size)
+        if not self._slots.acquire(blocking=False):
+            raise ExportBusy(f"{self.max_concurrent} exports already running")
+        with self._stats_lock:
+            self.active += 1
+        stream = ExportStream(self, statement, fmt, batch_size)
+        threading.Thread(target=stream._run, name="db-export", daemon=True).start()
+        try:
+            has_rows = await asyncio.wait_for(asyncio.wrap_future(stream._opened), self.open_timeout)
+        except asyncio.TimeoutError:
+            stream.cancel()
+            raise QueryTimeout(f"Export query did not return a first batch within {self.open_timeout:g}s") from None
+        except asyncio.CancelledError:
+            stream.cancel()
+            raise
+        return stream if has_rows else None
+
+    def _finished(self, stream: ExportStream, outcome: str):
+        with self._stats_lock:
+            self.active -= 1
+            self.outcomes[outcome] += 1
+            self.rows += stream.rows
+        self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                'active': self.active,
+                'max_concurrent': self.max_concurrent,
+                'batch_size': self.batch_size,
+                **self.outcomes,
+                'rows': self.rows,
+                'bytes': self.bytes,
+            }
+
+
+db_exporter = DBExporter()
+
+metrics.counter_fn('protrade_db_exports_total', 'DB exports by outcome',
+                   lambda: {(outcome, ): count for outcome, count in db_exporter.outcomes.items()}, labels=('outcome',))
+metrics.counter_fn('protrade_db_export_rows_total', 'Rows streamed by DB exports', lambda: db_exporter.rows)
+metrics.counter_fn('protrade_db_export_bytes_total', 'Encoded bytes sent by DB exports', lambda: db_exporter.bytes)
@@ -0,0 +1,284 @@
+"""
+Instrument Metadata Index
+The metadata table (Upstox instrument master, ~100k rows) loaded once into
+sorted, fixed-width NumPy columns: instrument key <-> HRN lookups are binary
+searches and underlying/type/exchange are interned into small string tables,
+so SymbolMapper never has to query DuckDB on a cache miss. The columns are
+saved as .npy files in a new versioned directory per snapshot and
+memory-mapped on the next start, and are only rebuilt when the metadata table
+has changed.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from db.local_db import db, DB_PATH
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+INSTRUMENT_INDEX_PATH = os.path.abspath(os.getenv('INSTRUMENT_INDEX_PATH', os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), 'instrument_index')))
+DERIVATIVE_TYPES = ('FUT', 'CE', 'PE', 'CALL', 'PUT')
+
+# Rows sorted by upper-cased instrument key; hrn_sorted/hrn_rows is the HRN -> row permutation
+COLUMNS = ('key_upper', 'key', 'hrn', 'hrn_sorted', 'hrn_rows', 'underlying', 'type', 'exchange', 'expiry', 'strike')
+
+BUILD_SQL = f"""
+    SELECT instrument_key AS key, upper(instrument_key) AS key_upper, upper(coalesce(hrn, '')) AS hrn,
+           CASE WHEN upper(json_extract_string(meta, '$.type')) IN {DERIVATIVE_TYPES}
+                THEN upper(coalesce(json_extract_string(meta, '$.symbol'), ''))
+                ELSE upper(coalesce(hrn, '')) END AS underlying,
+           upper(coalesce(json_extract_string(meta, '$.type'), '')) AS type,
+           upper(coalesce(json_extract_string(meta, '$.exchange'), '')) AS exchange,
+           coalesce(CAST(TRY_CAST(json_extract_string(meta, '$.expiry') AS DATE) - DATE '1970-01-01' AS INTEGER), -1) AS expiry,
+           TRY_CAST(json_extract_string(meta, '$.strike') AS DOUBLE) AS strike
+    FROM metadata
+    WHERE instrument_key IS NOT NULL
+    ORDER BY key_upper
+"""
+
+
+def _encode(values) -> np.ndarray:
+    """Fixed-width UTF-8 bytes column (at least 1 byte wide so empty indexes still save)."""
+    encoded = [str(v or '').encode('utf-8') for v in values]
+    width = max((len(v) for v in encoded), default=1) or 1
+    return np.array(encoded, dtype=f'S{width}')
+
+
+def _intern(values, strings: List[str], lookup: Dict[str, int]) -> np.ndarray:
+    """Codes into the shared string table, adding unseen values."""
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, v in enumerate(values):
+        code = lookup.get(v)
+        if code is None:
+            code = lookup[v] = len(strings)
+            strings.append(v)
+        codes[i] = code
+    return codes
+
+
+def _search(column: np.ndarray, value: bytes) -> int:
+    if not len(column) or len(value) > column.dtype.itemsize:
+        return -1
+    i = int(np.searchsorted(column, value))
+    if i < len(column) and column[i] == value:
+        return i
+    return -1
+
+
+class InstrumentIndex:
+    """
+    ``load()`` at startup (memory-maps the snapshot, or rebuilds it from the
+    metadata table if it is missing or stale); ``rebuild()`` after an
+    instrument master sync.
+    """
+
+    def __init__(self, path: str = INSTRUMENT_INDEX_PATH):
+        self.path = path
+        self._build_lock = threading.Lock()
+        # (columns, interned strings, string -> code), swapped as one reference
+        self._state = None
+        self.source = None
+        self.load_ms = 0.0
+
+    @property
+    def loaded(self) -> bool:
+        return self._state is not None
+
+    def __len__(self) -> int:
+        return len(self._state[0]['key']) if self._state is not None else 0
+
+    def _stamp(self) -> Dict[str, Any]:
+        """Identifies the metadata table contents the index was built from."""
+        count, updated = db.connections.reader().execute(
+            "SELECT count(*), CAST(max(updated_at) AS VARCHAR) FROM metadata"
+        ).fetchone()
+        return {'rows': int(count), 'updated_at': updated}
+
+    def load(self, rebuild: bool = False) -> int:
+        started = time.perf_counter()
+        with self._build_lock:
+            stamp = self._stamp()
+            if not rebuild and self._load_snapshot(stamp):
+                self.source = 'snapshot'
+            else:
+                self._build(stamp)
+                self.source = 'db'
+        self.load_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"Instrument index: {len(self)} instruments from {self.source} in {self.load_ms:.1f}ms")
+        return len(self)
+
+    def rebuild(self) -> int:
+        return self.load(rebuild=True)
+
+    def _current_dir(self) -> Optional[str]:
+        """Directory of the active snapshot, named by the CURRENT pointer file."""
+        try:
+            with open(os.path.join(self.path, 'CURRENT')) as f:
+                name = f.read().strip()
+        except OSError:
+            return None
+        return os.path.join(self.path, name) if name else None
+
+    def _load_snapshot(self, stamp: Dict[str, Any]) -> bool:
+        directory = self._current_dir()
+        if directory is None or not os.path.exists(os.path.join(directory, 'manifest.json')):
+            return False
+        try:
+            with open(os.path.join(directory, 'manifest.json')) as f:
+                manifest = json.load(f)
+            if manifest.get('version') != INDEX_VERSION or manifest.get('stamp') != stamp:
+                return False
+            cols = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r') for name in COLUMNS}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable instrument index snapshot: {e}")
+            return False
+        self._swap(cols, manifest['strings'])
+        self._prune(os.path.basename(directory))
+        return True
+
+    def _build(self, stamp: Dict[str, Any]):
+        table = db.connections.reader().execute(BUILD_SQL).to_arrow_table()
+        data = {name: table.column(name).to_pylist() for name in ('key', 'key_upper', 'hrn', 'underlying', 'type', 'exchange')}
+
+        strings: List[str] = ['']
+        codes = {'': 0}
+        key_upper = _encode(data['key_upper'])
+        hrn = _encode(data['hrn'])
+        # Equal HRNs (e.g. the NSE and BSE listing of a stock) resolve to the NSE key
+        not_nse = ~np.char.startswith(key_upper, b'NSE')
+        hrn_rows = np.lexsort((not_nse, hrn)).astype(np.int32)
+
+        cols = {
+            'key_upper': key_upper,
+            'key': _encode(data['key']),
+            'hrn': hrn,
+            'hrn_sorted': hrn[hrn_rows],
+            'hrn_rows': hrn_rows,
+            'underlying': _intern(data['underlying'], strings, codes),
+            'type': _intern(data['type'], strings, codes),
+            'exchange': _intern(data['exchange'], strings, codes),
+            'expiry': table.column('expiry').to_numpy().astype(np.int32),
+            'strike': table.column('strike').to_numpy(zero_copy_only=False).astype(np.float64),
+        }
+        self._swap(cols, strings)
+        try:
+            self._save(cols, strings, stamp)
+        except Exception as e:
+            logger.warning(f"Could not save instrument index snapshot: {e}")
+
+    def _save(self, cols: Dict[str, np.ndarray], strings: List[str], stamp: Dict[str, Any]):
+        # Every snapshot gets a new directory: files of the previous one may still be
+        # memory-mapped, and mapped files cannot be replaced or deleted on Windows
+        name = f'snapshot-{time.time_ns()}'
+        directory = os.path.join(self.path, name)
+        os.makedirs(directory)
+        for column, values in cols.items():
+            np.save(os.path.join(directory, f'{column}.npy'), values)
+        with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'stamp': stamp, 'rows': len(cols['key']), 'strings': strings}, f)
+        pointer = os.path.join(self.path, 'CURRENT.tmp')
+        with open(pointer, 'w') as f:
+            f.write(name)
+        os.replace(pointer, os.path.join(self.path, 'CURRENT'))
+        self._prune(name)
+
+    def _prune(self, current: str):
+        """Deletes everything but the active snapshot; one still mapped is retried on the next save or load."""
+        for entry in os.listdir(self.path):
+            if entry in (current, 'CURRENT'):
+                continue
+            target = os.path.join(self.path, entry)
+            try:
+                if os.path.isdir(target):
+                    shutil.rmtree(target)
+                else:
+                    os.remove(target)
+            except OSError as e:
+                logger.debug(f"Instrument index: could not remove old snapshot {entry} yet: {e}")
+
+    def _swap(self, cols: Dict[str, np.ndarray], strings: List[str]):
+        self._state = (cols, strings, {s: i for i, s in enumerate(strings)})
+
+    def _record(self, cols: Dict[str, np.ndarray], strings: List[str], row: int) -> Dict[str, Any]:
+        expiry = int(cols['expiry'][row])
+        strike = float(cols['strike'][row])
+        return {
+            'instrument_key': cols['key'][row].decode('utf-8'),
+            'hrn': cols['hrn'][row].decode('utf-8'),
+            'underlying': strings[cols['underlying'][row]],
+            'type': strings[cols['type'][row]],
+            'exchange': strings[cols['exchange'][row]],
+            'expiry': str(np.datetime64(expiry, 'D')) if expiry >= 0 else None,
+            'strike': strike if strike == strike else None,
+        }
+
+    def _row_for_key(self, cols: Dict[str, np.ndarray], instrument_key: str) -> int:
+        return _search(cols['key_upper'], instrument_key.upper().replace(':', '|').encode('utf-8'))
+
+    def hrn_for(self, instrument_key: str) -> Optional[str]:
+        if self._state is None or not instrument_key:
+            return None
+        cols = self._state[0]
+        row = self._row_for_key(cols, instrument_key)
+        if row < 0:
+            return None
+        return cols['hrn'][row].decode('utf-8') or None
+
+    def key_for(self, hrn: str) -> Optional[str]:
+        if self._state is None or not hrn:
+            return None
+        cols = self._state[0]
+        i = _search(cols['hrn_sorted'], hrn.upper().strip().encode('utf-8'))
+        if i < 0:
+            return None
+        return cols['key'][cols['hrn_rows'][i]].decode('utf-8')
+
+    def get(self, instrument_key: str) -> Optional[Dict[str, Any]]:
+        state = self._state
+        if state is None or not instrument_key:
+            return None
+        cols, strings, _ = state
+        row = self._row_for_key(cols, instrument_key)
+        return self._record(cols, strings, row) if row >= 0 else None
+
+    def find(self, underlying: str, expiry: Optional[str] = None, option_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Instruments of an underlying (optionally one expiry YYYY-MM-DD and type CE/PE/FUT), by strike."""
+        state = self._state
+        if state is None:
+            return []
+        cols, strings, codes = state
+        code = codes.get(underlying.upper())
+        if code is None:
+            return []
+        mask = np.asarray(cols['underlying']) == code
+        if expiry:
+            mask &= np.asarray(cols['expiry']) == int(np.datetime64(expiry, 'D').astype(np.int64))
+        if option_type:
+            type_code = codes.get(option_type.upper())
+            if type_code is None:
+                return []
+            mask &= np.asarray(cols['type']) == type_code
+        rows = np.flatnonzero(mask)
+        rows = rows[np.argsort(np.asarray(cols['strike'])[rows], kind='stable')]
+        return [self._record(cols, strings, int(r)) for r in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        state = self._state
+        return {
+            'loaded': state is not None,
+            'instruments': len(self),
+            'source': self.source,
+            'load_ms': round(self.load_ms, 3),
+            'bytes': sum(c.nbytes for c in state[0].values()) if state is not None else 0,
+            'strings': len(state[1]) if state is not None else 0,
+        }
+
+
+instrument_index = InstrumentIndex()
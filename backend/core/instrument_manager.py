@@ -1,122 +1,129 @@
+import asyncio
 import logging
+import os
+import tempfile
 import httpx
-import gzip
-import io
-import pandas as pd
 from datetime import datetime
-from db.local_db import db
-from core.symbol_mapper import symbol_mapper
+from db.local_db import db, IST_OFFSET_MS
+from db.gateway import db_gateway, MAINTENANCE
+from core.instrument_index import instrument_index
 
 logger = logging.getLogger(__name__)
 
+# Streams a downloaded {exchange}.json.gz straight through DuckDB's JSON reader and builds
+# metadata rows in one vectorized pass. The hrn expression mirrors SymbolMapper._generate_hrn;
+# epoch-ms expiries are converted to IST dates.
+PARSE_INSTRUMENTS_SQL = f"""
+    WITH src AS (
+        SELECT instrument_key, name, trading_symbol, instrument_type, upper(coalesce(instrument_type, '')) AS itype,
+               CASE WHEN regexp_full_match(expiry, '[0-9]+') THEN CAST(epoch_ms(CAST(expiry AS BIGINT) + {IST_OFFSET_MS}) AS DATE)
+                    ELSE TRY_CAST(split_part(expiry, 'T', 1) AS DATE) END AS expiry,
+               strike_price, lot_size, tick_size, exchange, segment
+        FROM read_json(?, format = 'array', compression = 'gzip', columns = {{
+            'instrument_key': 'VARCHAR', 'name': 'VARCHAR', 'trading_symbol': 'VARCHAR', 'instrument_type': 'VARCHAR',
+            'expiry': 'VARCHAR', 'strike_price': 'DOUBLE', 'lot_size': 'DOUBLE', 'tick_size': 'DOUBLE',
+            'exchange': 'VARCHAR', 'segment': 'VARCHAR'
+        }})
+        WHERE coalesce(instrument_key, '') <> ''
+        QUALIFY row_number() OVER (PARTITION BY instrument_key) = 1
+    ), named AS (
+        SELECT *, CASE WHEN sym LIKE '%NIFTY 50%' THEN 'NIFTY'
+                       WHEN sym LIKE '%NIFTY BANK%' THEN 'BANKNIFTY'
+                       WHEN sym LIKE '%NIFTY FIN SERVICE%' THEN 'FINNIFTY'
+                       ELSE sym END AS symbol,
+               upper(strftime(expiry, '%d %b %Y')) AS expiry_str
+        FROM (
+            SELECT *, upper(CASE WHEN itype IN ('EQ', 'EQUITY') AND coalesce(trading_symbol, '') <> '' THEN trading_symbol
+                                 ELSE coalesce(name, '') END) AS sym
+            FROM src
+        )
+    )
+    SELECT instrument_key,
+           CASE WHEN itype IN ('INDEX', 'EQ', 'EQUITY', 'TB') THEN symbol
+                WHEN itype = 'FUT' THEN concat_ws(' ', symbol, expiry_str, 'FUT')
+                WHEN itype IN ('CE', 'PE', 'CALL', 'PUT') THEN trim(concat_ws(' ', symbol, expiry_str,
+                    CASE WHEN itype IN ('CE', 'CALL') THEN 'CALL' ELSE 'PUT' END,
+                    CASE WHEN coalesce(strike_price, 0) <> 0 THEN CAST(CAST(trunc(strike_price) AS BIGINT) AS VARCHAR) ELSE '' END))
+                ELSE instrument_key END AS hrn,
+           CAST(json_object('symbol', name, 'trading_symbol', trading_symbol, 'type', instrument_type,
+                            'expiry', CAST(expiry AS VARCHAR), 'strike', strike_price, 'lot_size', lot_size,
+                            'tick_size', tick_size, 'exchange', exchange, 'segment', segment) AS VARCHAR) AS meta
+    FROM named
+"""
+
+
 class InstrumentManager:
     EXCHANGES = ["NSE", "NFO", "BSE", "BFO"]
     BASE_URL = "https://assets.upstox.com/market-quote/instruments/exchange/{}.json.gz"
 
+    def __init__(self):
+        self._load_lock = asyncio.Lock()
+
     async def fetch_and_store_instruments(self, force=False):
-        """Downloads instrument files from Upstox and stores them in metadata table."""
+        """Downloads instrument files from Upstox and upserts changed rows into the metadata table."""
+        exchanges = self.EXCHANGES
         if not force:
-            # Check if already synced today
+            # Only exchanges without a successful sync today
             try:
-                res = db.query("SELECT MAX(updated_at) as last_sync FROM metadata")
-                if res and res[0]['last_sync']:
-                    last_sync = res[0]['last_sync']
-                    if not isinstance(last_sync, datetime):
-                        # Handle string if necessary
-                        from pandas import Timestamp
-                        if isinstance(last_sync, Timestamp):
-                            last_sync = last_sync.to_pydatetime()
-                        else:
-                            last_sync = datetime.fromisoformat(str(last_sync))
-
-                    if last_sync.date() == datetime.now().date():
-                        logger.info("Upstox instrument master already synced today. Skipping.")
-                        return
+                rows = await db_gateway.query("SELECT exchange, synced_at FROM instrument_sync", priority=MAINTENANCE)
+                today = datetime.now().date()
+                synced = {r['exchange'] for r in rows if r['synced_at'] and r['synced_at'].date() == today}
+                exchanges = [e for e in exchanges if e not in synced]
+                if not exchanges:
+                    logger.info("Upstox instrument master already synced today. Skipping.")
+                    return
             except Exception as e:
                 logger.warning(f"Failed to check last sync date: {e}")
 
-        logger.info("Starting Upstox instrument master sync...")
-        total_count = 0
-
-        async with httpx.AsyncClient() as client:
-            for exchange in self.EXCHANGES:
-                try:
-                    url = self.BASE_URL.format(exchange)
-                    logger.info(f"Fetching instruments for {exchange} from {url}")
-                    response = await client.get(url, timeout=60.0)
+        logger.info(f"Starting Upstox instrument master sync for {', '.join(exchanges)}...")
+        limits = httpx.Limits(max_connections=len(exchanges), max_keepalive_connections=len(exchanges))
+        async with httpx.AsyncClient(timeout=60.0, limits=limits) as client:
+            results = await asyncio.gather(*(self._sync_exchange(client, e) for e in exchanges))
+
+        total_count = sum(r[0] for r in results)
+        total_changed = sum(r[1] for r in results)
+        logger.info(f"Instrument master sync complete. Total instruments: {total_count}, changed: {total_changed}")
+        if total_changed:
+            await db_gateway.run(instrument_index.rebuild, priority=MAINTENANCE)
+
+    async def _sync_exchange(self, client: httpx.AsyncClient, exchange: str) -> tuple:
+        """Streams one exchange file to disk and loads it. Returns (rows, changed)."""
+        url = self.BASE_URL.format(exchange)
+        fd, path = tempfile.mkstemp(prefix=f"instruments_{exchange}_", suffix=".json.gz")
+        try:
+            logger.info(f"Fetching instruments for {exchange} from {url}")
+            with os.fdopen(fd, "wb") as f:
+                async with client.stream("GET", url) as response:
                     if response.status_code != 200:
                         logger.warning(f"Failed to fetch instruments for {exchange}: {response.status_code}")
-                        continue
-
-                    with gzip.GzipFile(fileobj=io.BytesIO(response.content)) as f:
-                        df = pd.read_json(f)
-
-                    if df.empty:
-                        logger.info(f"No instruments found for {exchange}")
-                        continue
-
-                    count = self._process_df(df)
-                    total_count += count
-                    logger.info(f"Successfully loaded {count} instruments for {exchange}")
-
-                except Exception as e:
-                    logger.error(f"Error syncing instruments for {exchange}: {e}")
-
-        logger.info(f"Instrument master sync complete. Total instruments: {total_count}")
-
-    def _process_df(self, df: pd.DataFrame) -> int:
-        """Processes the dataframe and updates metadata table in bulk."""
-        count = 0
-
-        # Optimize by converting to dict records first
-        records = df.to_dict('records')
-        batch = []
-
-        for row in records:
-            ikey = row.get('instrument_key')
-            if not ikey: continue
-
-            # Format expiry correctly
-            expiry = row.get('expiry')
-            if expiry and not pd.isna(expiry):
-                try:
-                    if isinstance(expiry, (int, float)):
-                        expiry = datetime.fromtimestamp(expiry / 1000).strftime('%Y-%m-%d')
-                    else:
-                        expiry = str(expiry).split('T')[0]
-                except:
-                    pass
-
-            meta = {
-                'symbol': row.get('name'),
-                'trading_symbol': row.get('trading_symbol'),
-                'type': row.get('instrument_type'),
-                'expiry': expiry,
-                'strike': row.get('strike_price'),
-                'lot_size': row.get('lot_size'),
-                'tick_size': row.get('tick_size'),
-                'exchange': row.get('exchange'),
-                'segment': row.get('segment')
-            }
-
-            # Use SymbolMapper to generate HRN
-            hrn = symbol_mapper._generate_hrn(ikey, meta)
-
-            batch.append({
-                'instrument_key': ikey,
-                'hrn': hrn,
-                'meta': meta
-            })
-
-            if len(batch) >= 2000: # Slightly larger batch for better perf
-                db.bulk_update_metadata(batch)
-                count += len(batch)
-                batch = []
-
-        if batch:
-            db.bulk_update_metadata(batch)
-            count += len(batch)
-
-        return count
+                        return 0, 0
+                    async for chunk in response.aiter_bytes():
+                        f.write(chunk)
+
+            # Downloads overlap, but exchanges are loaded one after another so the sync
+            # holds a single gateway worker
+            async with self._load_lock:
+                rows, changed = await db_gateway.run(self._load_file, path, priority=MAINTENANCE)
+                if not rows:
+                    logger.info(f"No instruments found for {exchange}")
+                    return 0, 0
+                await db_gateway.run(db.record_instrument_sync, exchange, rows, changed, priority=MAINTENANCE)
+            logger.info(f"Successfully loaded {rows} instruments for {exchange} ({changed} new or changed)")
+            return rows, changed
+        except Exception as e:
+            logger.error(f"Error syncing instruments for {exchange}: {e}")
+            return 0, 0
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _load_file(self, path: str) -> tuple:
+        """Parses a downloaded instrument file into Arrow and upserts it. Returns (rows, changed)."""
+        staged = db.connections.reader().execute(PARSE_INSTRUMENTS_SQL, (path,)).to_arrow_table()
+        if not staged.num_rows:
+            return 0, 0
+        return staged.num_rows, db.upsert_metadata_arrow(staged)
 
 instrument_manager = InstrumentManager()
@@ -0,0 +1,672 @@
+"""
+Intraday Indicator Engine
+Candles are converted once into contiguous NumPy columns per chart and the
+registered indicators (EMA, RVOL, volume bubbles/rays/nodes, EVWMA, DynPivot,
+psychology zones and signals) run against them. Rolling windows and EMAs are
+shared intermediates: each (column, window, op) series is computed once per
+update however many indicators read it (e.g. the 20-bar volume mean feeds
+RVOL, bubbles and the psychology metrics).
+
+State is kept per chart (instrument, interval, settings), so a refresh only
+recomputes the bars from the first appended or amended candle onwards, i.e.
+O(new bars) instead of re-running the analyzers over the whole window. The
+formulas match VolumeAnalyzer/MarketPsychologyAnalyzer. When the provider
+window slides forward, values of the retained bars are kept (EMAs continue
+from their earlier seed instead of re-seeding at the new window start).
+"""
+import logging
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple, Type
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from core.metrics import metrics
+from core.utils import safe_int, safe_float
+
+try:
+    from config import INTRADAY_INDICATOR_CONFIG
+except ImportError:
+    INTRADAY_INDICATOR_CONFIG = {"max_states": 256}
+
+logger = logging.getLogger(__name__)
+
+OHLCV = ('ts', 'o', 'h', 'l', 'c', 'v')
+PSYCH_LOOKBACK = 20
+PSYCH_EMA_SPAN = 50
+BUBBLE_DELTA = 0.75
+EMA_COLORS = ("#3b82f6", "#f97316", "#a855f7", "#eab308")
+
+_OPS = {
+    'mean': lambda view: view.mean(axis=1),
+    'sum': lambda view: view.sum(axis=1),
+    'max': lambda view: view.max(axis=1),
+    'std': lambda view: view.std(axis=1, ddof=1),
+}
+
+
+def _safe_div(num, den):
+    """num / den with zero denominators replaced by 1 (pandas ``.replace(0, 1)``)."""
+    return num / np.where(den == 0, 1.0, den)
+
+
+def _rolling(x: np.ndarray, window: int, start: int, op) -> np.ndarray:
+    """``op`` over trailing windows for bars start..n-1 (NaN until a full window exists)."""
+    n = len(x)
+    out = np.full(n - start, np.nan)
+    first = max(start, window - 1)
+    if first < n:
+        view = sliding_window_view(x[first - window + 1:n], window)
+        out[first - start:] = op(view)
+    return out
+
+
+def _ema(x: np.ndarray, out: np.ndarray, span: int, start: int):
+    """pandas ewm(span, adjust=False).mean() continued from out[start - 1]."""
+    alpha = 2.0 / (span + 1)
+    prev = out[start - 1] if start > 0 else np.nan
+    for i in range(start, len(x)):
+        value = x[i]
+        if value != value:
+            out[i] = prev
+            continue
+        prev = value if prev != prev else alpha * value + (1 - alpha) * prev
+        out[i] = prev
+
+
+def _shift(x: np.ndarray, sl: slice) -> np.ndarray:
+    """x[i - 1] for i in sl (NaN before the first bar)."""
+    if sl.start:
+        return x[sl.start - 1:sl.stop - 1]
+    return np.concatenate([[np.nan], x[:sl.stop - 1]])
+
+
+class _PointSeries:
+    """(global bar index, point) pairs for one line/marker output, truncated and extended in place."""
+    __slots__ = ('bars', 'points')
+
+    def __init__(self):
+        self.bars: List[int] = []
+        self.points: List[Any] = []
+
+    def truncate(self, lo: int, hi: int):
+        """Keeps only entries with lo <= bar < hi."""
+        cut = bisect_left(self.bars, hi)
+        del self.bars[cut:], self.points[cut:]
+        cut = bisect_left(self.bars, lo)
+        if cut:
+            del self.bars[:cut], self.points[:cut]
+
+    def append(self, bar: int, point: Any):
+        self.bars.append(bar)
+        self.points.append(point)
+
+    def since(self, bar: int) -> List[Any]:
+        return self.points[bisect_left(self.bars, bar):]
+
+    def items_since(self, bar: int):
+        i = bisect_left(self.bars, bar)
+        return zip(self.bars[i:], self.points[i:])
+
+
+# ==================== REGISTRY ====================
+
+class Indicator:
+    """
+    Base class for registered indicators. ``compute(start)`` extends the
+    indicator's series/points for bars start..n-1 (start is 0 the first time);
+    ``output()`` returns the chart payload or None. ``requires`` lists
+    indicator ids computed before this one.
+    """
+    id: str = ''
+    requires: Tuple[str, ...] = ()
+
+    def __init__(self, state: 'IndicatorState', indicator_id: str):
+        self.state = state
+        self.id = indicator_id
+
+    def compute(self, start: int):
+        raise NotImplementedError
+
+    def output(self) -> Optional[Dict[str, Any]]:
+        return None
+
+
+class IndicatorRegistry:
+    """Indicator classes by id; a class registered as ``prefix_*`` handles a family of ids (``ema_9``, ``ema_20``)."""
+
+    def __init__(self):
+        self._classes: Dict[str, Type[Indicator]] = {}
+
+    def register(self, cls: Type[Indicator]) -> Type[Indicator]:
+        self._classes[cls.id] = cls
+        return cls
+
+    def ids(self) -> List[str]:
+        return list(self._classes)
+
+    def class_for(self, indicator_id: str) -> Type[Indicator]:
+        cls = self._classes.get(indicator_id)
+        if cls is not None:
+            return cls
+        for pattern, family in self._classes.items():
+            if pattern.endswith('*') and indicator_id.startswith(pattern[:-1]) and family.accepts(indicator_id[len(pattern) - 1:]):
+                return family
+        raise ValueError(f"Unknown indicator: {indicator_id}")
+
+    def resolve(self, ids: Iterable[str]) -> List[str]:
+        """ids plus their requirements, requirements first."""
+        order: List[str] = []
+
+        def visit(indicator_id: str):
+            if indicator_id in order:
+                return
+            for required in self.class_for(indicator_id).requires:
+                visit(required)
+            order.append(indicator_id)
+
+        for indicator_id in ids:
+            visit(indicator_id)
+        return order
+
+
+indicator_registry = IndicatorRegistry()
+
+
+@indicator_registry.register
+class EMALine(Indicator):
+    id = 'ema_*'
+
+    @staticmethod
+    def accepts(suffix: str) -> bool:
+        return suffix.isdigit() and int(suffix) > 0
+
+    def __init__(self, state: 'IndicatorState', indicator_id: str):
+        super().__init__(state, indicator_id)
+        self.span = int(indicator_id.split('_', 1)[1])
+        self.color = EMA_COLORS[sum(isinstance(i, EMALine) for i in state.indicators.values()) % len(EMA_COLORS)]
+
+    def compute(self, start: int):
+        st = self.state
+        ts, ema, points = st.cols['ts'], st.ema(self.span), st.points(self.id)
+        for i in range(start, len(ts)):
+            if np.isfinite(ema[i]):
+                points.append(st.base + i, {"time": int(ts[i]), "value": float(ema[i])})
+
+    def output(self):
+        st = self.state
+        return {
+            "id": self.id, "title": f"EMA {self.span}", "type": "line",
+            "style": {"color": self.color, "lineWidth": 1},
+            "data": st.points(self.id).since(st.base + self.span - 1),
+            "hideLabel": True
+        }
+
+
+class VolumeIndicator(Indicator):
+    """VolumeAnalyzer outputs: nothing until the window covers its longest rolling length."""
+
+    @property
+    def ready(self) -> bool:
+        return len(self.state) >= self.state.min_volume_bars
+
+
+@indicator_registry.register
+class RVOL(VolumeIndicator):
+    """Relative volume; exposed per candle through ``IndicatorState.rvol()`` rather than as a chart series."""
+    id = 'rvol'
+
+    def compute(self, start: int):
+        st = self.state
+        sma = st.rolling('v', st.rvol_len, 'mean')
+        st.elementwise('rvol', lambda sl: _safe_div(st.cols['v'][sl], sma[sl]))
+
+
+@indicator_registry.register
+class VolumeBubbles(VolumeIndicator):
+    id = 'volume_bubbles'
+    requires = ('rvol',)
+
+    def compute(self, start: int):
+        st = self.state
+        ts, o, c, v = st.cols['ts'], st.cols['o'], st.cols['c'], st.cols['v']
+        long_, short = st.rolling('v', st.bubble_long_len, 'mean'), st.rolling('v', st.bubble_short_len, 'mean')
+        ratio = st.elementwise('bubble_ratio', lambda sl: np.nan_to_num(_safe_div(v[sl], (long_[sl] + short[sl]) / 2), nan=0.0, posinf=np.inf, neginf=-np.inf))
+        rvol = st.series['rvol']
+        flagged = st.elementwise('bubble_flag', lambda sl: ((ratio[sl] > st.bubble_threshold) | (rvol[sl] > st.rvol_threshold)).astype(np.float64))
+        points = st.points(self.id)
+        for i in np.flatnonzero(flagged[start:]) + start:
+            points.append(st.base + int(i), (int(ts[i]), bool(c[i] > o[i]), float(ratio[i])))
+
+    def output(self):
+        st = self.state
+        if not self.ready or not st.show_bubbles:
+            return None
+        markers = [{
+            "time": t,
+            "position": "belowBar" if up else "aboveBar",
+            "color": "rgba(34, 197, 94, 0.3)" if up else "rgba(239, 68, 68, 0.3)",
+            "shape": "circle",
+            "text": f"V:{ratio:.1f}x",
+            "id": f"bubble_{bar - st.base}"
+        } for bar, (t, up, ratio) in st.points(self.id).items_since(st.base)]
+        return {"id": self.id, "type": "markers", "title": "Vol Bubbles", "data": markers} if markers else None
+
+
+@indicator_registry.register
+class VolumeNodes(VolumeIndicator):
+    id = 'volume_nodes'
+
+    def compute(self, start: int):
+        st = self.state
+        ts, o, h, l, c, v = (st.cols[k] for k in OHLCV)
+        sma, std = st.rolling('v', st.node_std_len, 'mean'), st.rolling('v', st.node_std_len, 'std')
+        steps = (_safe_div(v[start:] - sma[start:], std[start:]) - st.bubble_threshold) / BUBBLE_DELTA
+        points = st.points(self.id)
+        for j in np.flatnonzero(steps >= 4):
+            i = start + int(j)
+            points.append(st.base + i, {
+                "price": float((h[i] + l[i] + c[i] + c[i]) / 4),
+                "color": "rgba(0, 255, 255, 0.5)" if c[i] > o[i] else "rgba(255, 165, 0, 0.5)",
+                "width": 3 if steps[j] >= 6 else 2,
+                "time": int(ts[i])
+            })
+
+    def output(self):
+        data = self.state.points(self.id).since(self.state.base)
+        return {"id": self.id, "type": "price_lines", "title": "High Vol Nodes", "data": data} if self.ready and data else None
+
+
+@indicator_registry.register
+class VolumeRays(VolumeIndicator):
+    id = 'volume_rays'
+    requires = ('volume_bubbles',)
+
+    def compute(self, start: int):
+        st = self.state
+        ts, o, h, l, c, v = (st.cols[k] for k in OHLCV)
+        points = st.points(self.id)
+        for i in np.flatnonzero(st.series['bubble_flag'][start:]) + start:
+            uw = h[i] - max(o[i], c[i])
+            lw = min(o[i], c[i]) - l[i]
+            if uw > st.ray_wick_ratio * lw:
+                price, level = h[i], "Resistance"
+            elif lw > st.ray_wick_ratio * uw:
+                price, level = l[i], "Support"
+            else:
+                price, level = c[i], "Pivot"
+            color = "rgba(34, 197, 94, 0.6)" if level == "Support" else "rgba(239, 68, 68, 0.6)" if level == "Resistance" else "rgba(59, 130, 246, 0.6)"
+            points.append(st.base + int(i), {"price": float(price), "color": color, "width": 2, "title": f"V-Ray ({level})", "time": int(ts[i])})
+
+    def output(self):
+        st = self.state
+        if not self.ready or not st.show_rays:
+            return None
+        data = st.points(self.id).since(st.base)[-st.max_rays:]
+        return {"id": self.id, "type": "price_lines", "title": "V-Ray", "data": data, "hideLabel": True} if data else None
+
+
+@indicator_registry.register
+class EVWMA(VolumeIndicator):
+    id = 'evwma'
+
+    def compute(self, start: int):
+        st = self.state
+        ts, c, v = st.cols['ts'], st.cols['c'], st.cols['v']
+        shares = st.rolling('v', st.evwma_len, 'sum')
+        evwma, points = st.own_series('evwma'), st.points(self.id)
+        for i in range(max(start, 1), len(ts)):
+            prev = evwma[i - 1] if evwma[i - 1] == evwma[i - 1] else c[i]
+            evwma[i] = prev * (shares[i] - v[i]) / shares[i] + v[i] * c[i] / shares[i] if shares[i] > 0 else prev
+            if np.isfinite(evwma[i]) and evwma[i] > 0:
+                points.append(st.base + i, {"time": int(ts[i]), "value": float(evwma[i])})
+
+    def output(self):
+        st = self.state
+        data = st.points(self.id).since(st.base)
+        if not self.ready or not st.show_evwma or not data:
+            return None
+        return {"id": self.id, "type": "line", "title": "EVWMA", "style": {"color": "#63c58c", "lineWidth": 2}, "data": data, "hideLabel": True}
+
+
+@indicator_registry.register
+class DynPivot(VolumeIndicator):
+    id = 'dyn_pivot'
+
+    def compute(self, start: int):
+        st = self.state
+        ts, o, h, l, c, v = (st.cols[k] for k in OHLCV)
+        pc = st.elementwise('pC', lambda sl: c[sl] - o[sl])
+        abs_pc = st.elementwise('pC_abs', lambda sl: np.abs(pc[sl]))
+        mb = st.rolling('pC_abs', st.pivot_force_len, 'max')
+        st.elementwise('force', lambda sl: pc[sl] * v[sl] * abs_pc[sl] / np.where(mb[sl] == 0, 1.0, mb[sl]))
+        netf = st.rolling('force', st.pivot_force_len, 'mean')
+        st.elementwise('netF_abs', lambda sl: np.abs(netf[sl]))
+        st.elementwise('pivot_base', lambda sl: np.where(pc[sl] > 0, h[sl], l[sl]))
+        st.elementwise('close_move', lambda sl: np.abs(c[sl] - _shift(c, sl)) / c[sl])
+        base_p = st.rolling('pivot_base', st.pivot_len, 'mean')
+        fs = st.rolling('close_move', st.pivot_len, 'mean')
+        hn = st.rolling('netF_abs', st.pivot_len, 'max')
+        dyn = st.own_series('dynP')
+        tail = slice(start, len(ts))
+        dyn[tail] = base_p[tail] + _safe_div(netf[tail], hn[tail]) * c[tail] * np.where(np.isnan(fs[tail]), 0.0, fs[tail])
+        points = st.points(self.id)
+        for i in range(start, len(ts)):
+            if np.isfinite(dyn[i]) and dyn[i] > 0:
+                points.append(st.base + i, {"time": int(ts[i]), "value": float(dyn[i])})
+
+    def output(self):
+        st = self.state
+        data = st.points(self.id).since(st.base)
+        if not self.ready or not st.show_dyn_pivot or not data:
+            return None
+        return {"id": self.id, "type": "line", "title": "DynPivot", "style": {"color": "#e44451", "lineWidth": 2}, "data": data, "hideLabel": True}
+
+
+@indicator_registry.register
+class BattleZones(Indicator):
+    """MarketPsychologyAnalyzer absorption zones: high relative volume with little price progress."""
+    id = 'battle_zones'
+
+    def compute(self, start: int):
+        st = self.state
+        o, h, l, c, v = (st.cols[k] for k in OHLCV[1:])
+        vol_sma = st.rolling('v', PSYCH_LOOKBACK, 'mean')
+        r_vol = st.elementwise('psych_r_vol', lambda sl: v[sl] / vol_sma[sl])
+        tr = st.elementwise('psych_tr', lambda sl: np.maximum(h[sl] - l[sl], np.abs(h[sl] - _shift(c, sl))))
+        atr = st.rolling('psych_tr', PSYCH_LOOKBACK, 'mean')
+        eff = st.elementwise('psych_eff', lambda sl: (tr[sl] / atr[sl]) / np.where(r_vol[sl] == 0, 1.0, r_vol[sl]))
+        st.elementwise('psych_zone', lambda sl: np.where((r_vol[sl] > 2.5) & (eff[sl] < 0.6), np.where(c[sl] < o[sl], h[sl], l[sl]), np.nan))
+
+    def zones(self) -> np.ndarray:
+        """Zone prices in bar order (bars from the lookback up to, not including, the forming bar)."""
+        n = len(self.state)
+        if n < PSYCH_EMA_SPAN:
+            return np.empty(0)
+        zone = self.state.series['psych_zone'][PSYCH_LOOKBACK:n - 1]
+        return zone[~np.isnan(zone)]
+
+    def output(self):
+        zones = self.zones()
+        if not len(zones):
+            return None
+        return {
+            "id": self.id, "type": "price_lines", "title": "Zones",
+            "data": [{"price": float(p), "color": "rgba(59, 130, 246, 0.4)", "lineStyle": 2, "title": ""} for p in zones]
+        }
+
+
+@indicator_registry.register
+class PsychSignals(Indicator):
+    """Trap signals confirmed near a battle zone (MarketPsychologyAnalyzer.run_state_machine)."""
+    id = 'psych_signals'
+    requires = ('battle_zones',)
+
+    def compute(self, start: int):
+        st = self.state
+        o, c = st.cols['o'], st.cols['c']
+        ema, r_vol, eff = st.ema(PSYCH_EMA_SPAN), st.series['psych_r_vol'], st.series['psych_eff']
+
+        def side(sl):
+            active = (r_vol[sl] > 2.2) & (eff[sl] < 0.65)
+            short = active & (c[sl] < ema[sl]) & (c[sl] < o[sl])
+            long_ = active & (c[sl] > ema[sl]) & (c[sl] > o[sl])
+            return np.where(short, -1.0, np.where(long_, 1.0, 0.0))
+
+        st.elementwise('psych_side', side)
+
+    def signals(self) -> List[Tuple[int, str]]:
+        """(time, SHORT_TRAP/LONG_TRAP) pairs; zones from the whole window count, as in the analyzer."""
+        st = self.state
+        zones = st.indicators['battle_zones'].zones()
+        side = st.series['psych_side']
+        candidates = np.flatnonzero(side[PSYCH_EMA_SPAN:] != 0) + PSYCH_EMA_SPAN
+        if not len(zones) or not len(candidates):
+            return []
+        close = st.cols['c'][candidates]
+        near = (np.abs(close[:, None] - zones[None, :]) / close[:, None] < 0.0015).any(axis=1)
+        ts = st.cols['ts']
+        return [(int(ts[i]), "SHORT_TRAP" if side[i] < 0 else "LONG_TRAP") for i in candidates[near]]
+
+    def output(self):
+        markers = [{
+            "time": t,
+            "position": "aboveBar" if "SHORT" in sig_type else "belowBar",
+            "color": "#ef4444" if "SHORT" in sig_type else "#22c55e",
+            "shape": "arrowDown" if "SHORT" in sig_type else "arrowUp",
+            "text": sig_type
+        } for t, sig_type in self.signals()]
+        return {"id": self.id, "type": "markers", "title": "Psychology", "data": markers} if markers else None
+
+
+# Default /api/tv/intraday indicator set after the two EMAs; symmetry_signals is
+# computed by api_server (it needs option candles), the rest by this engine
+INTRADAY_INDICATORS = ("psych_signals", "symmetry_signals", "volume_bubbles", "volume_nodes", "volume_rays", "evwma", "dyn_pivot", "rvol")
+
+
+def intraday_indicator_ids(indicators: Optional[Any] = None, ema_9: Optional[int] = None, ema_20: Optional[int] = None) -> List[str]:
+    """Requested indicator ids (comma-separated string or list); raises ValueError for unknown ids."""
+    if isinstance(indicators, str):
+        indicators = indicators.split(',')
+    if indicators:
+        requested = list(dict.fromkeys(str(i).strip() for i in indicators if str(i).strip()))
+    else:
+        requested = [f"ema_{ema_9 or 9}", f"ema_{ema_20 or 20}", *INTRADAY_INDICATORS]
+    indicator_registry.resolve([i for i in requested if i != 'symmetry_signals'])
+    return requested
+
+
+# ==================== STATE ====================
+
+class IndicatorState:
+    """
+    ``update(candles, ids)`` folds a freshly fetched, ascending candle list
+    into the state and brings the requested indicators (plus any requested
+    earlier) up to date from the first changed bar; ``outputs(ids)`` then
+    returns their chart payloads.
+    """
+
+    def __init__(self, settings: Optional[Dict[str, Any]] = None):
+        s = settings or {}
+        # Same defaults and overrides as VolumeAnalyzer.analyze
+        self.rvol_len = safe_int(s.get('rvol_len'), 20)
+        self.bubble_long_len = safe_int(s.get('bubble_long_len'), 100)
+        self.bubble_short_len = safe_int(s.get('bubble_short_len'), 10)
+        self.node_std_len = safe_int(s.get('node_std_len'), 48)
+        self.bubble_threshold = safe_float(s.get('bubble_threshold'), 2.5)
+        self.ray_wick_ratio = safe_float(s.get('ray_wick_ratio'), 1.5)
+        self.max_rays = safe_int(s.get('max_rays'), 50)
+        self.rvol_threshold = safe_float(s.get('rvol_threshold'), 2.0)
+        self.show_bubbles = s.get('show_bubbles', True)
+        self.show_rays = s.get('show_rays', True)
+        self.show_evwma = s.get('show_evwma', True)
+        self.show_dyn_pivot = s.get('show_dyn_pivot', True)
+        self.evwma_len = int(s.get('evwma_len', 5))
+        self.pivot_force_len = int(s.get('pivot_force_len', 20))
+        self.pivot_len = int(s.get('pivot_len', 10))
+        self.min_volume_bars = max(self.rvol_len, self.bubble_long_len, self.node_std_len)
+
+        self.lock = threading.RLock()
+        self.base = 0  # global index of window bar 0
+        self.cols: Dict[str, np.ndarray] = {k: np.empty(0) for k in OHLCV}
+        self.series: Dict[str, np.ndarray] = {}
+        self.lines: Dict[str, _PointSeries] = {}
+        self.indicators: Dict[str, Indicator] = {}  # active indicators, requirements first
+        self._start = 0
+        self._fresh: set = set()
+
+        # Stats
+        self.updates = 0
+        self.resets = 0
+        self.bars_computed = 0
+
+    def __len__(self) -> int:
+        return len(self.cols['ts'])
+
+    # ----- shared intermediates (each computed once per update) -----
+
+    def _derive(self, name: str, fill: Callable[[np.ndarray, int], None]) -> np.ndarray:
+        if name in self._fresh:
+            return self.series[name]
+        out, lo = self.series.get(name), self._start
+        if out is None:
+            out, lo = self.series.setdefault(name, np.full(len(self), np.nan)), 0
+        if lo < len(out):
+            fill(out, lo)
+        self._fresh.add(name)
+        return out
+
+    def column(self, name: str) -> np.ndarray:
+        return self.cols[name] if name in self.cols else self.series[name]
+
+    def elementwise(self, name: str, fn: Callable[[slice], np.ndarray]) -> np.ndarray:
+        """Per-bar series; ``fn(slice)`` returns its values for those bars."""
+        def fill(out, lo):
+            out[lo:] = fn(slice(lo, len(out)))
+        return self._derive(name, fill)
+
+    def rolling(self, source: str, window: int, op: str) -> np.ndarray:
+        """Trailing ``op`` (mean/sum/max/std) over ``window`` bars of a column or derived series."""
+        src = self.column(source)
+
+        def fill(out, lo):
+            out[lo:] = _rolling(src, window, lo, _OPS[op])
+        return self._derive(f'{source}:{op}:{window}', fill)
+
+    def ema(self, span: int, source: str = 'c') -> np.ndarray:
+        src = self.column(source)
+        return self._derive(f'{source}:ema:{span}', lambda out, lo: _ema(src, out, span, lo))
+
+    def own_series(self, name: str) -> np.ndarray:
+        """Series written by a single indicator's own compute (e.g. a recursive one)."""
+        out = self.series.get(name)
+        if out is None:
+            out = self.series[name] = np.full(len(self), np.nan)
+        return out
+
+    def points(self, name: str) -> _PointSeries:
+        points = self.lines.get(name)
+        if points is None:
+            points = self.lines[name] = _PointSeries()
+        return points
+
+    # ----- updates -----
+
+    def _divergence(self, new: np.ndarray) -> Tuple[int, int]:
+        """(bars to drop from the front, first differing bar in the new window); (-1, 0) means rebuild."""
+        ts = self.cols['ts']
+        if not len(ts):
+            return -1, 0
+        offset = int(np.searchsorted(ts, new[0, 0]))
+        if offset >= len(ts) or ts[offset] != new[0, 0]:
+            return -1, 0
+        old = np.column_stack([self.cols[k][offset:] for k in OHLCV])
+        m = min(len(old), len(new))
+        same = (old[:m] == new[:m]) | (np.isnan(old[:m]) & np.isnan(new[:m]))
+        changed = np.flatnonzero(~same.all(axis=1))
+        return offset, int(changed[0]) if len(changed) else m
+
+    def update(self, candles: List[List[float]], ids: Iterable[str]) -> int:
+        """Returns the first window index that was recomputed."""
+        new = np.array([c[:6] for c in candles], dtype=np.float64).reshape(-1, 6)
+        with self.lock:
+            order = indicator_registry.resolve(list(self.indicators) + list(ids))
+            self.updates += 1
+            offset, start = self._divergence(new) if len(new) else (-1, 0)
+            if offset < 0:
+                self.resets += 1
+                self.base += len(self)
+                self.series = {}
+                self.lines = {}
+                offset, start = 0, 0
+                previous = set()
+            else:
+                previous = set(self.indicators)
+            for indicator_id in order:
+                if indicator_id not in self.indicators:
+                    self.indicators[indicator_id] = indicator_registry.class_for(indicator_id)(self, indicator_id)
+            self.indicators = {i: self.indicators[i] for i in order}
+
+            keep_lo, keep_hi = offset, offset + start
+            self.base += keep_lo
+            for i, k in enumerate(OHLCV):
+                self.cols[k] = np.concatenate([self.cols[k][keep_lo:keep_hi], new[start:, i]])
+            n = len(new)
+            for name, values in self.series.items():
+                grown = np.full(n, np.nan)
+                grown[:start] = values[keep_lo:keep_hi]
+                self.series[name] = grown
+            for points in self.lines.values():
+                points.truncate(self.base, self.base + start)
+
+            self._start, self._fresh = start, set()
+            with np.errstate(divide='ignore', invalid='ignore'):
+                for indicator_id, indicator in self.indicators.items():
+                    since = start if indicator_id in previous else 0
+                    if since < n:
+                        indicator.compute(since)
+            self.bars_computed += n - start
+            return start
+
+    def compute(self, candles: List[List[float]], ids: List[str]) -> Tuple[List[Dict[str, Any]], Optional[List[float]]]:
+        """``update`` then ``outputs``/``rvol`` as one step, so a concurrent update of the same chart cannot interleave."""
+        with self.lock:
+            self.update(candles, ids)
+            return self.outputs(ids), self.rvol()
+
+    # ----- outputs -----
+
+    def outputs(self, ids: Iterable[str]) -> List[Dict[str, Any]]:
+        """Chart payloads of the given indicators (after ``update``), in the given order."""
+        with self.lock:
+            payloads = [self.indicators[i].output() for i in ids if i in self.indicators]
+        return [p for p in payloads if p]
+
+    def rvol(self) -> Optional[List[float]]:
+        """Per-candle relative volume, or None when the window is too short for volume analysis."""
+        with self.lock:
+            if 'rvol' not in self.series or len(self) < self.min_volume_bars:
+                return None
+            rvol = self.series['rvol']
+            return np.where(np.isfinite(rvol), rvol, 1.0).tolist()
+
+
+class IndicatorStateStore:
+    """LRU-bounded map of chart key -> IndicatorState."""
+
+    def __init__(self, max_states: int = 256):
+        self.max_states = max(1, max_states)
+        self._states: "OrderedDict[Hashable, IndicatorState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: Hashable, settings: Optional[Dict[str, Any]] = None) -> IndicatorState:
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = IndicatorState(settings)
+                while len(self._states) > self.max_states:
+                    self._states.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._states.move_to_end(key)
+            return state
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            states = list(self._states.values())
+        return {
+            'states': len(states),
+            'updates': sum(s.updates for s in states),
+            'resets': sum(s.resets for s in states),
+            'bars_computed': sum(s.bars_computed for s in states),
+            'evictions': self.evictions,
+        }
+
+
+intraday_states = IndicatorStateStore(INTRADAY_INDICATOR_CONFIG.get("max_states", 256))
+
+metrics.counter_fn('protrade_intraday_indicator_bars_total', 'Candles folded into incremental intraday indicator state',
+                   lambda: intraday_states.stats()['bars_computed'])
@@ -0,0 +1,71 @@
+"""
+Fast JSON Responses
+orjson-backed FastAPI response that encodes Arrow tables, NumPy arrays and
+naive (UTC) datetimes directly, so endpoints can return LocalDB.query_arrow /
+query_numpy results without a pandas round-trip. Falls back to the standard
+json module when orjson is not installed.
+"""
+import json
+import math
+from datetime import datetime
+from decimal import Decimal
+from typing import Any
+
+import numpy as np
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+def _default(obj: Any) -> Any:
+    """Types orjson (or json) does not encode natively."""
+    if pa is not None and isinstance(obj, (pa.Table, pa.RecordBatch)):
+        return obj.to_pylist()
+    if isinstance(obj, np.ma.MaskedArray):
+        values = obj.data.astype(object)
+        values[np.ma.getmaskarray(obj)] = None
+        return values.tolist()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def _default_stdlib(obj: Any) -> Any:
+    value = _default(obj)
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+if orjson is not None:
+    # Naive datetimes from DuckDB are UTC; NaN/inf become null
+    ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+    def dumps(content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+else:
+    def dumps(content: Any) -> bytes:
+        return json.dumps(content, default=_default_stdlib, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse that accepts Arrow tables and NumPy columns anywhere in ``content``."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
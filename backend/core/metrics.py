@@ -0,0 +1,180 @@
+"""
+Pipeline Metrics
+Low-overhead latency histograms, counters and callback gauges for the tick
+pipeline, rendered in the Prometheus text exposition format by /api/metrics.
+
+Stages (label ``stage`` of protrade_stage_latency_ms):
+    normalize      provider frame received -> normalized feed handed to data_engine
+    on_message     time spent inside data_engine.on_message
+    ingest         provider frame received -> tick staged for the writer
+    emit_queue     first pending Socket.IO update -> emitter flush
+    emit           Socket.IO send of one flush
+    writer_queue   oldest staged tick -> DB write start
+    db_commit      DuckDB insert of one tick batch
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+LATENCY_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Fixed-bucket histogram; one child per label combination."""
+
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS_MS, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple, list] = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, *label_values):
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._children.get(label_values)
+            if child is None:
+                child = self._children[label_values] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            child[idx] += 1
+            child[-2] += value
+            child[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            children = {k: list(v) for k, v in self._children.items()}
+        for label_values, child in sorted(children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, child):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, ('le', bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, ('le', '+Inf'))} {child[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {_format_value(round(child[-2], 6))}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {child[-1]}")
+        return lines
+
+
+class CallbackMetric:
+    """
+    Gauge or counter whose value is read when metrics are rendered.
+    ``fn`` returns a number, or a dict of label-value tuple -> number when ``labels`` are set.
+    """
+
+    def __init__(self, name: str, kind: str, help_text: str, fn: Callable, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.fn = fn
+        self.labels = tuple(labels)
+
+    def render(self) -> List[str]:
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        if self.labels:
+            for label_values, v in sorted(value.items()):
+                if not isinstance(label_values, tuple):
+                    label_values = (label_values,)
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(v)}")
+        elif value is not None:
+            lines.append(f"{self.name} {_format_value(value)}")
+        return lines
+
+
+class RateMeter:
+    """Per-key event counts with a rate (events/sec) measured between reads at least 1s apart."""
+
+    def __init__(self, min_window: float = 1.0):
+        self.min_window = min_window
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+        self._last_counts: Dict[str, int] = {}
+        self._last_read = time.monotonic()
+        self._rates: Dict[str, float] = {}
+
+    def mark(self, key: str, n: int = 1):
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + n
+
+    def totals(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def rates(self) -> Dict[str, float]:
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._last_read
+            if elapsed >= self.min_window:
+                self._rates = {
+                    key: round((count - self._last_counts.get(key, 0)) / elapsed, 3)
+                    for key, count in self._counts.items()
+                }
+                self._last_counts = dict(self._counts)
+                self._last_read = now
+            return dict(self._rates)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None and not isinstance(metric, CallbackMetric):
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def histogram(self, name: str, help_text: str, buckets=LATENCY_BUCKETS_MS, labels: Tuple[str, ...] = ()) -> Histogram:
+        return self._register(Histogram(name, help_text, buckets, labels))
+
+    def gauge_fn(self, name: str, help_text: str, fn: Callable, labels: Tuple[str, ...] = ()):
+        self._register(CallbackMetric(name, 'gauge', help_text, fn, labels))
+
+    def counter_fn(self, name: str, help_text: str, fn: Callable, labels: Tuple[str, ...] = ()):
+        self._register(CallbackMetric(name, 'counter', help_text, fn, labels))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+stage_latency = metrics.histogram(
+    'protrade_stage_latency_ms', 'Tick pipeline stage latency in milliseconds', labels=('stage',)
+)
+tick_rates = RateMeter()
+
+
+def observe_stage(stage: str, started: float, ended: Optional[float] = None):
+    """Records a stage duration from perf_counter() timestamps."""
+    stage_latency.observe(((ended if ended is not None else time.perf_counter()) - started) * 1000, stage)
@@ -14,9 +14,11 @@ import pandas as pd
 
 from config import OPTIONS_UNDERLYINGS, SNAPSHOT_CONFIG
 from db.local_db import db
+from db.gateway import db_gateway, SNAPSHOT, MAINTENANCE
 from core.interfaces import ILiveStreamProvider
 from core.provider_registry import options_data_registry, historical_data_registry, live_stream_registry
 from core.utils import safe_int, safe_float
+from core import data_engine
 from external.tv_options_wss import OptionsWSS
 
 # Import new modules
@@ -159,9 +161,9 @@ class OptionsManager:
                 logger.info(f"Processing backfill for {underlying} on {target_date_str}")
                 
                 # Get existing timestamps to avoid duplicate work and fill gaps
-                existing_data = db.query(
+                existing_data = await db_gateway.query(
                     "SELECT timestamp, spot_price FROM pcr_history WHERE underlying = ? AND CAST(timestamp AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Kolkata' AS DATE) = ?",
-                    (underlying, target_date_str)
+                    (underlying, target_date_str), priority=SNAPSHOT
                 )
                 existing_times_with_price = {}
                 if existing_data:
@@ -220,7 +222,7 @@ class OptionsManager:
                     )
                     
                     if rows:
-                        db.insert_options_snapshot(rows)
+                        await db_gateway.run(db.insert_options_snapshot, rows, priority=SNAPSHOT)
                         await self._calculate_pcr(underlying, snapshot_time, rows, spot_price)
                 
                 logger.info(f"Backfill complete for {underlying}")
@@ -419,9 +421,12 @@ class OptionsManager:
                 'ts_ms': safe_int(time.time() * 1000),
                 'last_price': lp,
                 'ltq': safe_int(data.get('volume')),
+                'bid': data.get('bid') or None,
+                'ask': data.get('ask') or None,
                 'source': 'options_wss'
             }
-            db.insert_ticks([tick])
+            # Staged for the tick writer thread; the WSS callback never waits on DuckDB
+            data_engine.enqueue_tick(tick)
 
         if underlying not in self.latest_chains:
             self.latest_chains[underlying] = {}
@@ -485,7 +490,7 @@ class OptionsManager:
 
     async def _update_monitored_range(self, underlying: str, spot: float):
         """Identify ATM +/- 5 strikes and ensure they are subscribed and monitored."""
-        chain_res = self.get_chain_with_greeks(underlying)
+        chain_res = await self.get_chain_with_greeks(underlying)
         chain = chain_res.get('chain', [])
         if not chain: return
 
@@ -547,7 +552,7 @@ class OptionsManager:
                 # Store previous chain for buildup analysis
                 self.previous_chains[underlying] = rows.copy()
                 
-                db.insert_options_snapshot(rows)
+                await db_gateway.run(db.insert_options_snapshot, rows, priority=SNAPSHOT)
                 rows_inserted = True
 
                 # Use the same timestamp as in rows
@@ -582,11 +587,11 @@ class OptionsManager:
                 target_keys.extend(["NSE_INDEX|NIFTY FIN SERVICE", "NSE|CNXFINANCE", "FINNIFTY"])
 
             placeholders = ",".join(["?"] * len(target_keys))
-            res = db.query(f"""
-                SELECT price FROM ticks
+            res = await db_gateway.query(f"""
+                SELECT close AS price FROM bars_1m
                 WHERE instrumentKey IN ({placeholders})
-                ORDER BY ts_ms DESC LIMIT 1
-            """, tuple(target_keys))
+                ORDER BY ts DESC, last_ts_ms DESC LIMIT 1
+            """, tuple(target_keys), priority=SNAPSHOT)
             
             if res and res[0]['price'] > 0:
                 logger.info(f"Spot Price discovered from Ticks for {underlying}: {res[0]['price']}")
@@ -604,11 +609,11 @@ class OptionsManager:
 
             # Layer 3: PCR History (Last recorded price)
             logger.info(f"Hist candles failed for {underlying}, trying PCR history fallback...")
-            last_pcr = db.query("""
+            last_pcr = await db_gateway.query("""
                 SELECT spot_price, underlying_price FROM pcr_history
                 WHERE underlying = ? AND (spot_price > 0 OR underlying_price > 0)
                 ORDER BY timestamp DESC LIMIT 1
-            """, (underlying,))
+            """, (underlying,), priority=SNAPSHOT)
 
             if last_pcr:
                 price = last_pcr[0].get('spot_price') or last_pcr[0].get('underlying_price') or 0
@@ -867,7 +872,7 @@ class OptionsManager:
                 continue
         
         if rows:
-            db.insert_options_snapshot(rows)
+            await db_gateway.run(db.insert_options_snapshot, rows, priority=SNAPSHOT)
             await self._calculate_pcr(underlying, timestamp, rows, spot_price=spot_price)
             logger.info(f"Saved TV snapshot for {underlying} with {len(rows)} rows")
             
@@ -899,9 +904,9 @@ class OptionsManager:
         # Fallback to local DB if symbols not found via provider
         if not self.symbol_map_cache[underlying]:
             logger.info(f"Symbols not found via provider for {underlying}, trying local DB fallback...")
-            db_res = db.query(
+            db_res = await db_gateway.query(
                 "SELECT DISTINCT symbol, strike, option_type FROM options_snapshots WHERE underlying = ? ORDER BY timestamp DESC LIMIT 200",
-                (underlying,)
+                (underlying,), priority=SNAPSHOT
             )
             for r in db_res:
                 symbol = r['symbol']
@@ -959,7 +964,7 @@ class OptionsManager:
         # We now rely on the robust spot_price discovery performed by the caller (take_snapshot)
         underlying_price = spot_price
         
-        db.insert_pcr_history({
+        await db_gateway.run(db.insert_pcr_history, {
             'timestamp': timestamp,
             'underlying': underlying,
             'pcr_oi': pcr_oi,
@@ -970,7 +975,7 @@ class OptionsManager:
             'spot_price': spot_price,
             'total_oi': total_oi,
             'total_oi_change': total_oi_change
-        })
+        }, priority=SNAPSHOT)
         
         # Track IV for analysis
         avg_iv = sum(r.get('iv', 0) for r in rows) / len(rows) if rows else 0
@@ -993,9 +998,9 @@ class OptionsManager:
                 logger.error(f"Error fetching expiries for {underlying}: {e}")
         return []
 
-    def get_chain_with_greeks(self, underlying: str) -> Dict[str, Any]:
+    async def get_chain_with_greeks(self, underlying: str) -> Dict[str, Any]:
         """Get option chain with Greeks calculated."""
-        latest_ts_res = db.query(
+        latest_ts_res = await db_gateway.query(
             "SELECT MAX(timestamp) as ts FROM options_snapshots WHERE underlying = ?",
             (underlying,)
         )
@@ -1004,7 +1009,7 @@ class OptionsManager:
             return {"chain": []}
         
         latest_ts = latest_ts_res[0]['ts']
-        chain = db.query(
+        chain = await db_gateway.query(
             "SELECT * FROM options_snapshots WHERE underlying = ? AND timestamp = ? ORDER BY strike ASC",
             (underlying, latest_ts),
             json_serialize=True
@@ -1013,7 +1018,7 @@ class OptionsManager:
         source = chain[0].get('source', 'unknown') if chain else 'unknown'
         
         # Fetch spot price from pcr_history
-        spot_res = db.query(
+        spot_res = await db_gateway.query(
             "SELECT spot_price, underlying_price FROM pcr_history WHERE underlying = ? AND timestamp <= ? ORDER BY timestamp DESC LIMIT 1",
             (underlying, latest_ts)
         )
@@ -1034,9 +1039,9 @@ class OptionsManager:
             "net_theta": round(net_theta, 2)
         }
     
-    def get_oi_buildup_analysis(self, underlying: str) -> Dict[str, Any]:
+    async def get_oi_buildup_analysis(self, underlying: str) -> Dict[str, Any]:
         """Get OI buildup analysis."""
-        current_chain = self.get_chain_with_greeks(underlying).get('chain', [])
+        current_chain = (await self.get_chain_with_greeks(underlying)).get('chain', [])
         previous_chain = self.previous_chains.get(underlying, [])
         
         return oi_buildup_analyzer.analyze_chain_buildup(current_chain, previous_chain)
@@ -1061,15 +1066,15 @@ class OptionsManager:
             'signal': signal
         }
     
-    def get_support_resistance(self, underlying: str) -> Dict[str, Any]:
+    async def get_support_resistance(self, underlying: str) -> Dict[str, Any]:
         """Get support and resistance levels based on OI with historical trend."""
-        chain_res = self.get_chain_with_greeks(underlying)
+        chain_res = await self.get_chain_with_greeks(underlying)
         chain = chain_res.get('chain', [])
         spot_price = chain_res.get('spot_price', 0)
         sr_data = oi_buildup_analyzer.get_support_resistance_from_oi(chain, spot_price=spot_price)
 
         # Add historical trend for these strikes
-        latest_ts_res = db.query(
+        latest_ts_res = await db_gateway.query(
             "SELECT DISTINCT timestamp FROM options_snapshots WHERE underlying = ? ORDER BY timestamp DESC LIMIT 10",
             (underlying,)
         )
@@ -1084,7 +1089,7 @@ class OptionsManager:
                 strike = level['strike']
                 opt_type = 'call' if level_type == 'resistance_levels' else 'put'
 
-                history = db.query(
+                history = await db_gateway.query(
                     f"SELECT timestamp, oi FROM options_snapshots WHERE underlying = ? AND strike = ? AND option_type = ? AND timestamp IN ({','.join(['?']*len(timestamps))}) ORDER BY timestamp ASC",
                     (underlying, strike, opt_type, *timestamps),
                     json_serialize=True
@@ -1107,7 +1112,7 @@ class OptionsManager:
         lower = spot * (1 - daily_iv)
 
         # Fine tune with OI concentrations
-        sr = self.get_support_resistance(underlying)
+        sr = await self.get_support_resistance(underlying)
         if sr.get('resistance_levels'):
             upper = min(upper, sr['resistance_levels'][0]['strike'])
         if sr.get('support_levels'):
@@ -1119,9 +1124,9 @@ class OptionsManager:
             "spot": spot
         }
 
-    def get_high_activity_strikes(self, underlying: str) -> List[Dict[str, Any]]:
+    async def get_high_activity_strikes(self, underlying: str) -> List[Dict[str, Any]]:
         """Highlights strikes with maximum OI, volume, and activity."""
-        chain = self.get_chain_with_greeks(underlying).get('chain', [])
+        chain = (await self.get_chain_with_greeks(underlying)).get('chain', [])
         if not chain: return []
 
         # Sort by Net Score: OI + Volume + |OI Change|
@@ -1135,7 +1140,7 @@ class OptionsManager:
 
     async def get_genie_insights(self, underlying: str) -> Dict[str, Any]:
         """Consolidated Genie insights for the dashboard."""
-        chain_res = self.get_chain_with_greeks(underlying)
+        chain_res = await self.get_chain_with_greeks(underlying)
         chain = chain_res.get('chain', [])
         spot = chain_res.get('spot_price', 0)
 
@@ -1143,7 +1148,7 @@ class OptionsManager:
         control = oi_buildup_analyzer.detect_market_control(chain)
 
         # Fetch history for sideways prediction
-        history_res = db.query(
+        history_res = await db_gateway.query(
             "SELECT spot_price, underlying_price, max_pain FROM pcr_history WHERE underlying = ? ORDER BY timestamp DESC LIMIT 10",
             (underlying,)
         )
@@ -1186,11 +1191,11 @@ class OptionsManager:
 
         try:
             # Find records with invalid spot prices
-            invalid_records = db.query("""
+            invalid_records = await db_gateway.query("""
                 SELECT timestamp, underlying FROM pcr_history
                 WHERE spot_price <= 0 OR spot_price IS NULL
                 ORDER BY timestamp DESC
-            """)
+            """, priority=MAINTENANCE)
 
             if not invalid_records:
                 logger.info("No invalid spot prices found to repair.")
@@ -1234,11 +1239,11 @@ class OptionsManager:
                 if best_price > 0 and closest_diff <= 600:
                     logger.info(f"Repairing {underlying} at {ts}: New Spot Price = {best_price}")
                     # Update pcr_history
-                    db.execute("""
+                    await db_gateway.run(db.execute, """
                         UPDATE pcr_history
                         SET spot_price = ?, underlying_price = ?
                         WHERE underlying = ? AND timestamp = ?
-                    """, (best_price, best_price, underlying, ts))
+                    """, (best_price, best_price, underlying, ts), priority=MAINTENANCE)
 
             logger.info("Spot price repair completed.")
 
@@ -51,7 +51,7 @@ historical_data_registry = ProviderRegistry(IHistoricalDataProvider)
 
 def initialize_default_providers():
     """Seed the registries with existing implementations."""
-    from config import UPSTOX_ACCESS_TOKEN
+    from config import UPSTOX_ACCESS_TOKEN, SYNTHETIC_FEED_CONFIG
     from external.providers import (
         TradingViewLiveStreamProvider,
         TrendlyneOptionsProvider,
@@ -66,6 +66,13 @@ def initialize_default_providers():
     live_stream_registry.register("tradingview", TradingViewLiveStreamProvider(), priority=10)
     if UPSTOX_ACCESS_TOKEN:
         live_stream_registry.register("upstox", UpstoxLiveStreamProvider(), priority=20)
+    if SYNTHETIC_FEED_CONFIG.get("enabled"):
+        from external.synthetic_feed import SyntheticFeedProvider
+        live_stream_registry.register("synthetic", SyntheticFeedProvider(
+            ticks_per_second=SYNTHETIC_FEED_CONFIG.get("ticks_per_second", 1000),
+            strikes_per_side=SYNTHETIC_FEED_CONFIG.get("strikes_per_side", 10),
+            chart_update_ratio=SYNTHETIC_FEED_CONFIG.get("chart_update_ratio", 0.05)
+        ), priority=0)
 
     # Options Data
     options_data_registry.register("trendlyne", TrendlyneOptionsProvider(), priority=20)
@@ -0,0 +1,153 @@
+"""
+Socket Emitter
+Per-room conflating emitter for high-rate Socket.IO updates.
+
+Producers on feed threads only record the latest value per (room, key); the
+event loop flushes every dirty room in one callback at a bounded rate. Each
+payload is serialized exactly once, by Socket.IO itself, using ``SocketJSONCodec``.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from db.local_db import LocalDBJSONEncoder
+from core.metrics import observe_stage
+
+logger = logging.getLogger(__name__)
+
+
+class SocketJSONCodec:
+    """JSON codec for socketio.AsyncServer(json=...) that understands the DB value types."""
+
+    @staticmethod
+    def dumps(obj, **kwargs):
+        return json.dumps(obj, cls=LocalDBJSONEncoder, **kwargs)
+
+    @staticmethod
+    def loads(s, **kwargs):
+        return json.loads(s, **kwargs)
+
+
+class CoalescingEmitter:
+    """
+    Conflates updates per room and flushes them from the event loop.
+
+    - ``publish_keyed``: latest (or merged) value per key, sent as one ``{key: value}`` map
+      per room (e.g. raw_tick, where the room is the instrument).
+    - ``publish`` with ``coalesce_key``: latest payload per (event, room, key), optionally
+      combined with the pending one through ``merge``.
+    - ``publish`` without a key: delivered in order on the next flush.
+    """
+
+    def __init__(self, max_rate_hz: float = 20.0):
+        self.interval = 1.0 / max_rate_hz if max_rate_hz > 0 else 0.0
+        self.sio = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._keyed: Dict[Tuple[str, Optional[str]], Dict[str, Any]] = {}
+        self._coalesced: Dict[Tuple[str, Optional[str], Any], Any] = {}
+        self._queued: List[Tuple[str, Any, Optional[str]]] = []
+        self._scheduled = False
+        self._dirty_at = 0.0
+        self._last_flush = 0.0
+
+        # Metrics
+        self.published = 0
+        self.conflated = 0
+        self.emitted = 0
+        self.flushes = 0
+
+    def attach(self, sio, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.sio = sio
+        self.loop = loop
+
+    def publish_keyed(self, event: str, room: Optional[str], key: str, value: Any,
+                      merge: Optional[Callable[[Any, Any], Any]] = None):
+        with self._lock:
+            pending = self._keyed.setdefault((event, room), {})
+            if key in pending:
+                self.conflated += 1
+                if merge:
+                    value = merge(pending[key], value)
+            pending[key] = value
+            self.published += 1
+            self._mark_dirty()
+
+    def publish(self, event: str, data: Any, room: Optional[str] = None, coalesce_key: Any = None,
+                merge: Optional[Callable[[Any, Any], Any]] = None):
+        with self._lock:
+            self.published += 1
+            if coalesce_key is None:
+                self._queued.append((event, data, room))
+            else:
+                slot = (event, room, coalesce_key)
+                previous = self._coalesced.get(slot)
+                if previous is not None:
+                    self.conflated += 1
+                    if merge:
+                        data = merge(previous, data)
+                self._coalesced[slot] = data
+            self._mark_dirty()
+
+    def _mark_dirty(self):
+        # Caller holds self._lock
+        if self._scheduled:
+            return
+        loop = self.loop
+        if not self.sio or not loop or not loop.is_running():
+            # Nobody to deliver to yet; don't let updates pile up
+            self._keyed.clear()
+            self._coalesced.clear()
+            self._queued.clear()
+            return
+        self._scheduled = True
+        self._dirty_at = time.perf_counter()
+        loop.call_soon_threadsafe(self._schedule)
+
+    def _schedule(self):
+        delay = max(0.0, self._last_flush + self.interval - self.loop.time())
+        self.loop.call_later(delay, self._flush)
+
+    def _flush(self):
+        with self._lock:
+            queued, self._queued = self._queued, []
+            coalesced, self._coalesced = self._coalesced, {}
+            keyed, self._keyed = self._keyed, {}
+            self._scheduled = False
+            dirty_at = self._dirty_at
+        self._last_flush = self.loop.time()
+        observe_stage('emit_queue', dirty_at)
+
+        batch = list(queued)
+        batch.extend((event, data, room) for (event, room, _), data in coalesced.items())
+        batch.extend((event, values, room) for (event, room), values in keyed.items())
+        if batch:
+            self.flushes += 1
+            self.emitted += len(batch)
+            self.loop.create_task(self._send(batch))
+
+    async def _send(self, batch: List[Tuple[str, Any, Optional[str]]]):
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(self.sio.emit(event, data, to=room) for event, data, room in batch),
+            return_exceptions=True
+        )
+        observe_stage('emit', started)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Emit Error: {result}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._queued) + len(self._coalesced) + sum(len(v) for v in self._keyed.values())
+        return {
+            'published': self.published,
+            'conflated': self.conflated,
+            'emitted': self.emitted,
+            'flushes': self.flushes,
+            'pending': pending,
+            'max_rate_hz': round(1.0 / self.interval, 2) if self.interval else None,
+        }
@@ -0,0 +1,138 @@
+"""
+Subscription Registry
+Two-way index of Socket.IO chart subscriptions: instrument -> interval -> sids
+and sid -> (instrument, interval) keys, with the smallest active interval per
+instrument cached and maintained incrementally.
+"""
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+Key = Tuple[str, str]
+
+
+def interval_minutes(interval: str) -> Optional[int]:
+    """Length of an interval in minutes, or None for intervals that cannot be primary."""
+    if interval.isdigit():
+        return int(interval)
+    if interval == 'D':
+        return 1440
+    return None
+
+
+class SubscriptionRegistry:
+    """
+    Thread-safe subscription index.
+
+    ``interval_mapper`` translates a requested interval into the interval that
+    actually drives it upstream (see data_engine.get_upstream_interval); the
+    cached primary interval is the smallest of those.
+    """
+
+    def __init__(self, interval_mapper: Optional[Callable[[str], str]] = None):
+        self.interval_mapper = interval_mapper or (lambda interval: interval)
+        self._lock = threading.RLock()
+        self._by_instrument: Dict[str, Dict[str, Set[str]]] = {}
+        self._by_sid: Dict[str, Set[Key]] = {}
+        # instrumentKey -> {minutes: [interval, number of active intervals mapped to it]}
+        self._primary_counts: Dict[str, Dict[int, list]] = {}
+        self._primary: Dict[str, str] = {}
+
+    def add(self, instrument_key: str, interval: str, sid: str) -> int:
+        """Registers sid for (instrument, interval); returns the subscriber count for that key."""
+        interval = str(interval)
+        with self._lock:
+            intervals = self._by_instrument.setdefault(instrument_key, {})
+            sids = intervals.get(interval)
+            if sids is None:
+                sids = intervals[interval] = set()
+                self._track_interval(instrument_key, interval, 1)
+            sids.add(sid)
+            self._by_sid.setdefault(sid, set()).add((instrument_key, interval))
+            return len(sids)
+
+    def remove(self, instrument_key: str, interval: str, sid: str) -> Optional[int]:
+        """
+        Unregisters sid from (instrument, interval).
+        Returns the remaining subscriber count, or None if sid was not subscribed.
+        """
+        interval = str(interval)
+        with self._lock:
+            intervals = self._by_instrument.get(instrument_key)
+            sids = intervals.get(interval) if intervals else None
+            if not sids or sid not in sids:
+                return None
+            sids.discard(sid)
+
+            keys = self._by_sid.get(sid)
+            if keys is not None:
+                keys.discard((instrument_key, interval))
+                if not keys:
+                    del self._by_sid[sid]
+
+            if not sids:
+                del intervals[interval]
+                self._track_interval(instrument_key, interval, -1)
+                if not intervals:
+                    del self._by_instrument[instrument_key]
+            return len(sids)
+
+    def _track_interval(self, instrument_key: str, interval: str, delta: int):
+        """Keeps the per-instrument primary (smallest upstream) interval up to date."""
+        upstream = str(self.interval_mapper(interval))
+        minutes = interval_minutes(upstream)
+        if minutes is None:
+            return
+        counts = self._primary_counts.setdefault(instrument_key, {})
+        entry = counts.get(minutes)
+        if entry is None:
+            entry = counts[minutes] = [upstream, 0]
+        entry[1] += delta
+
+        if entry[1] <= 0:
+            del counts[minutes]
+            if not counts:
+                del self._primary_counts[instrument_key]
+                self._primary.pop(instrument_key, None)
+            elif self._primary.get(instrument_key) == upstream:
+                self._primary[instrument_key] = counts[min(counts)][0]
+        elif instrument_key not in self._primary or minutes < interval_minutes(self._primary[instrument_key]):
+            self._primary[instrument_key] = upstream
+
+    def primary_interval(self, instrument_key: str, default: str = "1") -> str:
+        return self._primary.get(instrument_key, default)
+
+    def sids(self, instrument_key: str, interval: str) -> Set[str]:
+        with self._lock:
+            return set(self._by_instrument.get(instrument_key, {}).get(str(interval), ()))
+
+    def intervals(self, instrument_key: str) -> List[str]:
+        with self._lock:
+            return list(self._by_instrument.get(instrument_key, {}))
+
+    def keys_for_sid(self, sid: str) -> List[Key]:
+        with self._lock:
+            return list(self._by_sid.get(sid, ()))
+
+    def is_sid_using(self, sid: str, instrument_key: str) -> bool:
+        with self._lock:
+            return any(key == instrument_key for key, _ in self._by_sid.get(sid, ()))
+
+    def has(self, instrument_key: str, interval: str) -> bool:
+        intervals = self._by_instrument.get(instrument_key)
+        return bool(intervals) and str(interval) in intervals
+
+    def __contains__(self, key: Key) -> bool:
+        return self.has(*key)
+
+    def keys(self) -> List[Key]:
+        with self._lock:
+            return [(ik, i) for ik, intervals in self._by_instrument.items() for i in intervals]
+
+    def items(self) -> Iterator[Tuple[Key, Set[str]]]:
+        with self._lock:
+            snapshot = [((ik, i), set(sids)) for ik, intervals in self._by_instrument.items() for i, sids in intervals.items()]
+        return iter(snapshot)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(intervals) for intervals in self._by_instrument.values())
@@ -4,6 +4,7 @@ import pandas as pd
 from datetime import datetime
 from typing import Dict, Optional, Any
 from db.local_db import db
+from core.instrument_index import instrument_index
 try:
     from config import UPSTOX_INDEX_MAP
 except ImportError:
@@ -50,16 +51,12 @@ class SymbolMapper:
         if key in self._mapping_cache:
             return self._mapping_cache[key]
 
-        # Try to find in Local DB
-        try:
-            res = db.get_metadata(key)
-            if res:
-                hrn = res['hrn']
-                self._mapping_cache[key] = hrn
-                self._reverse_cache[hrn] = key
-                return hrn
-        except:
-            pass
+        # Try the in-memory instrument index (loaded from the metadata table at startup)
+        hrn = instrument_index.hrn_for(key)
+        if hrn:
+            self._mapping_cache[key] = hrn
+            self._reverse_cache[hrn] = key
+            return hrn
 
         # If not found and metadata provided, generate and store
         if metadata:
@@ -129,15 +126,11 @@ class SymbolMapper:
         if target in self._reverse_cache:
             return self._reverse_cache[target]
 
-        try:
-            rows = db.query("SELECT instrument_key FROM metadata WHERE hrn = ?", (target,))
-            if rows:
-                key = rows[0]['instrument_key']
-                self._mapping_cache[key] = target
-                self._reverse_cache[target] = key
-                return key
-        except:
-            pass
+        key = instrument_index.key_for(target)
+        if key:
+            self._mapping_cache[key.upper()] = target
+            self._reverse_cache[target] = key
+            return key
 
         return None
 
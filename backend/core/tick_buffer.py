@@ -0,0 +1,357 @@
+"""
+Columnar Tick Buffers
+Per-instrument NumPy ring buffers used by the data engine to stage live ticks
+before they are flushed to DuckDB as a single Arrow batch.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+NAN = float('nan')
+
+TICK_COLUMNS = ('ts_ms', 'price', 'qty', 'source_id', 'oi', 'volume', 'bid', 'ask', 'provider_ts_ms')
+# Optional fields use NaN (floats) or 0 (provider_ts_ms) as the missing marker
+TICK_DTYPES = {
+    'ts_ms': np.int64,
+    'price': np.float64,
+    'qty': np.int64,
+    'source_id': np.int16,
+    'oi': np.float64,
+    'volume': np.float64,
+    'bid': np.float64,
+    'ask': np.float64,
+    'provider_ts_ms': np.int64,
+}
+
+
+class TickRingBuffer:
+    """
+    Fixed-capacity columnar ring buffer for the pending ticks of one instrument.
+
+    Starts small and doubles up to ``max_capacity``; once full, the oldest
+    pending tick is overwritten and counted in ``overwritten``. With
+    ``keep_raw`` an object column holds each tick's raw payload (or None) in
+    the same slot, so payloads stay aligned with their rows.
+    """
+
+    __slots__ = ('capacity', 'max_capacity', 'columns', 'payloads', 'head', 'size', 'overwritten')
+
+    def __init__(self, initial_capacity: int = 256, max_capacity: int = 8192, keep_raw: bool = False):
+        self.capacity = max(1, min(initial_capacity, max_capacity))
+        self.max_capacity = max_capacity
+        self.columns = {c: np.empty(self.capacity, dtype=TICK_DTYPES[c]) for c in TICK_COLUMNS}
+        self.payloads = np.empty(self.capacity, dtype=object) if keep_raw else None
+        self.head = 0  # Next write position
+        self.size = 0
+        self.overwritten = 0
+
+    def append(self, values: tuple, payload: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Appends one tick given as a tuple in TICK_COLUMNS order.
+        Returns False if an unflushed tick had to be overwritten.
+        """
+        if self.size == self.capacity and self.capacity < self.max_capacity:
+            self._grow()
+
+        i = self.head
+        cols = self.columns
+        for name, value in zip(TICK_COLUMNS, values):
+            cols[name][i] = value
+        if self.payloads is not None:
+            self.payloads[i] = payload
+
+        self.head = i + 1 if i + 1 < self.capacity else 0
+        if self.size < self.capacity:
+            self.size += 1
+            return True
+        self.overwritten += 1
+        return False
+
+    def _grow(self):
+        new_capacity = min(self.capacity * 2, self.max_capacity)
+        self._rebuild(new_capacity, {c: self._ordered(c) for c in TICK_COLUMNS}, self.ordered_payloads())
+
+    def _rebuild(self, capacity: int, columns: Dict[str, np.ndarray], payloads: Optional[np.ndarray]):
+        """Replaces the storage with ``capacity`` slots holding the given rows oldest-first."""
+        size = len(columns['ts_ms'])
+        for name in TICK_COLUMNS:
+            storage = np.empty(capacity, dtype=TICK_DTYPES[name])
+            storage[:size] = columns[name]
+            self.columns[name] = storage
+        if self.payloads is not None:
+            self.payloads = np.empty(capacity, dtype=object)
+            if payloads is not None:
+                self.payloads[:size] = payloads
+        self.capacity = capacity
+        self.size = size
+        self.head = size if size < capacity else 0
+
+    def prepend(self, columns: Dict[str, np.ndarray], payloads: Optional[np.ndarray] = None) -> int:
+        """
+        Puts older rows (a failed flush) back in front of the pending ones. Pending
+        ticks are never evicted for them: requeued rows that do not fit are dropped
+        oldest-first. Returns how many requeued rows were kept.
+        """
+        count = len(columns['ts_ms'])
+        keep = min(count, self.max_capacity - self.size)
+        if keep <= 0:
+            return 0
+        size = self.size + keep
+        capacity = self.capacity
+        while capacity < size:
+            capacity = min(capacity * 2, self.max_capacity)
+        merged = {c: np.concatenate((columns[c][count - keep:], self._ordered(c))) for c in TICK_COLUMNS}
+        merged_payloads = None
+        if self.payloads is not None:
+            requeued = payloads[count - keep:] if payloads is not None else np.full(keep, None, dtype=object)
+            merged_payloads = np.concatenate((requeued, self.ordered_payloads()))
+        self._rebuild(capacity, merged, merged_payloads)
+        return keep
+
+    def ordered_payloads(self) -> Optional[np.ndarray]:
+        """Raw payloads of the pending ticks oldest-first, or None without ``keep_raw``."""
+        if self.payloads is None:
+            return None
+        return self._ordered_array(self.payloads)
+
+    def _ordered(self, name: str) -> np.ndarray:
+        """Returns pending values of a column oldest-first (a view when contiguous)."""
+        return self._ordered_array(self.columns[name])
+
+    def _ordered_array(self, col: np.ndarray) -> np.ndarray:
+        start = (self.head - self.size) % self.capacity
+        end = start + self.size
+        if end <= self.capacity:
+            return col[start:end]
+        return np.concatenate((col[start:], col[:end - self.capacity]))
+
+    @property
+    def is_full(self) -> bool:
+        return self.size == self.capacity and self.capacity >= self.max_capacity
+
+    def clear(self):
+        self.head = 0
+        self.size = 0
+        if self.payloads is not None:
+            # Release the payload dicts
+            self.payloads.fill(None)
+
+
+class TickBatch:
+    """Columnar batch of drained ticks, written to the DB in a single insert."""
+
+    def __init__(self, instrument_keys: List[str], instrument_idx: np.ndarray,
+                 columns: Dict[str, np.ndarray], sources: List[str], payloads: Optional[np.ndarray] = None,
+                 enqueued_at: float = 0.0):
+        self.instrument_keys = instrument_keys
+        self.instrument_idx = instrument_idx
+        self.columns = columns
+        self.sources = sources
+        # Raw payload per row (None where the feed gave none), only with keep_raw
+        self.payloads = payloads
+        # perf_counter() when the oldest tick of the batch was staged
+        self.enqueued_at = enqueued_at
+
+    @property
+    def raw(self) -> List[tuple]:
+        """(instrumentKey, ts_ms, payload) rows for the optional raw sidecar table."""
+        if self.payloads is None:
+            return []
+        return [(self.instrument_keys[self.instrument_idx[i]], int(self.columns['ts_ms'][i]), payload)
+                for i, payload in enumerate(self.payloads) if payload is not None]
+
+    def __len__(self) -> int:
+        return len(self.instrument_idx)
+
+    def __getattr__(self, name: str) -> np.ndarray:
+        try:
+            return self.__dict__['columns'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def to_arrow(self):
+        """Builds an Arrow table over the batch arrays without copying the numeric columns."""
+        arrays, names = [pa.DictionaryArray.from_arrays(self.instrument_idx, pa.array(self.instrument_keys, type=pa.string()))], ['instrumentKey']
+        for name in TICK_COLUMNS:
+            if name == 'source_id':
+                arrays.append(pa.DictionaryArray.from_arrays(self.columns[name], pa.array(self.sources, type=pa.string())))
+                names.append('source')
+            else:
+                arrays.append(pa.array(self.columns[name]))
+                names.append(name)
+        return pa.Table.from_arrays(arrays, names=names)
+
+    def to_pandas(self) -> pd.DataFrame:
+        frame = {'instrumentKey': pd.Categorical.from_codes(self.instrument_idx, self.instrument_keys)}
+        for name in TICK_COLUMNS:
+            if name == 'source_id':
+                frame['source'] = pd.Categorical.from_codes(self.columns[name], self.sources)
+            else:
+                frame[name] = self.columns[name]
+        return pd.DataFrame(frame)
+
+    def to_frame(self):
+        """Arrow table when pyarrow is available, otherwise a pandas DataFrame."""
+        return self.to_arrow() if pa is not None else self.to_pandas()
+
+
+class TickBufferPool:
+    """
+    Thread-safe set of per-instrument ring buffers with interned source ids.
+
+    When an instrument's buffer is full the ``overflow`` policy decides what
+    is lost: ``drop_oldest`` overwrites the oldest unflushed tick, while
+    ``drop_newest`` rejects the incoming one. Producers never block either way.
+
+    With ``keep_raw`` the original feed dicts are also retained (bounded) so
+    they can be written to the raw-payload sidecar table.
+    """
+
+    OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest')
+
+    def __init__(self, initial_capacity: int = 256, max_capacity: int = 8192, keep_raw: bool = False,
+                 overflow: str = 'drop_oldest'):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.initial_capacity = initial_capacity
+        self.max_capacity = max_capacity
+        self.keep_raw = keep_raw
+        self.overflow = overflow
+        self._lock = threading.Lock()
+        self._buffers: Dict[str, TickRingBuffer] = {}
+        self._source_ids: Dict[str, int] = {}
+        self._sources: List[str] = []
+        self.pending = 0
+        self.first_pending_at = 0.0
+        self.appended = 0
+        self.overwritten = 0
+        self.rejected = 0
+
+    def _source_id(self, source: str) -> int:
+        sid = self._source_ids.get(source)
+        if sid is None:
+            sid = len(self._sources)
+            self._sources.append(source)
+            self._source_ids[source] = sid
+        return sid
+
+    def append(self, instrument_key: str, ts_ms: int, price: float, qty: int, source: str,
+               oi: float = NAN, volume: float = NAN, bid: float = NAN, ask: float = NAN,
+               provider_ts_ms: int = 0, raw: Optional[Dict[str, Any]] = None) -> int:
+        """Stages one tick and returns the number of pending ticks across all instruments."""
+        with self._lock:
+            buf = self._buffers.get(instrument_key)
+            if buf is None:
+                buf = self._buffers[instrument_key] = TickRingBuffer(self.initial_capacity, self.max_capacity, self.keep_raw)
+            if self.overflow == 'drop_newest' and buf.is_full:
+                self.rejected += 1
+                if self.rejected % 1000 == 1:
+                    logger.warning(f"Tick buffer for {instrument_key} is full; dropping incoming ticks")
+                return self.pending
+            self.appended += 1
+            values = (ts_ms, price, qty, self._source_id(source), oi, volume, bid, ask, provider_ts_ms)
+            if buf.append(values, raw):
+                if not self.pending:
+                    self.first_pending_at = time.perf_counter()
+                self.pending += 1
+            else:
+                self.overwritten += 1
+                if buf.overwritten % 1000 == 1:
+                    logger.warning(f"Tick buffer for {instrument_key} is full; overwriting oldest unflushed ticks")
+            return self.pending
+
+    def drain(self) -> Optional[TickBatch]:
+        """Moves every pending tick into one TickBatch and resets the buffers."""
+        with self._lock:
+            if not self.pending:
+                return None
+
+            keys, counts = [], []
+            parts = {c: [] for c in TICK_COLUMNS}
+            payloads = []
+            idle = []
+            for key, buf in self._buffers.items():
+                if not buf.size:
+                    idle.append(key)
+                    continue
+                keys.append(key)
+                counts.append(buf.size)
+                for c in TICK_COLUMNS:
+                    parts[c].append(buf._ordered(c))
+                if self.keep_raw:
+                    payloads.append(buf.ordered_payloads())
+
+            # np.concatenate copies, so the ring buffers can be reused right away
+            batch = TickBatch(
+                keys,
+                np.repeat(np.arange(len(keys), dtype=np.int32), counts),
+                {c: np.concatenate(parts[c]) for c in TICK_COLUMNS},
+                list(self._sources),
+                np.concatenate(payloads) if payloads else None,
+                self.first_pending_at
+            )
+
+            for buf in self._buffers.values():
+                buf.clear()
+            # Instruments that stayed silent for a whole flush cycle release their arrays
+            for key in idle:
+                del self._buffers[key]
+            self.pending = 0
+        return batch
+
+    def requeue(self, batch: TickBatch):
+        """
+        Puts a batch back after a failed flush, ahead of the ticks that arrived
+        meanwhile, so every instrument's rows stay in time order. Requeued rows
+        that no longer fit the ring are lost (oldest first), never newer ticks.
+        """
+        payloads = batch.payloads if self.keep_raw else None
+        order = np.argsort(batch.instrument_idx, kind='stable')
+        bounds = np.searchsorted(batch.instrument_idx[order], np.arange(len(batch.instrument_keys) + 1))
+        with self._lock:
+            requeued = 0
+            for k, key in enumerate(batch.instrument_keys):
+                rows = order[bounds[k]:bounds[k + 1]]
+                if not len(rows):
+                    continue
+                buf = self._buffers.get(key)
+                if buf is None:
+                    buf = self._buffers[key] = TickRingBuffer(self.initial_capacity, self.max_capacity, self.keep_raw)
+                kept = buf.prepend({c: batch.columns[c][rows] for c in TICK_COLUMNS},
+                                   payloads[rows] if payloads is not None else None)
+                requeued += kept
+                lost = len(rows) - kept
+                if lost:
+                    if self.overflow == 'drop_newest':
+                        self.rejected += lost
+                    else:
+                        self.overwritten += lost
+                    logger.warning(f"Tick buffer for {key} is full; {lost} requeued ticks dropped")
+            if requeued:
+                self.first_pending_at = min(self.first_pending_at, batch.enqueued_at) if self.pending else batch.enqueued_at
+                self.pending += requeued
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'pending': self.pending,
+                'instruments': len(self._buffers),
+                'appended': self.appended,
+                'overwritten': self.overwritten,
+                'rejected': self.rejected,
+                'overflow_policy': self.overflow,
+            }
+
+    def __len__(self) -> int:
+        return self.pending
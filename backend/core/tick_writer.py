@@ -0,0 +1,173 @@
+"""
+Tick Writer
+Single background thread that owns every tick write to DuckDB.
+
+Producers (TradingView, Upstox and options WSS callbacks) only append to the
+bounded TickBufferPool and poke the writer; they never touch the database.
+The writer adapts its batch size and flush interval to how long inserts take.
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from core.tick_buffer import TickBufferPool, TickBatch
+from core.metrics import observe_stage
+
+logger = logging.getLogger(__name__)
+
+
+class TickWriter:
+    """Drains a TickBufferPool into the database from one dedicated thread."""
+
+    def __init__(
+        self,
+        buffers: TickBufferPool,
+        write_fn: Callable[[TickBatch], None],
+        min_batch_size: int = 100,
+        max_batch_size: int = 20000,
+        min_flush_interval: float = 0.5,
+        max_flush_interval: float = 10.0,
+        max_retries: int = 3,
+        retry_delay: float = 1.0
+    ):
+        self.buffers = buffers
+        self.write_fn = write_fn
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.min_flush_interval = min_flush_interval
+        self.max_flush_interval = max_flush_interval
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+        # Current adaptive targets
+        self.batch_size = min_batch_size
+        self.flush_interval = max_flush_interval
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        # Metrics
+        self.flushes = 0
+        self.rows_written = 0
+        self.failed_attempts = 0
+        self.requeued_rows = 0
+        self.last_flush_rows = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+        self.last_flush_at = 0.0
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="tick-writer", daemon=True)
+        self._thread.start()
+        logger.info("Tick writer thread started")
+
+    def stop(self, timeout: float = 10.0):
+        """Stops the writer thread and writes whatever is still pending."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self.flush()
+
+    def notify(self, pending: int):
+        """Called by producers after appending; wakes the writer once a batch is ready."""
+        if pending >= self.batch_size and not self._wake.is_set():
+            self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(timeout=self.flush_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error in tick writer loop: {e}")
+                time.sleep(self.retry_delay)
+
+    def flush(self) -> int:
+        """Writes every pending tick now. Returns the number of rows written."""
+        with self._write_lock:
+            batch = self.buffers.drain()
+            if batch is None:
+                self._adapt(0, 0.0)
+                return 0
+
+            observe_stage('writer_queue', batch.enqueued_at)
+            for attempt in range(self.max_retries):
+                started = time.perf_counter()
+                try:
+                    self.write_fn(batch)
+                except Exception as e:
+                    self.failed_attempts += 1
+                    logger.error(f"DB Insert Attempt {attempt+1} failed: {e}")
+                    if attempt < self.max_retries - 1:
+                        time.sleep(self.retry_delay * (attempt + 1))
+                    continue
+
+                ended = time.perf_counter()
+                observe_stage('db_commit', started, ended)
+                elapsed_ms = (ended - started) * 1000
+                self._record(len(batch), elapsed_ms)
+                self._adapt(len(batch), elapsed_ms)
+                logger.debug(f"Flushed {len(batch)} ticks to DB in {elapsed_ms:.1f}ms")
+                return len(batch)
+
+            # Final failure - hand the rows back to the bounded buffers; the
+            # overflow policy decides what is lost if producers keep filling them.
+            logger.error(f"Final DB insert failure. Returning {len(batch)} ticks to buffer.")
+            self.requeued_rows += len(batch)
+            self.buffers.requeue(batch)
+            self.flush_interval = self.max_flush_interval
+            return 0
+
+    def _record(self, rows: int, elapsed_ms: float):
+        self.flushes += 1
+        self.rows_written += rows
+        self.last_flush_rows = rows
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self.total_flush_ms += elapsed_ms
+        self.last_flush_at = time.time()
+
+    def _adapt(self, rows: int, elapsed_ms: float):
+        """
+        Grows batches and spaces out flushes while inserts are slow relative to the
+        interval (fewer, larger writes); flushes sooner when full batches are cheap and
+        shrinks batches back when traffic is light.
+        """
+        interval_ms = self.flush_interval * 1000
+        if rows and elapsed_ms > interval_ms * 0.25:
+            self.batch_size = min(self.max_batch_size, self.batch_size * 2)
+            self.flush_interval = min(self.max_flush_interval, self.flush_interval * 1.5)
+        elif rows >= self.batch_size:
+            # Load is high but inserts are cheap: flush sooner rather than build bigger batches
+            self.flush_interval = max(self.min_flush_interval, self.flush_interval / 1.5)
+        elif rows < self.batch_size // 4:
+            self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+            self.flush_interval = min(self.max_flush_interval, self.flush_interval * 1.25)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.buffers.stats(),
+            'batch_size': self.batch_size,
+            'flush_interval_s': round(self.flush_interval, 3),
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+            'failed_attempts': self.failed_attempts,
+            'requeued_rows': self.requeued_rows,
+            'last_flush_rows': self.last_flush_rows,
+            'last_flush_ms': round(self.last_flush_ms, 2),
+            'avg_flush_ms': round(self.total_flush_ms / self.flushes, 2) if self.flushes else 0.0,
+            'max_flush_ms': round(self.max_flush_ms, 2),
+            'last_flush_at': self.last_flush_at,
+            'running': bool(self._thread and self._thread.is_alive()),
+        }
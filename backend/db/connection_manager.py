@@ -0,0 +1,137 @@
+"""
+DuckDB connection manager.
+Hands out one reader cursor per thread (``conn.cursor()`` shares the database
+instance but not the connection's mutex, so reads run concurrently with each
+other and with inserts) and serializes all writes through a single lock whose
+wait and hold times are recorded.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+lock_wait_ms = metrics.histogram(
+    'protrade_db_lock_wait_ms', 'Time spent waiting for the DuckDB writer lock in milliseconds', labels=('op',)
+)
+lock_hold_ms = metrics.histogram(
+    'protrade_db_lock_hold_ms', 'Time the DuckDB writer lock was held in milliseconds', labels=('op',)
+)
+
+
+class ConnectionManager:
+    """
+    ``reader()`` returns the calling thread's cursor, created on first use and
+    initialised with ``session_sql`` (per-connection settings such as TimeZone).
+    ``cursor()`` opens a separate one for long-running streams (exports) that
+    should not tie up a thread's shared reader, and ``using(cursor)`` routes a
+    thread's reads through such a cursor (per-job cursors in the DB gateway).
+    ``writer(op, tables)`` is a context manager around the single writer lock;
+    ``op`` labels the wait/hold histograms and ``tables`` are passed to
+    ``on_write`` once the block has finished, before the lock is released.
+    """
+
+    def __init__(self, conn, lock: Optional[threading.Lock] = None, session_sql: Optional[List[str]] = None,
+                 on_write: Optional[Callable[[Tuple[str, ...]], None]] = None):
+        self.conn = conn
+        self.on_write = on_write
+        self.lock = lock or threading.Lock()
+        self.session_sql = list(session_sql or [])
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._readers: List[Any] = []
+
+        # Writer lock stats
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self.hold_ms_total = 0.0
+        self.hold_ms_max = 0.0
+        self.reads = 0
+
+    def cursor(self):
+        """A new, untracked cursor with the session settings applied; the caller closes it."""
+        cursor = self.conn.cursor()
+        for sql in self.session_sql:
+            cursor.execute(sql)
+        return cursor
+
+    @contextmanager
+    def using(self, cursor) -> Iterator[Any]:
+        """Makes ``reader()`` return ``cursor`` on the calling thread for the duration of the block."""
+        previous = getattr(self._local, 'override', None)
+        self._local.override = cursor
+        try:
+            yield cursor
+        finally:
+            self._local.override = previous
+
+    def reader(self):
+        override = getattr(self._local, 'override', None)
+        if override is not None:
+            self.reads += 1
+            return override
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            cursor = self.cursor()
+            self._local.cursor = cursor
+            with self._stats_lock:
+                self._readers.append(cursor)
+        self.reads += 1
+        return cursor
+
+    @contextmanager
+    def writer(self, op: str = 'write', tables: Tuple[str, ...] = ()) -> Iterator[Any]:
+        started = time.perf_counter()
+        contended = not self.lock.acquire(blocking=False)
+        if contended:
+            self.lock.acquire()
+        acquired = time.perf_counter()
+        try:
+            yield self.conn
+        finally:
+            if tables and self.on_write is not None:
+                self.on_write(tables)
+            released = time.perf_counter()
+            self.lock.release()
+            wait_ms = (acquired - started) * 1000
+            hold_ms = (released - acquired) * 1000
+            lock_wait_ms.observe(wait_ms, op)
+            lock_hold_ms.observe(hold_ms, op)
+            with self._stats_lock:
+                self.acquisitions += 1
+                self.contended += contended
+                self.wait_ms_total += wait_ms
+                self.hold_ms_total += hold_ms
+                if wait_ms > self.wait_ms_max: self.wait_ms_max = wait_ms
+                if hold_ms > self.hold_ms_max: self.hold_ms_max = hold_ms
+
+    def close_readers(self):
+        """Closes every reader cursor; threads transparently open a new one on their next read."""
+        with self._stats_lock:
+            readers, self._readers = self._readers, []
+        for cursor in readers:
+            try:
+                cursor.close()
+            except Exception as e:
+                logger.debug(f"Error closing reader cursor: {e}")
+        self._local = threading.local()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                'readers': len(self._readers),
+                'reads': self.reads,
+                'writer_acquisitions': self.acquisitions,
+                'writer_contended': self.contended,
+                'writer_wait_ms_total': round(self.wait_ms_total, 3),
+                'writer_wait_ms_max': round(self.wait_ms_max, 3),
+                'writer_wait_ms_avg': round(self.wait_ms_total / self.acquisitions, 3) if self.acquisitions else 0.0,
+                'writer_hold_ms_total': round(self.hold_ms_total, 3),
+                'writer_hold_ms_max': round(self.hold_ms_max, 3),
+            }
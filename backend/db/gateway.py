@@ -0,0 +1,233 @@
+"""
+Async DuckDB gateway.
+Runs LocalDB calls on a dedicated worker pool fed by a priority queue, so the
+event loop never blocks on DuckDB and interactive UI reads are dequeued ahead
+of snapshot writes, which in turn run ahead of maintenance. Snapshot and
+maintenance jobs are capped below the worker count, so at least one worker is
+always free for interactive reads. Every call has a timeout; a read that
+times out while running is interrupted on the cursor it was given for that
+call.
+"""
+import asyncio
+import concurrent.futures
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from core.metrics import metrics
+from db.local_db import db
+
+try:
+    from config import DB_GATEWAY_CONFIG
+except ImportError:
+    DB_GATEWAY_CONFIG = {"workers": 4, "background_workers": 3, "timeouts": {"interactive": 15, "snapshot": 60, "maintenance": None}}
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 'interactive'
+SNAPSHOT = 'snapshot'
+MAINTENANCE = 'maintenance'
+PRIORITIES = {INTERACTIVE: 0, SNAPSHOT: 1, MAINTENANCE: 2}
+
+queue_wait_ms = metrics.histogram(
+    'protrade_db_queue_wait_ms', 'Time DB gateway calls wait for a worker in milliseconds', labels=('priority',)
+)
+exec_ms = metrics.histogram(
+    'protrade_db_exec_ms', 'DB gateway call execution time in milliseconds', labels=('priority',)
+)
+
+
+class QueryTimeout(TimeoutError):
+    """A gateway call did not finish within its timeout."""
+
+
+class _Job:
+    __slots__ = ('fn', 'args', 'kwargs', 'priority', 'future', 'enqueued_at', 'cursor', 'interruptible')
+
+    def __init__(self, fn, args, kwargs, priority, interruptible):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.future = concurrent.futures.Future()
+        self.enqueued_at = time.perf_counter()
+        self.cursor = None
+        self.interruptible = interruptible
+
+
+class DBGateway:
+    """
+    ``run``/``query``/``query_arrow`` are awaitable; ``call`` is the blocking
+    variant for background threads. ``priority`` is one of interactive,
+    snapshot or maintenance; ``timeout`` (seconds) defaults per priority.
+    """
+
+    def __init__(self, workers: int = 4, timeouts: Optional[Dict[str, Optional[float]]] = None,
+                 background_workers: Optional[int] = None):
+        self.workers = max(1, workers)
+        # Snapshot and maintenance jobs running at once; the remaining workers only serve interactive reads
+        self.background_workers = max(1, min(background_workers or self.workers - 1, self.workers))
+        self.background_running = 0
+        self._deferred = []
+        self.timeouts = {INTERACTIVE: 15, SNAPSHOT: 60, MAINTENANCE: None}
+        self.timeouts.update(timeouts or {})
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._cursor_lock = threading.Lock()
+
+        # Stats per priority
+        self.submitted = {p: 0 for p in PRIORITIES}
+        self.completed = {p: 0 for p in PRIORITIES}
+        self.failed = {p: 0 for p in PRIORITIES}
+        self.timed_out = {p: 0 for p in PRIORITIES}
+        self.pending = {p: 0 for p in PRIORITIES}
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            for n in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"db-gateway-{n}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            job = item[2]
+            background = job.priority != INTERACTIVE
+            with self._stats_lock:
+                if background:
+                    if self.background_running >= self.background_workers:
+                        # Parked until a background job finishes, leaving this worker free for UI reads
+                        heapq.heappush(self._deferred, item)
+                        continue
+                    self.background_running += 1
+                self.pending[job.priority] -= 1
+            try:
+                self._process(job)
+            finally:
+                if background:
+                    self._background_done()
+
+    def _background_done(self):
+        with self._stats_lock:
+            self.background_running -= 1
+            item = heapq.heappop(self._deferred) if self._deferred else None
+        if item is not None:
+            self._queue.put(item)
+
+    def _process(self, job: _Job):
+        if not job.future.set_running_or_notify_cancel():
+            return  # timed out or cancelled while queued
+        started = time.perf_counter()
+        queue_wait_ms.observe((started - job.enqueued_at) * 1000, job.priority)
+        try:
+            result = self._execute(job)
+        except BaseException as e:
+            with self._stats_lock:
+                self.failed[job.priority] += 1
+            job.future.set_exception(e)
+        else:
+            with self._stats_lock:
+                self.completed[job.priority] += 1
+            job.future.set_result(result)
+        finally:
+            exec_ms.observe((time.perf_counter() - started) * 1000, job.priority)
+
+    def _execute(self, job: _Job) -> Any:
+        if not job.interruptible:
+            return job.fn(*job.args, **job.kwargs)
+        # A cursor of its own, so a late interrupt() can only ever stop this job
+        cursor = db.connections.cursor()
+        with self._cursor_lock:
+            job.cursor = cursor
+        try:
+            with db.connections.using(cursor):
+                return job.fn(*job.args, **job.kwargs)
+        finally:
+            with self._cursor_lock:
+                job.cursor = None
+            cursor.close()
+
+    def submit(self, fn: Callable, *args, priority: str = INTERACTIVE, interruptible: bool = False, **kwargs) -> _Job:
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown DB priority: {priority}")
+        self._ensure_started()
+        job = _Job(fn, args, kwargs, priority, interruptible)
+        with self._stats_lock:
+            self.submitted[priority] += 1
+            self.pending[priority] += 1
+        self._queue.put((PRIORITIES[priority], next(self._seq), job))
+        return job
+
+    def _on_timeout(self, job: _Job, timeout: float):
+        with self._stats_lock:
+            self.timed_out[job.priority] += 1
+        if not job.future.cancel():
+            with self._cursor_lock:
+                cursor = job.cursor
+                if cursor is not None:
+                    # Stops the running DuckDB statement on the job's own cursor
+                    try:
+                        cursor.interrupt()
+                    except Exception as e:
+                        logger.debug(f"Could not interrupt timed out query: {e}")
+        name = getattr(job.fn, '__name__', str(job.fn))
+        logger.warning(f"DB call {name} ({job.priority}) timed out after {timeout:g}s")
+        return QueryTimeout(f"{name} did not complete within {timeout:g}s")
+
+    async def run(self, fn: Callable, *args, priority: str = INTERACTIVE, timeout: Optional[float] = None,
+                  interruptible: bool = False, **kwargs) -> Any:
+        job = self.submit(fn, *args, priority=priority, interruptible=interruptible, **kwargs)
+        timeout = self.timeouts.get(priority) if timeout is None else timeout
+        waiter = asyncio.wrap_future(job.future)
+        if not timeout:
+            return await waiter
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            raise self._on_timeout(job, timeout) from None
+
+    async def query(self, sql: str, params: tuple = (), json_serialize: bool = False,
+                    priority: str = INTERACTIVE, timeout: Optional[float] = None):
+        return await self.run(db.query, sql, params, json_serialize, priority=priority, timeout=timeout, interruptible=True)
+
+    async def query_arrow(self, sql: str, params: tuple = (), priority: str = INTERACTIVE, timeout: Optional[float] = None):
+        return await self.run(db.query_arrow, sql, params, priority=priority, timeout=timeout, interruptible=True)
+
+    def call(self, fn: Callable, *args, priority: str = MAINTENANCE, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Blocking variant of run() for non-async callers (e.g. the maintenance thread)."""
+        job = self.submit(fn, *args, priority=priority, **kwargs)
+        timeout = self.timeouts.get(priority) if timeout is None else timeout
+        try:
+            return job.future.result(timeout=timeout or None)
+        except concurrent.futures.TimeoutError:
+            raise self._on_timeout(job, timeout) from None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                'workers': self.workers,
+                'background_workers': self.background_workers,
+                'background_running': self.background_running,
+                'deferred': len(self._deferred),
+                'pending': dict(self.pending),
+                'submitted': dict(self.submitted),
+                'completed': dict(self.completed),
+                'failed': dict(self.failed),
+                'timed_out': dict(self.timed_out),
+            }
+
+
+db_gateway = DBGateway(DB_GATEWAY_CONFIG.get("workers", 4), DB_GATEWAY_CONFIG.get("timeouts"),
+                       DB_GATEWAY_CONFIG.get("background_workers"))
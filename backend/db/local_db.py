@@ -4,13 +4,18 @@ Provides an optimized columnar data store for high-frequency tick data.
 """
 import duckdb
 import os
+import glob
 import json
+import shutil
 import logging
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Iterator
 import threading
 import pandas as pd
 from core.utils import safe_int, safe_float
+from core.bar_builder import INTERVAL_SECONDS, IST_OFFSET_SECONDS, SESSION_ANCHOR_UTC, SESSION_OPEN_SECONDS
+from db.connection_manager import ConnectionManager
+from db.query_cache import QueryCache, ALL_TABLES
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +29,84 @@ class LocalDBJSONEncoder(json.JSONEncoder):
         return super().default(obj)
 
 DB_PATH = os.getenv('DUCKDB_PATH', 'pro_trade.db')
+# Raw provider payloads are only kept in the ticks_raw sidecar when explicitly enabled
+STORE_RAW_TICKS = os.getenv('STORE_RAW_TICKS', 'false').lower() == 'true'
+IST_OFFSET_MS = 19800000  # +05:30
+# Result cache for repeated reads between writes (0 disables)
+QUERY_CACHE_MB = int(os.getenv('QUERY_CACHE_MB', '64'))
+# Sealed trading days are moved out of the DuckDB file into date/instrument Hive partitions here
+TICK_ARCHIVE_PATH = os.path.abspath(os.getenv('TICK_ARCHIVE_PATH', os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), 'tick_archive')))
+
+TICK_COLUMNS = ['date', 'instrumentKey', 'ts_ms', 'price', 'qty', 'source', 'oi', 'volume', 'bid', 'ask', 'provider_ts_ms']
+
+# Classifies a tick relation (date, instrumentKey, ts_ms, price, qty, bid, ask) by aggressor
+# side: at/above the ask is a buy, at/below the bid a sell, otherwise the tick rule against the
+# previous price, where an unchanged price keeps the direction of the last price change
+# (zero-tick rule). {carry} seeds each instrument with its last price and direction from
+# tick_rule_state, so the first tick of a flush is classified against the previous flush.
+TICK_SIDES = """
+    WITH src AS ({source})
+    SELECT *, CASE WHEN ask IS NOT NULL AND price >= ask THEN 1
+                   WHEN bid IS NOT NULL AND price <= bid THEN -1
+                   ELSE tick_side END AS side
+    FROM (
+        SELECT *, last_value(nullif(tick_dir, 0) IGNORE NULLS) OVER (
+                      PARTITION BY instrumentKey ORDER BY seed DESC, ts_ms
+                      ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) AS tick_side
+        FROM (
+            SELECT *, coalesce(seed_side, sign(price - lag(price) OVER (
+                          PARTITION BY instrumentKey ORDER BY seed DESC, ts_ms))) AS tick_dir
+            FROM (
+                SELECT date, instrumentKey, ts_ms, price, qty, bid, ask, 0 AS seed, CAST(NULL AS TINYINT) AS seed_side
+                FROM src WHERE price > 0
+                {carry}
+            ) seeded
+        ) directed
+    ) classified
+"""
+TICK_RULE_CARRY = """
+                UNION ALL
+                SELECT NULL, instrumentKey, ts_ms, price, 0, NULL, NULL, 1, side
+                FROM tick_rule_state WHERE instrumentKey IN (SELECT instrumentKey FROM src)
+"""
+
+# Folds classified ticks into bars_1m
+BARS_1M_UPSERT = """
+    INSERT INTO bars_1m (instrumentKey, ts, date, open, high, low, close, volume, ticks,
+                         buy_volume, sell_volume, first_ts_ms, last_ts_ms)
+    SELECT instrumentKey, ts_ms // 60000 * 60, any_value(date),
+           arg_min(price, ts_ms), max(price), min(price), arg_max(price, ts_ms),
+           sum(qty), count(*),
+           sum(CASE WHEN side > 0 THEN qty ELSE 0 END), sum(CASE WHEN side < 0 THEN qty ELSE 0 END),
+           min(ts_ms), max(ts_ms)
+    FROM ({sides}) sides
+    WHERE seed = 0
+    GROUP BY instrumentKey, ts_ms // 60000 * 60
+    ON CONFLICT (instrumentKey, ts) DO UPDATE SET
+        open = CASE WHEN EXCLUDED.first_ts_ms < first_ts_ms THEN EXCLUDED.open ELSE open END,
+        high = greatest(high, EXCLUDED.high),
+        low = least(low, EXCLUDED.low),
+        close = CASE WHEN EXCLUDED.last_ts_ms >= last_ts_ms THEN EXCLUDED.close ELSE close END,
+        volume = volume + EXCLUDED.volume,
+        ticks = ticks + EXCLUDED.ticks,
+        buy_volume = buy_volume + EXCLUDED.buy_volume,
+        sell_volume = sell_volume + EXCLUDED.sell_volume,
+        first_ts_ms = least(first_ts_ms, EXCLUDED.first_ts_ms),
+        last_ts_ms = greatest(last_ts_ms, EXCLUDED.last_ts_ms)
+"""
+
+# Last price and tick-rule direction per instrument, carried into the next flush
+TICK_RULE_STATE_UPSERT = """
+    INSERT INTO tick_rule_state (instrumentKey, price, side, ts_ms)
+    SELECT instrumentKey, arg_max(price, ts_ms), arg_max(tick_side, ts_ms), max(ts_ms)
+    FROM ({sides}) sides
+    WHERE seed = 0
+    GROUP BY instrumentKey
+    ON CONFLICT (instrumentKey) DO UPDATE SET
+        price = CASE WHEN EXCLUDED.ts_ms >= ts_ms THEN EXCLUDED.price ELSE price END,
+        side = CASE WHEN EXCLUDED.ts_ms >= ts_ms THEN coalesce(EXCLUDED.side, side) ELSE side END,
+        ts_ms = greatest(ts_ms, EXCLUDED.ts_ms)
+"""
 
 class LocalDB:
     _instance = None
@@ -44,6 +127,11 @@ class LocalDB:
         self.conn.execute("SET threads = 4")
         self.conn.execute("SET TimeZone='UTC'")
         self.conn.execute("SET preserve_insertion_order = false")
+        # self.conn is the single writer; reads go through per-thread cursors.
+        # Writers declare the tables they touch, which invalidates cached reads of them.
+        self.cache = QueryCache(QUERY_CACHE_MB * 1024 * 1024)
+        self.connections = ConnectionManager(self.conn, self._execute_lock, session_sql=["SET TimeZone='UTC'"],
+                                             on_write=lambda tables: self.cache.bump(*tables))
 
         # Check and load extensions to avoid slow INSTALL calls on every boot
         try:
@@ -67,6 +155,7 @@ class LocalDB:
             except:
                 logger.error("Failed to load extensions.")
 
+        self.store_raw_ticks = STORE_RAW_TICKS
         self.conn.execute("""
             CREATE TABLE IF NOT EXISTS ticks (
                 date DATE,
@@ -75,17 +164,43 @@ class LocalDB:
                 price DOUBLE,
                 qty BIGINT,
                 source VARCHAR,
-                full_feed JSON
+                oi BIGINT,
+                volume BIGINT,
+                bid DOUBLE,
+                ask DOUBLE,
+                provider_ts_ms BIGINT
             )
         """)
         self.conn.execute("CREATE INDEX IF NOT EXISTS idx_ticks_key_ts ON ticks (instrumentKey, ts_ms)")
 
+        # Optional sidecar with the untouched provider payload (off by default)
+        if self.store_raw_ticks:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS ticks_raw (
+                    date DATE,
+                    instrumentKey VARCHAR,
+                    ts_ms BIGINT,
+                    payload JSON
+                )
+            """)
+
         self.conn.execute("""
             CREATE TABLE IF NOT EXISTS metadata (
                 instrument_key VARCHAR PRIMARY KEY,
                 hrn VARCHAR,
                 meta JSON,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                content_hash UBIGINT
+            )
+        """)
+
+        # Last successful instrument master download per exchange
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS instrument_sync (
+                exchange VARCHAR PRIMARY KEY,
+                synced_at TIMESTAMP,
+                rows BIGINT,
+                changed BIGINT
             )
         """)
 
@@ -131,11 +246,61 @@ class LocalDB:
 
         self.conn.execute("CREATE INDEX IF NOT EXISTS idx_pcr_hist_ts ON pcr_history (timestamp, underlying)")
 
+        # Trading days whose hot ticks have been rewritten in (instrumentKey, ts_ms) order
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS tick_clustering (
+                date DATE PRIMARY KEY,
+                rows BIGINT,
+                clustered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # 1-minute OHLCV per instrument, folded in by every tick insert
+        bars_exist = self.conn.execute(
+            "SELECT count(*) FROM duckdb_tables() WHERE table_name = 'bars_1m'"
+        ).fetchone()[0] > 0
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS bars_1m (
+                instrumentKey VARCHAR,
+                ts BIGINT,
+                date DATE,
+                open DOUBLE,
+                high DOUBLE,
+                low DOUBLE,
+                close DOUBLE,
+                volume BIGINT,
+                ticks BIGINT,
+                buy_volume BIGINT,
+                sell_volume BIGINT,
+                first_ts_ms BIGINT,
+                last_ts_ms BIGINT,
+                PRIMARY KEY (instrumentKey, ts)
+            )
+        """)
+
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS tick_rule_state (
+                instrumentKey VARCHAR PRIMARY KEY,
+                price DOUBLE,
+                side TINYINT,
+                ts_ms BIGINT
+            )
+        """)
+
         self._migrate_db()
+        self.refresh_ticks_view()
+        if not bars_exist:
+            self.rebuild_bars_1m()
         logger.info(f"Local DuckDB initialized at {DB_PATH}")
 
     def _migrate_db(self):
         """Add missing columns to existing tables."""
+        # 0. ticks: legacy full_feed JSON column -> typed columns
+        try:
+            self.migrate_ticks_schema()
+        except Exception as e:
+            logger.error(f"Error migrating ticks: {e}")
+
         # 1. options_snapshots
         try:
             cols = [c['column_name'] for c in self.get_table_schema('options_snapshots')]
@@ -172,36 +337,200 @@ class LocalDB:
         except Exception as e:
             logger.error(f"Error migrating pcr_history: {e}")
 
+        # 3. metadata
+        try:
+            cols = [c['column_name'] for c in self.get_table_schema('metadata')]
+            if 'content_hash' not in cols:
+                logger.info("Migrating: Adding content_hash to metadata")
+                self.conn.execute("ALTER TABLE metadata ADD COLUMN content_hash UBIGINT")
+        except Exception as e:
+            logger.error(f"Error migrating metadata: {e}")
+
+    def migrate_ticks_schema(self):
+        """
+        Rewrites a pre-typed ticks table (with the full_feed JSON column) into the typed schema.
+        oi, cumulative volume, bid and ask are extracted from the JSON; the payload itself is
+        copied to ticks_raw when STORE_RAW_TICKS is enabled and dropped otherwise.
+        """
+        cols = [c['column_name'] for c in self.get_table_schema('ticks')]
+        if 'full_feed' not in cols:
+            return
+
+        logger.info("Migrating ticks: moving full_feed JSON into typed columns (one-time rewrite)...")
+        with self.connections.writer('migrate_ticks_schema', tables=('ticks', 'ticks_raw', 'bars_1m')):
+            self.conn.execute("BEGIN TRANSACTION")
+            try:
+                if self.store_raw_ticks:
+                    self.conn.execute("""
+                        INSERT INTO ticks_raw (date, instrumentKey, ts_ms, payload)
+                        SELECT date, instrumentKey, ts_ms, full_feed FROM ticks WHERE full_feed IS NOT NULL
+                    """)
+                self.conn.execute("""
+                    CREATE TABLE ticks_typed AS
+                    SELECT
+                        date, instrumentKey, ts_ms, price, qty, source,
+                        CAST(TRY_CAST(json_extract_string(full_feed, '$.oi') AS DOUBLE) AS BIGINT) AS oi,
+                        CASE WHEN source = 'tv_chart_fallback' THEN NULL ELSE CAST(COALESCE(
+                            TRY_CAST(json_extract_string(full_feed, '$.tv_volume') AS DOUBLE),
+                            TRY_CAST(json_extract_string(full_feed, '$.upstox_volume') AS DOUBLE)
+                        ) AS BIGINT) END AS volume,
+                        TRY_CAST(json_extract_string(full_feed, '$.bid') AS DOUBLE) AS bid,
+                        TRY_CAST(json_extract_string(full_feed, '$.ask') AS DOUBLE) AS ask,
+                        CAST(NULL AS BIGINT) AS provider_ts_ms
+                    FROM ticks
+                """)
+                self.conn.execute("DROP INDEX IF EXISTS idx_ticks_key_ts")
+                self.conn.execute("DROP TABLE ticks")
+                self.conn.execute("ALTER TABLE ticks_typed RENAME TO ticks")
+                self.conn.execute("CREATE INDEX IF NOT EXISTS idx_ticks_key_ts ON ticks (instrumentKey, ts_ms)")
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("CHECKPOINT")
+        logger.info("Ticks migration complete.")
+
     def insert_ticks(self, ticks: List[Dict[str, Any]]):
         if not ticks: return
         data = []
+        raw = []
         for t in ticks:
             # Robust type casting using shared utilities
             price = safe_float(t.get('last_price'))
             qty = safe_int(t.get('ltq'))
             ts_ms = safe_int(t.get('ts_ms'))
+            date = t.get('date', datetime.now().strftime('%Y-%m-%d'))
+            volume = t.get('volume', t.get('tv_volume', t.get('upstox_volume')))
 
             data.append({
-                'date': t.get('date', datetime.now().strftime('%Y-%m-%d')),
+                'date': date,
                 'instrumentKey': t.get('instrumentKey'),
                 'ts_ms': ts_ms,
                 'price': price,
                 'qty': qty,
                 'source': t.get('source', 'live'),
-                'full_feed': json.dumps(t, cls=LocalDBJSONEncoder)
+                'oi': safe_int(t['oi']) if t.get('oi') is not None else None,
+                'volume': safe_int(volume) if volume is not None else None,
+                'bid': safe_float(t['bid']) if t.get('bid') is not None else None,
+                'ask': safe_float(t['ask']) if t.get('ask') is not None else None,
+                'provider_ts_ms': safe_int(t['provider_ts_ms']) if t.get('provider_ts_ms') else None
             })
-
-        df = pd.DataFrame(data)
-        with self._execute_lock:
-            self.conn.execute("INSERT INTO ticks SELECT * FROM df")
-            self._batch_count += 1
-            if self._batch_count >= 10:
+            if self.store_raw_ticks:
+                raw.append({'date': date, 'instrumentKey': t.get('instrumentKey'), 'ts_ms': ts_ms,
+                            'payload': json.dumps(t, cls=LocalDBJSONEncoder)})
+
+        df = pd.DataFrame(data, columns=TICK_COLUMNS)
+        with self.connections.writer('insert_ticks', tables=('ticks', 'ticks_raw', 'bars_1m', 'tick_rule_state')):
+            self.conn.register('tick_df_view', df)
+            self.conn.execute("BEGIN TRANSACTION")
+            try:
+                self.conn.execute(f"INSERT INTO ticks ({', '.join(TICK_COLUMNS)}) SELECT * FROM tick_df_view")
+                self._fold_bars_1m("SELECT CAST(date AS DATE) AS date, instrumentKey, ts_ms, price, qty, bid, ask FROM tick_df_view")
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            finally:
+                self.conn.unregister('tick_df_view')
+            if raw:
+                raw_df = pd.DataFrame(raw)
+                self.conn.execute("INSERT INTO ticks_raw (date, instrumentKey, ts_ms, payload) SELECT * FROM raw_df")
+            self._count_tick_batch()
+
+    def _count_tick_batch(self):
+        """
+        Checkpoints every 10 tick batches (writer lock held). The batch has
+        already committed, so a checkpoint blocked by another open transaction
+        is retried on the next batch rather than failing the write.
+        """
+        self._batch_count += 1
+        if self._batch_count >= 10:
+            try:
                 self.conn.execute("CHECKPOINT")
                 self._batch_count = 0
+            except duckdb.TransactionException as e:
+                logger.debug(f"Checkpoint deferred: {e}")
+
+    def insert_tick_batch(self, batch):
+        """Inserts a columnar TickBatch (see core.tick_buffer) as one Arrow scan."""
+        if batch is None or not len(batch): return
+        frame = batch.to_frame()
+        with self.connections.writer('insert_tick_batch', tables=('ticks', 'ticks_raw', 'bars_1m', 'tick_rule_state')):
+            self.conn.register('tick_batch_view', frame)
+            self.conn.execute("BEGIN TRANSACTION")
+            try:
+                # Trading date is derived from the tick time in IST (fixed +05:30)
+                # NaN / 0 are the in-buffer markers for "not provided" and are stored as NULL
+                self.conn.execute(f"""
+                    INSERT INTO ticks ({', '.join(TICK_COLUMNS)})
+                    SELECT CAST(epoch_ms(ts_ms + {IST_OFFSET_MS}) AS DATE), CAST(instrumentKey AS VARCHAR),
+                           ts_ms, price, qty, CAST(source AS VARCHAR),
+                           CASE WHEN isnan(oi) THEN NULL ELSE CAST(oi AS BIGINT) END,
+                           CASE WHEN isnan(volume) THEN NULL ELSE CAST(volume AS BIGINT) END,
+                           CASE WHEN isnan(bid) THEN NULL ELSE bid END,
+                           CASE WHEN isnan(ask) THEN NULL ELSE ask END,
+                           NULLIF(provider_ts_ms, 0)
+                    FROM tick_batch_view
+                """)
+                self._fold_bars_1m(f"""
+                    SELECT CAST(epoch_ms(ts_ms + {IST_OFFSET_MS}) AS DATE) AS date, CAST(instrumentKey AS VARCHAR) AS instrumentKey,
+                           ts_ms, price, qty,
+                           CASE WHEN isnan(bid) THEN NULL ELSE bid END AS bid,
+                           CASE WHEN isnan(ask) THEN NULL ELSE ask END AS ask
+                    FROM tick_batch_view
+                """)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            finally:
+                self.conn.unregister('tick_batch_view')
+            if self.store_raw_ticks and batch.raw:
+                raw_df = pd.DataFrame([
+                    (key, ts_ms, json.dumps(payload, cls=LocalDBJSONEncoder)) for key, ts_ms, payload in batch.raw
+                ], columns=['instrumentKey', 'ts_ms', 'payload'])
+                self.conn.execute(f"""
+                    INSERT INTO ticks_raw (date, instrumentKey, ts_ms, payload)
+                    SELECT CAST(epoch_ms(ts_ms + {IST_OFFSET_MS}) AS DATE), instrumentKey, ts_ms, payload FROM raw_df
+                """)
+            self._count_tick_batch()
+
+    def iter_ticks(self, date: str, instrument_keys: Optional[List[str]] = None, start_ms: Optional[int] = None,
+                   end_ms: Optional[int] = None, chunk_size: int = 5000) -> Iterator[List[tuple]]:
+        """
+        Streams a day's ticks (hot or archived) in ts_ms order as lists of
+        (instrumentKey, ts_ms, price, qty, source, oi, volume, bid, ask) tuples.
+
+        Uses a dedicated cursor and fetchmany, so memory stays flat and the
+        shared connection lock is not held while the caller consumes rows.
+        """
+        sql = "SELECT instrumentKey, ts_ms, price, qty, source, oi, volume, bid, ask FROM ticks_all WHERE date = ?"
+        params: List[Any] = [date]
+        if instrument_keys:
+            sql += f" AND instrumentKey IN ({', '.join('?' for _ in instrument_keys)})"
+            params.extend(instrument_keys)
+        if start_ms is not None:
+            sql += " AND ts_ms >= ?"
+            params.append(start_ms)
+        if end_ms is not None:
+            sql += " AND ts_ms <= ?"
+            params.append(end_ms)
+        sql += " ORDER BY ts_ms"
+
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
 
     def update_metadata(self, instrument_key: str, hrn: str, meta: Dict[str, Any]):
         meta_json = json.dumps(meta)
-        with self._execute_lock:
+        with self.connections.writer('update_metadata', tables=('metadata',)):
             self.conn.execute("""
                 INSERT OR REPLACE INTO metadata (instrument_key, hrn, meta, updated_at)
                 VALUES (?, ?, ?, CURRENT_TIMESTAMP)
@@ -219,7 +548,7 @@ class LocalDB:
                     'meta': json.dumps(item['meta'])
                 })
             df = pd.DataFrame(data)
-            with self._execute_lock:
+            with self.connections.writer('bulk_update_metadata', tables=('metadata',)):
                 self.conn.execute("""
                     INSERT OR REPLACE INTO metadata (instrument_key, hrn, meta, updated_at)
                     SELECT instrument_key, hrn, meta, CURRENT_TIMESTAMP FROM df
@@ -227,19 +556,60 @@ class LocalDB:
         except Exception as e:
             logger.error(f"Bulk metadata update failed: {e}")
 
+    def upsert_metadata_arrow(self, staged) -> int:
+        """
+        Upserts an Arrow table of (instrument_key, hrn, meta) into metadata, writing only
+        rows that are new or whose hrn/meta hash differs from the stored one. Returns the
+        number of rows written.
+        """
+        with self.connections.writer('upsert_metadata', tables=('metadata',)):
+            self.conn.register('staged_metadata', staged)
+            try:
+                return self.conn.execute("""
+                    INSERT INTO metadata (instrument_key, hrn, meta, updated_at, content_hash)
+                    SELECT s.instrument_key, s.hrn, s.meta, CURRENT_TIMESTAMP, s.content_hash
+                    FROM (SELECT *, hash(hrn, meta) AS content_hash FROM staged_metadata) s
+                    LEFT JOIN metadata m ON m.instrument_key = s.instrument_key
+                    WHERE m.content_hash IS DISTINCT FROM s.content_hash
+                    ON CONFLICT (instrument_key) DO UPDATE SET
+                        hrn = excluded.hrn, meta = excluded.meta,
+                        updated_at = excluded.updated_at, content_hash = excluded.content_hash
+                """).fetchone()[0]
+            finally:
+                self.conn.unregister('staged_metadata')
+
+    def record_instrument_sync(self, exchange: str, rows: int, changed: int):
+        with self.connections.writer('record_instrument_sync', tables=('instrument_sync',)):
+            self.conn.execute(
+                "INSERT OR REPLACE INTO instrument_sync (exchange, synced_at, rows, changed) VALUES (?, ?, ?, ?)",
+                (exchange, datetime.now(), rows, changed)
+            )
+
     def get_metadata(self, instrument_key: str) -> Optional[Dict[str, Any]]:
-        with self._execute_lock:
-            res = self.conn.execute("SELECT hrn, meta FROM metadata WHERE instrument_key = ?", (instrument_key,)).fetchone()
+        res = self.connections.reader().execute("SELECT hrn, meta FROM metadata WHERE instrument_key = ?", (instrument_key,)).fetchone()
         if res: return {'hrn': res[0], 'metadata': json.loads(res[1])}
         return None
 
     def execute(self, sql: str, params: tuple = ()):
-        with self._execute_lock:
+        with self.connections.writer('execute', tables=self.cache.write_targets(sql)):
             self.conn.execute(sql, params)
 
     def query(self, sql: str, params: tuple = (), json_serialize: bool = False) -> List[Dict[str, Any]]:
-        with self._execute_lock:
-            df = self.conn.execute(sql, params).fetch_df()
+        if not self.cache.is_read(sql):
+            # Anything but a single SELECT runs on the writer, which invalidates every cached result once done
+            with self.connections.writer('query', tables=(ALL_TABLES,)):
+                return self._query_records(sql, params, json_serialize, self.conn)
+        hit, rows, token = self.cache.lookup(sql, params, 'json' if json_serialize else 'records')
+        if not hit:
+            rows = self._query_records(sql, params, json_serialize)
+            self.cache.store(token, rows)
+            if token is None:
+                return rows
+        # Callers may mutate the records; the cached list stays pristine
+        return [dict(r) for r in rows]
+
+    def _query_records(self, sql: str, params: tuple, json_serialize: bool, cursor=None) -> List[Dict[str, Any]]:
+        df = (cursor or self.connections.reader()).execute(sql, params).fetch_df()
 
         # Ensure all datetime columns are UTC-aware
         for col in df.select_dtypes(include=['datetime64']).columns:
@@ -254,16 +624,114 @@ class LocalDB:
 
         return df.to_dict('records')
 
+    def query_arrow(self, sql: str, params: tuple = ()):
+        """Runs a read query and returns the result as a pyarrow.Table (no pandas conversion)."""
+        if not self.cache.is_read(sql):
+            with self.connections.writer('query_arrow', tables=(ALL_TABLES,)):
+                return self._fetch_arrow(self.conn.execute(sql, params))
+        hit, table, token = self.cache.lookup(sql, params, 'arrow')
+        if hit:
+            return table
+        table = self._fetch_arrow(self.connections.reader().execute(sql, params))
+        self.cache.store(token, table)
+        return table
+
+    @staticmethod
+    def _fetch_arrow(result):
+        to_arrow = getattr(result, 'to_arrow_table', None) or result.fetch_arrow_table
+        return to_arrow()
+
+    def query_numpy(self, sql: str, params: tuple = ()) -> Dict[str, np.ndarray]:
+        """
+        Runs a read query and returns {column: numpy array}. NULLs in float
+        columns become NaN; other columns with NULLs become object arrays with None.
+        """
+        columns = self.connections.reader().execute(sql, params).fetchnumpy()
+        for name, values in columns.items():
+            if isinstance(values, np.ma.MaskedArray):
+                if values.dtype.kind == 'f':
+                    columns[name] = values.filled(np.nan)
+                elif values.mask is np.ma.nomask or not values.mask.any():
+                    columns[name] = values.data
+                else:
+                    filled = values.data.astype(object)
+                    filled[values.mask] = None
+                    columns[name] = filled
+        return columns
+
+    def _fold_bars_1m(self, source: str, params: tuple = (), carry: bool = True):
+        """
+        Folds a tick relation into bars_1m (caller holds the writer lock). With
+        ``carry`` the tick rule continues from tick_rule_state and updates it.
+        """
+        sides = TICK_SIDES.format(source=source, carry=TICK_RULE_CARRY if carry else "")
+        self.conn.execute(BARS_1M_UPSERT.format(sides=sides), params)
+        if carry:
+            self.conn.execute(TICK_RULE_STATE_UPSERT.format(sides=sides), params)
+
+    def rebuild_bars_1m(self, date: Optional[str] = None):
+        """Recomputes bars_1m from stored ticks (hot and archived), for one trading day or all of them."""
+        where = "WHERE date = ?" if date else ""
+        params = (date,) if date else ()
+        with self.connections.writer('rebuild_bars_1m', tables=('bars_1m',)):
+            self.conn.execute("BEGIN TRANSACTION")
+            try:
+                self.conn.execute(f"DELETE FROM bars_1m {where}", params)
+                # A rebuild replays stored ticks from the start, so it does not continue from the live state
+                self._fold_bars_1m(f"SELECT date, instrumentKey, ts_ms, price, qty, bid, ask FROM ticks_all {where}",
+                                   params, carry=False)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        logger.info(f"Rebuilt bars_1m{' for ' + date if date else ''}")
+
+    def get_bars(self, instrument_key: str, interval: str = '1', start_ts: Optional[int] = None,
+                 end_ts: Optional[int] = None, limit: Optional[int] = None):
+        """
+        OHLCV bars for any interval from bars_1m as a pyarrow.Table ordered by ts
+        (epoch seconds of the bar open). Intraday intervals are bucketed with
+        time_bucket anchored at the 09:15 IST session open, 'D' by IST trading
+        day, matching core.bar_builder. ``limit`` keeps the most recent bars.
+        """
+        interval = str(interval)
+        if interval == 'D':
+            bucket = f"CAST(epoch(time_bucket(INTERVAL '1 day', make_timestamp((ts + {IST_OFFSET_SECONDS}) * 1000000))) AS BIGINT) - {IST_OFFSET_SECONDS} + {SESSION_OPEN_SECONDS}"
+        elif interval.isdigit() or interval in INTERVAL_SECONDS:
+            bucket = f"CAST(epoch(time_bucket(INTERVAL '{int(interval)} minutes', make_timestamp(ts * 1000000), make_timestamp({SESSION_ANCHOR_UTC * 1000000}))) AS BIGINT)"
+        else:
+            raise ValueError(f"Unsupported bar interval: {interval}")
+
+        sql = f"""
+            SELECT {bucket} AS ts,
+                   arg_min(open, ts) AS open, max(high) AS high, min(low) AS low, arg_max(close, ts) AS close,
+                   CAST(sum(volume) AS BIGINT) AS volume, CAST(sum(ticks) AS BIGINT) AS ticks,
+                   CAST(sum(buy_volume) AS BIGINT) AS buy_volume, CAST(sum(sell_volume) AS BIGINT) AS sell_volume
+            FROM bars_1m WHERE instrumentKey = ?
+        """
+        params: List[Any] = [instrument_key]
+        if start_ts is not None:
+            sql += " AND ts >= ?"
+            params.append(start_ts)
+        if end_ts is not None:
+            sql += " AND ts <= ?"
+            params.append(end_ts)
+        sql += " GROUP BY 1"
+        if limit:
+            sql = f"SELECT * FROM ({sql} ORDER BY ts DESC LIMIT ?) ORDER BY ts"
+            params.append(limit)
+        else:
+            sql += " ORDER BY ts"
+        return self.query_arrow(sql, tuple(params))
+
     def get_tables(self) -> List[str]:
-        with self._execute_lock:
-            df = self.conn.execute("SHOW TABLES").fetch_df()
+        df = self.connections.reader().execute("SHOW TABLES").fetch_df()
         return df['name'].tolist() if not df.empty else []
 
     def get_table_schema(self, table_name: str, json_serialize: bool = False) -> List[Dict[str, Any]]:
-        with self._execute_lock:
-            # DESCRIBE returns column_name, column_type, null, key, default, extra
-            # Wrap table name in double quotes for safety
-            df = self.conn.execute(f'DESCRIBE "{table_name}"').fetch_df()
+        # DESCRIBE returns column_name, column_type, null, key, default, extra
+        # Wrap table name in double quotes for safety
+        df = self.connections.reader().execute(f'DESCRIBE "{table_name}"').fetch_df()
 
         if json_serialize:
             # Use pandas to_json to handle NaN/nulls correctly for API consumption
@@ -296,7 +764,7 @@ class LocalDB:
         if 'timestamp' in df.columns:
             df['timestamp'] = pd.to_datetime(df['timestamp']).dt.tz_localize(None)
 
-        with self._execute_lock:
+        with self.connections.writer('insert_options_snapshot', tables=('options_snapshots',)):
             # Register the dataframe to ensure types are correctly mapped
             self.conn.register('df_view', df)
             self.conn.execute(f"INSERT INTO options_snapshots ({', '.join(cols)}) SELECT * FROM df_view")
@@ -319,35 +787,174 @@ class LocalDB:
         if 'timestamp' in df.columns:
             df['timestamp'] = pd.to_datetime(df['timestamp']).dt.tz_localize(None)
 
-        with self._execute_lock:
+        with self.connections.writer('insert_pcr_history', tables=('pcr_history',)):
             # Register the dataframe to ensure types are correctly mapped
             self.conn.register('df_view_pcr', df)
             self.conn.execute(f"INSERT INTO pcr_history ({', '.join(cols)}) SELECT * FROM df_view_pcr")
             self.conn.unregister('df_view_pcr')
 
-    def cleanup_old_data(self, days: int = 30):
-        """Deletes ticks older than X days to keep the DB size manageable."""
-        with self._execute_lock:
+    def archived_dates(self) -> List[str]:
+        """Trading dates (YYYY-MM-DD) present in the Parquet tick archive, oldest first."""
+        return sorted(os.path.basename(d)[len('date='):] for d in glob.glob(os.path.join(TICK_ARCHIVE_PATH, 'date=*')))
+
+    def refresh_ticks_view(self):
+        """
+        (Re)creates the ticks_all view: the hot ticks table plus every archived
+        day read through read_parquet, with date/instrumentKey taken from the
+        partition path so filters on them prune whole directories.
+        """
+        cols = ', '.join(TICK_COLUMNS)
+        sql = f"CREATE OR REPLACE VIEW ticks_all AS SELECT {cols} FROM ticks"
+        if glob.glob(os.path.join(TICK_ARCHIVE_PATH, 'date=*', '*', '*.parquet')):
+            archive_glob = os.path.join(TICK_ARCHIVE_PATH, 'date=*', '*', '*.parquet').replace("'", "''")
+            sql += f"""
+                UNION ALL
+                SELECT {cols} FROM read_parquet('{archive_glob}', hive_partitioning = true,
+                                                hive_types = {{'date': DATE, 'instrumentKey': VARCHAR}})
+            """
+        with self.connections.writer('refresh_ticks_view', tables=('tick_archive',)):
+            self.conn.execute(sql)
+
+    def archive_day(self, date: str, replace: bool = False) -> int:
+        """
+        Moves one trading day from the ticks table into the Parquet archive,
+        sorted by instrument and time. The day is exported from a reader cursor
+        and moved into place under the writer lock, where the hot rows are
+        deleted. Files get unique names, so rows that reach an already archived
+        day (late or requeued ticks) are added to its partition; ``replace``
+        drops the existing partition first, for an explicit re-export.
+        """
+        staging = os.path.join(TICK_ARCHIVE_PATH, f'.staging-{date}')
+        target = os.path.join(TICK_ARCHIVE_PATH, f'date={date}')
+        os.makedirs(TICK_ARCHIVE_PATH, exist_ok=True)
+        shutil.rmtree(staging, ignore_errors=True)
+
+        export = f"""
+            COPY (SELECT {', '.join(TICK_COLUMNS)} FROM ticks WHERE date = ? ORDER BY instrumentKey, ts_ms)
+            TO '{staging.replace("'", "''")}' (FORMAT parquet, COMPRESSION zstd, PARTITION_BY (date, instrumentKey),
+                                               OVERWRITE, FILENAME_PATTERN 'ticks_{{uuid}}')
+        """
+        rows = self.connections.reader().execute(export, (date,)).fetchone()[0]
+        with self.connections.writer('archive_day', tables=('ticks', 'tick_archive')):
+            # Ticks that arrived for the day after the export: re-export while holding the lock
+            if self.conn.execute("SELECT count(*) FROM ticks WHERE date = ?", (date,)).fetchone()[0] != rows:
+                shutil.rmtree(staging, ignore_errors=True)
+                rows = self.conn.execute(export, (date,)).fetchone()[0]
+            if replace:
+                shutil.rmtree(target, ignore_errors=True)
+            if rows:
+                exported = os.path.join(staging, f'date={date}')
+                for instrument_dir in os.listdir(exported):
+                    os.makedirs(os.path.join(target, instrument_dir), exist_ok=True)
+                    for name in os.listdir(os.path.join(exported, instrument_dir)):
+                        os.replace(os.path.join(exported, instrument_dir, name), os.path.join(target, instrument_dir, name))
+            self.conn.execute("DELETE FROM ticks WHERE date = ?", (date,))
+        shutil.rmtree(staging, ignore_errors=True)
+        return rows
+
+    def archive_sealed_days(self, hot_days: int = 2) -> Dict[str, int]:
+        """
+        Archives every trading day older than the most recent ``hot_days``
+        calendar days (IST), so the live DuckDB file only holds the current
+        session(s). Returns rows archived per date.
+        """
+        today_ist = (datetime.now(timezone.utc) + timedelta(milliseconds=IST_OFFSET_MS)).date()
+        cutoff = today_ist - timedelta(days=max(hot_days, 1) - 1)
+        dates = [str(r[0]) for r in self.connections.reader().execute(
+            "SELECT DISTINCT date FROM ticks WHERE date < ? ORDER BY date", (cutoff,)
+        ).fetchall()]
+
+        archived = {}
+        for date in dates:
             try:
-                self.conn.execute(f"DELETE FROM ticks WHERE date < CURRENT_DATE - INTERVAL '{days} days'")
-                self.conn.execute("CHECKPOINT")
-                logger.info(f"Cleaned up ticks older than {days} days")
+                archived[date] = self.archive_day(date)
+                logger.info(f"Archived {archived[date]} ticks for {date} to {TICK_ARCHIVE_PATH}")
             except Exception as e:
-                logger.error(f"Cleanup error: {e}")
+                logger.error(f"Archiving ticks for {date} failed: {e}")
+                break
+        if archived:
+            with self.connections.writer('archive_sealed_days'):
+                self.conn.execute("CHECKPOINT")
+            self.refresh_ticks_view()
+        return archived
 
-    def optimize_storage(self):
-        """Performs a vacuum-like optimization by re-sorting ticks by instrument and timestamp."""
-        with self._execute_lock:
+    def cleanup_old_data(self, days: int = 30):
+        """
+        Enforces tick retention. Archived days are dropped by deleting their
+        date= partition directory; only rows still in the hot table fall back
+        to a DELETE.
+        """
+        try:
+            cutoff = str((datetime.now(timezone.utc) + timedelta(milliseconds=IST_OFFSET_MS)).date() - timedelta(days=days))
+            expired = [d for d in self.archived_dates() if d < cutoff]
+            for date in expired:
+                shutil.rmtree(os.path.join(TICK_ARCHIVE_PATH, f'date={date}'), ignore_errors=True)
+            if expired:
+                self.refresh_ticks_view()
+
+            with self.connections.writer('cleanup_old_data', tables=('ticks', 'bars_1m', 'tick_rule_state')):
+                deleted = self.conn.execute("DELETE FROM ticks WHERE date < ?", (cutoff,)).fetchone()[0]
+                self.conn.execute("DELETE FROM bars_1m WHERE date < ?", (cutoff,))
+                # Instruments (expired strikes) that have not ticked since the cutoff
+                self.conn.execute(f"DELETE FROM tick_rule_state WHERE ts_ms < epoch_ms(CAST(? AS DATE)) - {IST_OFFSET_MS}", (cutoff,))
+                if deleted:
+                    self.conn.execute("CHECKPOINT")
+            logger.info(f"Cleaned up ticks older than {days} days ({len(expired)} archived days dropped, {deleted} hot rows deleted)")
+        except Exception as e:
+            logger.error(f"Cleanup error: {e}")
+
+    def cluster_day(self, date: str) -> int:
+        """
+        Rewrites one sealed day's hot ticks in (instrumentKey, ts_ms) order.
+        The rows are deleted and re-appended as new row groups, so the day's
+        min/max zone maps become tight while other days are left untouched.
+        """
+        with self.connections.writer('cluster_day', tables=('ticks', 'tick_clustering')):
+            self.conn.execute("BEGIN TRANSACTION")
             try:
-                logger.info("Optimizing data storage for replay...")
-                # DuckDB doesn't have CLUSTER, so we recreate the table sorted
-                self.conn.execute("CREATE TABLE ticks_new AS SELECT * FROM ticks ORDER BY instrumentKey, ts_ms")
-                self.conn.execute("DROP TABLE ticks")
-                self.conn.execute("ALTER TABLE ticks_new RENAME TO ticks")
-                self.conn.execute("CREATE INDEX IF NOT EXISTS idx_ticks_key_ts ON ticks (instrumentKey, ts_ms)")
+                self.conn.execute(f"""
+                    CREATE TEMP TABLE ticks_cluster_stage AS
+                    SELECT {', '.join(TICK_COLUMNS)} FROM ticks WHERE date = ? ORDER BY instrumentKey, ts_ms
+                """, (date,))
+                self.conn.execute("DELETE FROM ticks WHERE date = ?", (date,))
+                rows = self.conn.execute(
+                    f"INSERT INTO ticks ({', '.join(TICK_COLUMNS)}) SELECT * FROM ticks_cluster_stage"
+                ).fetchone()[0]
+                self.conn.execute("DROP TABLE ticks_cluster_stage")
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO tick_clustering (date, rows, clustered_at) VALUES (?, ?, CURRENT_TIMESTAMP)",
+                    (date, rows)
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    def optimize_storage(self):
+        """
+        Clusters hot trading days that are sealed (before today, IST) and not
+        yet clustered. Cost is proportional to the newly sealed day(s) rather
+        than the whole table; archived days are already written sorted.
+        """
+        try:
+            today_ist = (datetime.now(timezone.utc) + timedelta(milliseconds=IST_OFFSET_MS)).date()
+            dates = [str(r[0]) for r in self.connections.reader().execute("""
+                SELECT DISTINCT t.date FROM ticks t
+                WHERE t.date < ? AND t.date NOT IN (SELECT date FROM tick_clustering)
+                ORDER BY t.date
+            """, (today_ist,)).fetchall()]
+            if not dates:
+                return
+            logger.info(f"Clustering ticks for {len(dates)} sealed day(s)...")
+            for date in dates:
+                rows = self.cluster_day(date)
+                logger.info(f"Clustered {rows} ticks for {date}")
+            with self.connections.writer('optimize_storage', tables=('tick_clustering',)):
+                self.conn.execute("DELETE FROM tick_clustering WHERE date NOT IN (SELECT DISTINCT date FROM ticks)")
                 self.conn.execute("CHECKPOINT")
-                logger.info("Storage optimization complete.")
-            except Exception as e:
-                logger.error(f"Optimization error: {e}")
+            logger.info("Storage optimization complete.")
+        except Exception as e:
+            logger.error(f"Optimization error: {e}")
 
 db = LocalDB()
@@ -0,0 +1,260 @@
+"""
+Write-version-aware query result cache.
+Results are keyed by whitespace-normalized SQL, parameters and result kind and
+tagged with the write versions of the tables the statement reads. Writers bump
+those versions after committing, so a cached result is served only while none
+of its tables has changed. Entries are evicted LRU once the estimated result
+size exceeds ``max_bytes``. Only SQL that DuckDB parses as a single SELECT
+counts as a read.
+"""
+import re
+import sys
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import duckdb
+
+_WHITESPACE = re.compile(r"\s+")
+# FROM/JOIN clauses are scanned item by item: a relation (optionally schema-qualified; table
+# functions and subqueries are skipped, their own FROMs being clauses of their own), an optional
+# alias, then a comma if another item of the same FROM list follows
+_CLAUSE = re.compile(r'\b(?:from|join)\b', re.IGNORECASE)
+_RELATION = re.compile(r'\s*(?:lateral\s+)?(?:"?[A-Za-z_]\w*"?\s*\.\s*)?"?([A-Za-z_]\w*)"?(\s*[.(])?', re.IGNORECASE)
+_ALIAS = re.compile(r'\s*(?:as\s+)?"?([A-Za-z_]\w*)"?', re.IGNORECASE)
+_LIST_SEPARATOR = re.compile(r'\s*,')
+_NOT_ALIAS = {
+    'where', 'group', 'order', 'limit', 'offset', 'having', 'qualify', 'window', 'union', 'except', 'intersect',
+    'join', 'inner', 'left', 'right', 'full', 'outer', 'cross', 'natural', 'asof', 'positional', 'semi', 'anti',
+    'lateral', 'on', 'using', 'sample', 'tablesample', 'pivot', 'unpivot', 'fetch', 'returning',
+}
+_WRITE_TARGET = re.compile(
+    r'\b(?:insert\s+(?:or\s+\w+\s+)?into|update|delete\s+from|alter\s+table|drop\s+table(?:\s+if\s+exists)?|'
+    r'create\s+(?:or\s+replace\s+)?table(?:\s+if\s+not\s+exists)?|truncate)\s+"?([A-Za-z_][A-Za-z0-9_]*)"?',
+    re.IGNORECASE
+)
+# Results of these change without any write, so such statements are never cached
+_VOLATILE = re.compile(
+    r'\b(?:now|current_date|current_time|current_timestamp|get_current_timestamp|today|random|uuid|gen_random_uuid|'
+    r'read_parquet|read_csv|read_json|information_schema|pg_catalog|duckdb_\w+)\b',
+    re.IGNORECASE
+)
+# Write target for statements whose tables cannot be determined: invalidates every entry
+ALL_TABLES = '*'
+# Views and the tables (or external sources) their results depend on
+VIEW_DEPENDENCIES = {
+    'ticks_all': ('ticks', 'tick_archive'),
+}
+
+
+def normalize_sql(sql: str) -> str:
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+@lru_cache(maxsize=1024)
+def _single_select(sql: str) -> bool:
+    """True if ``sql`` parses as exactly one SELECT; a cursor runs every statement of a multi-statement string."""
+    try:
+        statements = duckdb.extract_statements(sql)
+    except duckdb.Error:
+        return False
+    return len(statements) == 1 and statements[0].type == duckdb.StatementType.SELECT
+
+
+def _skip_parens(sql: str, pos: int) -> Optional[int]:
+    """Index just past the parenthesis opened at ``pos`` (string literals respected), None if unbalanced."""
+    depth = 0
+    quote = None
+    for i in range(pos, len(sql)):
+        ch = sql[i]
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return None
+
+
+def referenced_tables(sql: str) -> Optional[set]:
+    """Every table or view named in a FROM/JOIN clause, or None if a clause cannot be parsed confidently."""
+    tables = set()
+    for clause in _CLAUSE.finditer(sql):
+        pos = clause.end()
+        while True:
+            rest = sql[pos:]
+            if rest.lstrip().startswith('('):
+                pos = _skip_parens(sql, pos + len(rest) - len(rest.lstrip()))
+                if pos is None:
+                    return None
+            else:
+                relation = _RELATION.match(sql, pos)
+                if relation is None:
+                    return None
+                follow = (relation.group(2) or '').strip()
+                if follow == '.':
+                    return None  # catalog.schema.table
+                if follow == '(':
+                    pos = _skip_parens(sql, relation.end() - 1)
+                    if pos is None:
+                        return None
+                else:
+                    tables.add(relation.group(1).lower())
+                    pos = relation.end()
+            alias = _ALIAS.match(sql, pos)
+            if alias is not None and alias.group(1).lower() not in _NOT_ALIAS:
+                pos = alias.end()
+                if sql[pos:].lstrip().startswith('('):
+                    # Column aliases: AS t(a, b)
+                    pos = _skip_parens(sql, pos + len(sql[pos:]) - len(sql[pos:].lstrip()))
+                    if pos is None:
+                        return None
+            separator = _LIST_SEPARATOR.match(sql, pos)
+            if separator is None:
+                break
+            pos = separator.end()
+    return tables
+
+
+def _estimate_size(value: Any) -> int:
+    """Approximate in-memory size of a cached result."""
+    nbytes = getattr(value, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return nbytes
+    if isinstance(value, list):
+        if not value:
+            return sys.getsizeof(value)
+        first = value[0]
+        per_row = sys.getsizeof(first)
+        if isinstance(first, dict):
+            per_row += sum(sys.getsizeof(v) for v in first.values())
+        return sys.getsizeof(value) + per_row * len(value)
+    return sys.getsizeof(value)
+
+
+class QueryCache:
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Tuple[Tuple, Any, int]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._epoch = 0  # bumped by writes whose target tables cannot be determined
+        self.bytes = 0
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.uncacheable = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def is_read(sql: str) -> bool:
+        """True for a single SELECT statement; anything else has to run under the writer lock."""
+        return _single_select(sql)
+
+    @staticmethod
+    def write_targets(sql: str) -> Tuple[str, ...]:
+        """Tables an arbitrary write statement targets, for ``bump`` (ALL_TABLES if unknown)."""
+        return tuple(t.lower() for t in _WRITE_TARGET.findall(sql)) or (ALL_TABLES,)
+
+    def tables_for(self, sql: str) -> Optional[Tuple[str, ...]]:
+        """Tables a read statement depends on, or None if it must not be cached."""
+        if not self.is_read(sql) or _VOLATILE.search(sql):
+            return None
+        names = referenced_tables(sql)
+        if names is None:
+            return None
+        tables = set()
+        for name in names:
+            tables.update(VIEW_DEPENDENCIES.get(name, (name,)))
+        return tuple(sorted(tables)) or None
+
+    def _snapshot(self, tables: Iterable[str]) -> Tuple:
+        return (self._epoch,) + tuple(self._versions.get(t, 0) for t in tables)
+
+    def lookup(self, sql: str, params: Any, kind: str):
+        """
+        Returns (hit, value, token). On a miss, pass ``token`` to store() with
+        the freshly computed result; it carries the table versions observed
+        before the query ran. ``token`` is None for uncacheable statements.
+        """
+        if not self.enabled:
+            return False, None, None
+        tables = self.tables_for(sql)
+        if tables is None:
+            self.uncacheable += 1
+            return False, None, None
+        key = (normalize_sql(sql), repr(tuple(params) if params else ()), kind)
+        with self._lock:
+            snapshot = self._snapshot(tables)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == snapshot:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, entry[1], None
+                self._drop(key)
+                self.stale += 1
+            self.misses += 1
+        return False, None, (key, snapshot)
+
+    def store(self, token, value: Any):
+        if token is None:
+            return
+        key, snapshot = token
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (snapshot, value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+
+    def bump(self, *tables: str):
+        """Marks tables as written; call after the write has committed."""
+        with self._lock:
+            for table in tables:
+                if table == ALL_TABLES:
+                    self._epoch += 1
+                else:
+                    self._versions[table] = self._versions.get(table, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'evictions': self.evictions,
+                'uncacheable': self.uncacheable,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
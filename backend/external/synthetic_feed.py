@@ -0,0 +1,238 @@
+"""
+Synthetic Feed Provider
+Offline stand-in for the live WebSocket providers. Generates quote and
+chart_update traffic for a configurable universe of underlyings and their
+option chains at a target tick rate, so data_engine throughput can be measured
+without network access (see bench_data_engine.py).
+"""
+import logging
+import math
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from core.interfaces import ILiveStreamProvider
+
+logger = logging.getLogger(__name__)
+
+# name -> (initial spot, strike step)
+DEFAULT_UNDERLYINGS = {
+    "NIFTY": (25000.0, 50),
+    "BANKNIFTY": (55000.0, 100),
+    "FINNIFTY": (26000.0, 50),
+}
+RISK_FREE_RATE = 0.10
+
+
+def _norm_cdf(x: float) -> float:
+    return 0.5 * (1.0 + math.erf(x / math.sqrt(2.0)))
+
+
+def _bs_price(spot: float, strike: float, t: float, sigma: float, is_call: bool) -> float:
+    """Black-Scholes premium, floored at the exchange tick size."""
+    d1 = (math.log(spot / strike) + (RISK_FREE_RATE + 0.5 * sigma ** 2) * t) / (sigma * math.sqrt(t))
+    d2 = d1 - sigma * math.sqrt(t)
+    if is_call:
+        price = spot * _norm_cdf(d1) - strike * math.exp(-RISK_FREE_RATE * t) * _norm_cdf(d2)
+    else:
+        price = strike * math.exp(-RISK_FREE_RATE * t) * _norm_cdf(-d2) - spot * _norm_cdf(-d1)
+    return max(round(price * 20) / 20, 0.05)
+
+
+class _Instrument:
+    __slots__ = ('symbol', 'underlying', 'strike', 'is_call', 'price', 'volume', 'oi', 'bar')
+
+    def __init__(self, symbol: str, price: float, underlying: Optional[str] = None,
+                 strike: float = 0.0, is_call: bool = True, oi: float = 0.0):
+        self.symbol = symbol
+        self.underlying = underlying
+        self.strike = strike
+        self.is_call = is_call
+        self.price = price
+        self.volume = 0.0
+        self.oi = oi
+        self.bar = None  # [ts_sec, o, h, l, c, v] of the current 1m candle
+
+
+class SyntheticFeedProvider(ILiveStreamProvider):
+    """
+    Emits TradingView-shaped quote messages (``feeds``) and 1m ``chart_update``
+    messages for underlyings, from a random walk on the spots with option
+    premiums priced off the current spot.
+
+    ``ticks_per_second`` is the total target rate across all instruments
+    (0 = as fast as the callback accepts); ``chart_update_ratio`` is the share
+    of underlying ticks that are delivered as chart updates instead of quotes.
+    """
+
+    def __init__(self, callback: Callable = None, underlyings: Optional[Dict[str, tuple]] = None,
+                 strikes_per_side: int = 10, ticks_per_second: float = 1000.0,
+                 chart_update_ratio: float = 0.05, volatility: float = 0.15,
+                 days_to_expiry: int = 7, seed: Optional[int] = None):
+        self.callbacks = []
+        if callback: self.callbacks.append(callback)
+        self.ticks_per_second = ticks_per_second
+        self.chart_update_ratio = chart_update_ratio
+        self.volatility = volatility
+        self.rng = random.Random(seed)
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+        self.instruments: Dict[str, _Instrument] = {}
+        self.underlyings: List[_Instrument] = []
+        self.time_to_expiry = max(days_to_expiry, 1) / 365.0
+        expiry = datetime.now() + timedelta(days=days_to_expiry)
+        for name, (spot, step) in (underlyings or DEFAULT_UNDERLYINGS).items():
+            und = _Instrument(f"NSE:{name}", spot)
+            self.instruments[und.symbol] = und
+            self.underlyings.append(und)
+            atm = round(spot / step) * step
+            for k in range(-strikes_per_side, strikes_per_side + 1):
+                strike = atm + k * step
+                for is_call in (True, False):
+                    symbol = f"NSE:{name}{expiry:%y%m%d}{'C' if is_call else 'P'}{int(strike)}"
+                    premium = _bs_price(spot, strike, self.time_to_expiry, volatility, is_call)
+                    oi = float(self.rng.randint(50, 5000) * 75)
+                    self.instruments[symbol] = _Instrument(symbol, premium, und.symbol, strike, is_call, oi)
+        self.symbols = list(self.instruments)
+
+        # Progress
+        self.ticks_sent = 0
+        self.chart_updates_sent = 0
+        self.started_at = 0.0
+
+    def _distribute_callback(self, data):
+        for cb in self.callbacks:
+            try:
+                cb(data)
+            except Exception as e:
+                logger.error(f"Error in SyntheticFeedProvider callback: {e}")
+
+    def subscribe(self, symbols: List[str], interval: str = "1"):
+        with self.lock:
+            for s in symbols:
+                s = s.upper()
+                if s not in self.instruments:
+                    inst = self.instruments[s] = _Instrument(s, round(self.rng.uniform(100, 5000), 2))
+                    self.underlyings.append(inst)
+                    self.symbols.append(s)
+
+    def unsubscribe(self, symbol: str, interval: str = "1"):
+        # The synthetic universe is fixed; unsubscribing only stops client delivery upstream
+        pass
+
+    def set_callback(self, callback: Callable):
+        if callback not in self.callbacks:
+            self.callbacks.append(callback)
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="synthetic-feed", daemon=True)
+        self.thread.start()
+        logger.info(f"Synthetic feed started: {len(self.instruments)} instruments at {self.ticks_per_second:g} ticks/s")
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
+
+    def is_connected(self) -> bool:
+        return bool(self.thread and self.thread.is_alive())
+
+    def _run(self):
+        self.started_at = time.perf_counter()
+        slice_s = 0.01
+        next_slice = self.started_at
+        carry = 0.0
+        while not self.stop_event.is_set():
+            if self.ticks_per_second > 0:
+                carry += self.ticks_per_second * slice_s
+                count, carry = int(carry), carry - int(carry)
+            else:
+                count = 100
+            for _ in range(count):
+                self._next_tick()
+
+            if self.ticks_per_second > 0:
+                next_slice += slice_s
+                delay = next_slice - time.perf_counter()
+                if delay > 0:
+                    self.stop_event.wait(delay)
+                elif delay < -1.0:
+                    # Far behind target: the consumer is the bottleneck, don't burst to catch up
+                    next_slice = time.perf_counter()
+
+    def _next_tick(self):
+        rng = self.rng
+        with self.lock:
+            # Underlyings tick more often than individual options
+            if rng.random() < 0.3:
+                inst = rng.choice(self.underlyings)
+            else:
+                inst = self.instruments[rng.choice(self.symbols)]
+
+            if inst.underlying is None:
+                inst.price = round(inst.price * (1 + rng.gauss(0, 0.0002)), 2)
+            else:
+                spot = self.instruments[inst.underlying].price
+                inst.price = _bs_price(spot, inst.strike, self.time_to_expiry, self.volatility, inst.is_call)
+                inst.oi = max(0.0, inst.oi + rng.choice((-75, 0, 0, 75)))
+            qty = rng.randint(1, 20) * (75 if inst.underlying else 1)
+            inst.volume += qty
+            now = time.time()
+            ts_ms = int(now * 1000)
+            received = time.perf_counter()
+
+            if inst.underlying is None and rng.random() < self.chart_update_ratio:
+                message = self._chart_update(inst, int(now), qty)
+            else:
+                message = {
+                    'type': 'live_feed',
+                    'feeds': {
+                        inst.symbol: {
+                            'last_price': inst.price,
+                            'ts_ms': ts_ms,
+                            'tv_volume': inst.volume,
+                            'oi': inst.oi if inst.underlying else None,
+                            'source': 'synthetic'
+                        }
+                    }
+                }
+        message['recv_ts'] = received
+        self._distribute_callback(message)
+        if message.get('type') == 'chart_update':
+            self.chart_updates_sent += 1
+        else:
+            self.ticks_sent += 1
+
+    def _chart_update(self, inst: _Instrument, ts_sec: int, qty: float) -> Dict[str, Any]:
+        bucket = ts_sec - ts_sec % 60
+        bar = inst.bar
+        if bar is None or bar[0] != bucket:
+            bar = inst.bar = [bucket, inst.price, inst.price, inst.price, inst.price, 0.0]
+        bar[2] = max(bar[2], inst.price)
+        bar[3] = min(bar[3], inst.price)
+        bar[4] = inst.price
+        bar[5] += qty
+        return {
+            'type': 'chart_update',
+            'instrumentKey': inst.symbol,
+            'interval': '1',
+            'data': {'ohlcv': [list(bar)]}
+        }
+
+    def status(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        return {
+            'running': self.is_connected(),
+            'instruments': len(self.instruments),
+            'target_ticks_per_second': self.ticks_per_second,
+            'ticks_sent': self.ticks_sent,
+            'chart_updates_sent': self.chart_updates_sent,
+            'actual_ticks_per_second': round((self.ticks_sent + self.chart_updates_sent) / elapsed, 1) if elapsed else 0.0,
+        }
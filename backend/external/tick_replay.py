@@ -0,0 +1,178 @@
+"""
+Tick Replay Provider
+Replays a stored trading session from the DuckDB ``ticks`` table through the
+regular live callback (data_engine.on_message) at 1x-100x speed, so
+subscribers, charts and analyzers see the same events as they did live.
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from core.interfaces import ILiveStreamProvider
+from db.local_db import db
+
+logger = logging.getLogger(__name__)
+
+MAX_SPEED = 100.0
+
+
+class TickReplayProvider(ILiveStreamProvider):
+    """
+    Streams one trading day of ticks in ts_ms order from a chunked cursor.
+
+    ``speed`` scales the original inter-tick gaps (1 = real time, 100 = 100x);
+    0 replays as fast as the pipeline accepts ticks. With ``rebase_time`` the
+    session is shifted so its first tick lands at the current wall time.
+    Messages carry ``replay: True`` so the data engine neither stores the
+    ticks a second time nor folds them into the live bar builder.
+    """
+
+    def __init__(self, callback: Callable = None, chunk_size: int = 5000):
+        self.callbacks = []
+        if callback: self.callbacks.append(callback)
+        self.chunk_size = chunk_size
+        self.symbols = set()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        self.date: Optional[str] = None
+        self.instruments: Optional[List[str]] = None
+        self.start_ms: Optional[int] = None
+        self.end_ms: Optional[int] = None
+        self.speed = 1.0
+        self.rebase_time = False
+        # start() only launches a configured, not yet started session; the data
+        # engine calls start() on every provider whenever a client subscribes
+        self._armed = False
+
+        # Progress
+        self.ticks_replayed = 0
+        self.current_ts_ms = 0
+        self.started_at = 0.0
+        self.finished = False
+        self.error: Optional[str] = None
+
+    def configure(self, date: str, speed: float = 1.0, instruments: Optional[List[str]] = None,
+                  start_ms: Optional[int] = None, end_ms: Optional[int] = None, rebase_time: bool = False):
+        """Selects the session to replay; takes effect on the next start()."""
+        self.date = date
+        self.set_speed(speed)
+        self.instruments = [s.upper() for s in instruments] if instruments else None
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.rebase_time = rebase_time
+        self._armed = True
+
+    def set_speed(self, speed: float):
+        """Changes the replay speed; can be called while a replay is running."""
+        speed = float(speed)
+        if speed < 0 or speed > MAX_SPEED:
+            raise ValueError(f"Replay speed must be between 0 and {MAX_SPEED:g}")
+        self.speed = speed
+
+    def _distribute_callback(self, data):
+        for cb in self.callbacks:
+            try:
+                cb(data)
+            except Exception as e:
+                logger.error(f"Error in TickReplayProvider callback: {e}")
+
+    def subscribe(self, symbols: List[str], interval: str = "1"):
+        self.symbols.update(s.upper() for s in symbols)
+
+    def unsubscribe(self, symbol: str, interval: str = "1"):
+        self.symbols.discard(symbol.upper())
+
+    def set_callback(self, callback: Callable):
+        if callback not in self.callbacks:
+            self.callbacks.append(callback)
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        if not self._armed:
+            return
+        self._armed = False
+        self.stop_event.clear()
+        self.ticks_replayed = 0
+        self.current_ts_ms = 0
+        self.finished = False
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name="tick-replay", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
+
+    def is_connected(self) -> bool:
+        return bool(self.thread and self.thread.is_alive())
+
+    def _run(self):
+        self.started_at = time.time()
+        logger.info(f"Replaying ticks for {self.date} at {self.speed:g}x")
+        wall_start = None
+        data_start = None
+        first_ts = None
+        paced_speed = self.speed
+        try:
+            for rows in db.iter_ticks(self.date, self.instruments, self.start_ms, self.end_ms, self.chunk_size):
+                for key, ts_ms, price, qty, source, oi, volume, bid, ask in rows:
+                    if self.stop_event.is_set():
+                        return
+
+                    if first_ts is None:
+                        first_ts = ts_ms
+                    if data_start is None or self.speed != paced_speed:
+                        # (Re)anchor pacing at the first tick and whenever the speed changes
+                        wall_start, data_start, paced_speed = time.monotonic(), ts_ms, self.speed
+                    if paced_speed > 0:
+                        delay = (ts_ms - data_start) / 1000.0 / paced_speed - (time.monotonic() - wall_start)
+                        if delay > 0 and self.stop_event.wait(delay):
+                            return
+
+                    # Only filter by live subscriptions when no explicit instrument list was given
+                    if not self.instruments and self.symbols and key not in self.symbols:
+                        continue
+
+                    out_ts = ts_ms
+                    if self.rebase_time:
+                        out_ts = int(self.started_at * 1000) + (ts_ms - first_ts)
+                    self._distribute_callback({
+                        'type': 'live_feed',
+                        'replay': True,
+                        'feeds': {
+                            key: {
+                                'last_price': price,
+                                'ts_ms': out_ts,
+                                'ltq': qty,
+                                'oi': oi,
+                                'volume': volume,
+                                'bid': bid,
+                                'ask': ask,
+                                'source': source
+                            }
+                        }
+                    })
+                    self.ticks_replayed += 1
+                    self.current_ts_ms = ts_ms
+            self.finished = True
+            logger.info(f"Tick replay for {self.date} finished: {self.ticks_replayed} ticks")
+        except Exception as e:
+            self.error = str(e)
+            logger.error(f"Tick replay failed: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'date': self.date,
+            'instruments': self.instruments,
+            'speed': self.speed,
+            'rebase_time': self.rebase_time,
+            'running': self.is_connected(),
+            'finished': self.finished,
+            'ticks_replayed': self.ticks_replayed,
+            'current_ts_ms': self.current_ts_ms,
+            'error': self.error,
+        }
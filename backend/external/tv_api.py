@@ -169,27 +169,12 @@ class TradingViewAPI:
                 res = None
                 for k in possible_keys:
                     logger.info(f"Falling back to local DB for {k}")
-                    interval_map = {'1': 60, '5': 300, '15': 900, '30': 1800, '60': 3600, 'D': 86400}
-                    duration = interval_map.get(interval_min, 60)
-
-                    res = db.query(f"""
-                        SELECT
-                            (ts_ms / 1000 / {duration}) * {duration} as bucket,
-                            arg_min(price, ts_ms) as o,
-                            MAX(price) as h,
-                            MIN(price) as l,
-                            arg_max(price, ts_ms) as c,
-                            SUM(qty) as v
-                        FROM ticks
-                        WHERE instrumentKey = ?
-                        GROUP BY bucket
-                        ORDER BY bucket DESC
-                        LIMIT ?
-                    """, (k, n_bars))
+                    bar_interval = str(interval_min) if str(interval_min).isdigit() or interval_min == 'D' else '1'
+                    res = db.get_bars(k, bar_interval, limit=n_bars).to_pylist()
                     if res: break
 
                 if res:
-                    candles = [[int(r['bucket']), float(r['o']), float(r['h']), float(r['l']), float(r['c']), float(r['v'])] for r in res]
+                    candles = [[int(r['ts']), float(r['open']), float(r['high']), float(r['low']), float(r['close']), float(r['volume'])] for r in reversed(res)]
                     logger.info(f"Retrieved {len(candles)} candles via local DB")
                     return candles # Already newest first from query
             except Exception as db_e:
@@ -7,13 +7,19 @@ import time
 import logging
 import re
 import requests
-import numpy as np
 from config import TV_COOKIE
 from core.symbol_mapper import symbol_mapper
 from core.utils import safe_int, safe_float
+from core.metrics import observe_stage
+from core.intraday_indicators import intraday_states
 
 logger = logging.getLogger(__name__)
 
+# Indicators recalculated on every chart update (see core.intraday_indicators)
+LIVE_INDICATORS = ('ema_9', 'ema_20', 'battle_zones', 'psych_signals')
+# Series titles the live chart has always shown where they differ from /api/tv/intraday
+LIVE_TITLES = {'psych_signals': 'Psychology Signals'}
+
 class TradingViewWSS:
     def __init__(self, on_message_callback):
         self.callback = on_message_callback
@@ -35,6 +41,7 @@ class TradingViewWSS:
         self.indicator_metadata = {}
         self.stop_event = threading.Event()
         self.thread = None
+        self.frame_received = 0.0  # perf_counter() of the frame being processed
 
     def _generate_session(self, prefix=""):
         return prefix + "".join(random.choice(string.ascii_lowercase + string.digits) for _ in range(12))
@@ -169,6 +176,7 @@ class TradingViewWSS:
                 self.ensure_chart_session(symbol, "1")
 
     def on_message(self, ws, message):
+        self.frame_received = time.perf_counter()
         if isinstance(message, bytes): message = message.decode('utf-8')
         payloads = [p for p in re.split(r"~m~\d+~m~", message) if p]
         for msg in payloads:
@@ -209,11 +217,13 @@ class TradingViewWSS:
                         'last_price': safe_float(price),
                         'ts_ms': ts_ms,
                         'tv_volume': safe_float(self.last_volumes.get(clean_symbol)),
-                        'oi': safe_float(values.get('open_interest')),
+                        'oi': safe_float(values['open_interest']) if 'open_interest' in values else None,
                         'source': 'tradingview_wss'
                     }
                 }
             }
+            feed_msg['recv_ts'] = self.frame_received
+            observe_stage('normalize', self.frame_received)
             self.callback(feed_msg)
 
     def _handle_chart_update(self, session_id, chart_data):
@@ -262,72 +272,10 @@ class TradingViewWSS:
             ohlcv_data = self.history[hist_key]['ohlcv']
             indicators = []
             try:
-                import pandas as pd
-                df = pd.DataFrame(ohlcv_data, columns=['ts', 'o', 'h', 'l', 'c', 'v'])
-                ema9 = df['c'].ewm(span=9, adjust=False).mean()
-                indicators.append({
-                    "id": "ema_9",
-                    "title": "EMA 9",
-                    "type": "line",
-                    "style": {"color": "#3b82f6", "lineWidth": 1},
-                    "data": [
-                        {"time": safe_int(ohlcv_data[i][0]), "value": safe_float(val)}
-                        for i, val in enumerate(ema9)
-                        if i >= 8 and np.isfinite(val)
-                    ],
-                    "hideLabel": True
-                })
-                ema20 = df['c'].ewm(span=20, adjust=False).mean()
-                indicators.append({
-                    "id": "ema_20",
-                    "title": "EMA 20",
-                    "type": "line",
-                    "style": {"color": "#f97316", "lineWidth": 1},
-                    "data": [
-                        {"time": safe_int(ohlcv_data[i][0]), "value": safe_float(val)}
-                        for i, val in enumerate(ema20)
-                        if i >= 19 and np.isfinite(val)
-                    ],
-                    "hideLabel": True
-                })
-
-                from brain.MarketPsychologyAnalyzer import MarketPsychologyAnalyzer
-                analyzer = MarketPsychologyAnalyzer()
-                zones, signals = analyzer.analyze(ohlcv_data)
-
-                if zones:
-                    indicators.append({
-                        "id": "battle_zones",
-                        "type": "price_lines",
-                        "title": "Zones",
-                        "data": [
-                            {
-                                "price": safe_float(zone['price']),
-                                "color": "rgba(59, 130, 246, 0.4)",
-                                "lineStyle": 2,
-                                "title": ""
-                            } for zone in zones
-                        ]
-                    })
-
-                marker_data = []
-                for ts, sig_type in signals.items():
-                    unix_ts = safe_int(ts.timestamp() if hasattr(ts, 'timestamp') else ts)
-                    marker_data.append({
-                        "time": unix_ts,
-                        "position": "aboveBar" if "SHORT" in sig_type else "belowBar",
-                        "color": "#ef4444" if "SHORT" in sig_type else "#22c55e",
-                        "shape": "arrowDown" if "SHORT" in sig_type else "arrowUp",
-                        "text": sig_type
-                    })
-
-                if marker_data:
-                    indicators.append({
-                        "id": "psych_signals",
-                        "type": "markers",
-                        "title": "Psychology Signals",
-                        "data": marker_data
-                    })
+                state = intraday_states.get(('tv_wss', hist_key))
+                indicators, _ = state.compute(ohlcv_data, LIVE_INDICATORS)
+                indicators = [{**ind, 'title': LIVE_TITLES[ind['id']]} if ind['id'] in LIVE_TITLES else ind
+                              for ind in indicators]
 
                 update_msg['data']['indicators'] = indicators
                 self.history[hist_key]['indicators'] = indicators
@@ -335,6 +283,8 @@ class TradingViewWSS:
                 logger.error(f"Error calculating indicators live: {e}")
 
         if update_msg['data']:
+            update_msg['recv_ts'] = self.frame_received
+            observe_stage('normalize', self.frame_received)
             self.callback(update_msg)
 
     def start(self):
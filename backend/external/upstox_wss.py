@@ -2,11 +2,13 @@
 import logging
 import json
 import threading
+import time
 import upstox_client
 from upstox_client.feeder.market_data_streamer_v3 import MarketDataStreamerV3
 from config import UPSTOX_ACCESS_TOKEN
 from core.symbol_mapper import symbol_mapper
 from core.utils import safe_int, safe_float
+from core.metrics import observe_stage
 
 logger = logging.getLogger(__name__)
 
@@ -85,6 +87,7 @@ class UpstoxWSS:
             self.streamer.subscribe(list(self.subscribed_keys), "full")
 
     def _on_message(self, data):
+        received = time.perf_counter()
         try:
             feeds_map = data.get('feeds', {})
             if not feeds_map: return
@@ -116,11 +119,16 @@ class UpstoxWSS:
                         market_pic = market_ff.get('marketPic', {})
                         ltt = safe_int(ltpc.get('ltt', market_pic.get('ltt')))
                         ts_ms = ltt * 1000 if 0 < ltt < 1e12 else ltt
+                        # Best bid/ask from the top of the depth ladder
+                        depth = (market_ff.get('marketLevel') or {}).get('bidAskQuote') or [{}]
                         feed_data = {
                             'last_price': safe_float(ltpc.get('ltp') if ltpc.get('ltp') is not None else market_pic.get('ltp')),
                             'ltq': safe_int(market_pic.get('ltq')),
                             'ts_ms': ts_ms,
-                            'upstox_volume': safe_float(market_pic.get('vtt'))
+                            'upstox_volume': safe_float(market_pic.get('vtt')),
+                            'oi': safe_float(market_ff['oi']) if market_ff.get('oi') is not None else None,
+                            'bid': safe_float(depth[0].get('bidP')) if depth[0].get('bidP') is not None else None,
+                            'ask': safe_float(depth[0].get('askP')) if depth[0].get('askP') is not None else None
                         }
                     else:
                         # Fallback for other potential fullFeed structures
@@ -142,7 +150,8 @@ class UpstoxWSS:
                     feed_data['source'] = 'upstox_wss'
                     normalized_feeds[internal_key] = feed_data
             if normalized_feeds:
-                self.callback({'feeds': normalized_feeds})
+                observe_stage('normalize', received)
+                self.callback({'feeds': normalized_feeds, 'recv_ts': received})
         except Exception as e:
             logger.error(f"Error processing Upstox WSS message: {e}")
 
@@ -0,0 +1,147 @@
+"""
+Data engine throughput benchmark.
+
+Drives core.data_engine with the synthetic feed provider against a scratch
+DuckDB file and reports sustained ticks/sec, on_message latency percentiles and
+DB flush lag (age of the oldest tick when its batch is committed).
+
+    python bench_data_engine.py --rate 5000 --duration 20
+    python bench_data_engine.py --rate 0 --instruments 500   # unthrottled
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Synthetic load benchmark for the data engine")
+    parser.add_argument("--rate", type=float, default=5000, help="Target ticks/sec (0 = as fast as possible)")
+    parser.add_argument("--duration", type=float, default=15, help="Measured run time in seconds")
+    parser.add_argument("--warmup", type=float, default=2, help="Seconds excluded from the measurement")
+    parser.add_argument("--instruments", type=int, default=130, help="Approximate instrument count (underlyings + options)")
+    parser.add_argument("--chart-ratio", type=float, default=0.05, help="Share of underlying ticks sent as chart_update")
+    parser.add_argument("--db", default=None, help="DuckDB file to use (default: temporary file)")
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    return parser.parse_args()
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 3) if len(values) else 0.0
+
+
+def main():
+    args = parse_args()
+    tmpdir = None
+    if not args.db:
+        tmpdir = tempfile.mkdtemp(prefix="bench_de_")
+        args.db = os.path.join(tmpdir, "bench.db")
+    # Must be set before the backend modules create the LocalDB singleton
+    os.environ["DUCKDB_PATH"] = args.db
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+
+    from core import data_engine
+    from core.provider_registry import live_stream_registry
+    from external.synthetic_feed import SyntheticFeedProvider, DEFAULT_UNDERLYINGS
+
+    per_underlying = max(args.instruments / len(DEFAULT_UNDERLYINGS) - 1, 2)
+    strikes_per_side = max(1, math.ceil((per_underlying / 2 - 1) / 2))
+
+    measuring = threading.Event()
+    latencies_ms = []
+    lags_ms = []
+    commits_ms = []
+    rows = [0]
+
+    def timed_on_message(message):
+        started = time.perf_counter()
+        data_engine.on_message(message)
+        if measuring.is_set():
+            latencies_ms.append((time.perf_counter() - started) * 1000)
+
+    write_fn = data_engine.tick_writer.write_fn
+
+    def timed_write(batch):
+        started = time.perf_counter()
+        write_fn(batch)
+        ended = time.perf_counter()
+        if measuring.is_set():
+            commits_ms.append((ended - started) * 1000)
+            lags_ms.append((ended - batch.enqueued_at) * 1000)
+            rows[0] += len(batch)
+
+    data_engine.tick_writer.write_fn = timed_write
+
+    provider = SyntheticFeedProvider(
+        timed_on_message,
+        strikes_per_side=strikes_per_side,
+        ticks_per_second=args.rate,
+        chart_update_ratio=args.chart_ratio,
+        seed=42
+    )
+    live_stream_registry.register("synthetic", provider, priority=0)
+
+    provider.start()
+    time.sleep(args.warmup)
+    sent_before = provider.ticks_sent + provider.chart_updates_sent
+    measuring.set()
+    started = time.perf_counter()
+    time.sleep(args.duration)
+    measuring.clear()
+    elapsed = time.perf_counter() - started
+    sent = provider.ticks_sent + provider.chart_updates_sent - sent_before
+    provider.stop()
+    data_engine.tick_writer.stop()
+
+    result = {
+        "instruments": len(provider.instruments),
+        "target_ticks_per_sec": args.rate,
+        "duration_s": round(elapsed, 2),
+        "sustained_ticks_per_sec": round(sent / elapsed, 1),
+        "on_message_ms": {
+            "p50": percentile(latencies_ms, 50),
+            "p99": percentile(latencies_ms, 99),
+            "max": round(max(latencies_ms), 3) if latencies_ms else 0.0,
+        },
+        "db_flush": {
+            "flushes": len(commits_ms),
+            "rows": rows[0],
+            "commit_ms_p50": percentile(commits_ms, 50),
+            "commit_ms_p99": percentile(commits_ms, 99),
+            "lag_ms_p50": percentile(lags_ms, 50),
+            "lag_ms_p99": percentile(lags_ms, 99),
+            "lag_ms_max": round(max(lags_ms), 1) if lags_ms else 0.0,
+        },
+        "dropped_ticks": data_engine.tick_buffers.overwritten + data_engine.tick_buffers.rejected,
+        "db": args.db,
+    }
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"Instruments:            {result['instruments']}")
+        print(f"Target rate:            {args.rate:g} ticks/s")
+        print(f"Sustained rate:         {result['sustained_ticks_per_sec']:g} ticks/s over {result['duration_s']}s")
+        print(f"on_message latency:     p50 {result['on_message_ms']['p50']} ms, p99 {result['on_message_ms']['p99']} ms, max {result['on_message_ms']['max']} ms")
+        f = result['db_flush']
+        print(f"DB flushes:             {f['flushes']} ({f['rows']} rows), commit p50 {f['commit_ms_p50']} ms, p99 {f['commit_ms_p99']} ms")
+        print(f"DB flush lag:           p50 {f['lag_ms_p50']} ms, p99 {f['lag_ms_p99']} ms, max {f['lag_ms_max']} ms")
+        print(f"Dropped ticks:          {result['dropped_ticks']}")
+
+    if tmpdir:
+        for name in os.listdir(tmpdir):
+            os.remove(os.path.join(tmpdir, name))
+        os.rmdir(tmpdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+DuckDB storage and query benchmark.
+
+Builds synthetic ticks, options_snapshots and pcr_history fixtures in a scratch
+database, then measures write throughput (insert_ticks, insert_tick_batch,
+insert_options_snapshot), maintenance (bars_1m rebuild, clustering, optional
+archiving) and the API endpoints that read from DuckDB, driven through
+FastAPI's TestClient so the exact endpoint SQL and encoding are exercised.
+
+Results are written as JSON and can be compared against a previous run:
+
+    python bench_duckdb.py --ticks 1000000 --output bench_baseline.json
+    python bench_duckdb.py --ticks 1000000 --compare bench_baseline.json
+    python bench_duckdb.py --ticks 50000000 --days 10 --repeat 5
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+IST = timezone(timedelta(hours=5, minutes=30))
+UNDERLYINGS = ["NSE:NIFTY", "NSE:BANKNIFTY", "NSE:FINNIFTY"]
+SESSION_MINUTES = 375  # 09:15 - 15:30 IST
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="DuckDB storage and query benchmark")
+    parser.add_argument("--ticks", type=int, default=1_000_000, help="Synthetic ticks to generate (1M-50M)")
+    parser.add_argument("--instruments", type=int, default=200, help="Distinct instruments in the ticks fixture")
+    parser.add_argument("--days", type=int, default=5, help="Trading days covered by the fixtures")
+    parser.add_argument("--strikes", type=int, default=41, help="Strikes per options snapshot")
+    parser.add_argument("--snapshot-every", type=int, default=1, help="Minutes between options snapshots")
+    parser.add_argument("--insert-rows", type=int, default=100_000, help="Ticks written through the insert paths")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per query")
+    parser.add_argument("--archive", action="store_true", help="Archive sealed days to Parquet before querying")
+    parser.add_argument("--query-cache", action="store_true", help="Keep the LocalDB query cache enabled")
+    parser.add_argument("--db", default=None, help="DuckDB file to use (default: temporary file)")
+    parser.add_argument("--output", default=None, help="Write results to this JSON file")
+    parser.add_argument("--compare", default=None, help="Baseline JSON to compare against")
+    return parser.parse_args()
+
+
+def summarize(samples_ms):
+    values = np.asarray(samples_ms)
+    return {
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "max": round(float(values.max()), 3),
+        "runs": len(values),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return (time.perf_counter() - started) * 1000, result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def trading_days(count):
+    """Most recent ``count`` weekdays before today (IST), oldest first."""
+    day = datetime.now(IST).date()
+    days = []
+    while len(days) < count:
+        day -= timedelta(days=1)
+        if day.weekday() < 5:
+            days.append(day)
+    return days[::-1]
+
+
+def session_open_ms(day):
+    return int(datetime(day.year, day.month, day.day, 9, 15, tzinfo=IST).timestamp() * 1000)
+
+
+def build_ticks(db, args, days):
+    """Bulk-generates the ticks fixture with SQL (day-major, interleaved instruments like a live feed)."""
+    per_day = max(args.ticks // len(days), 1)
+    session_ms = SESSION_MINUTES * 60_000
+    with db.connections.writer("bench_fixture", tables=("ticks",)) as conn:
+        for day in days:
+            open_ms = session_open_ms(day)
+            conn.execute(f"""
+                INSERT INTO ticks (date, instrumentKey, ts_ms, price, qty, source, oi, volume, bid, ask, provider_ts_ms)
+                SELECT DATE '{day}',
+                       CASE WHEN i % {args.instruments} < 3 THEN ['{"','".join(UNDERLYINGS)}'][i % {args.instruments} + 1]
+                            ELSE 'NSE:SYM' || (i % {args.instruments}) END,
+                       {open_ms} + i * {session_ms} // {per_day},
+                       round(100 + (i % {args.instruments}) * 10 + 5 * sin(i / 5000.0) + random(), 2) AS price,
+                       1 + CAST(random() * 50 AS BIGINT),
+                       'bench',
+                       CAST(random() * 100000 AS BIGINT),
+                       i // {args.instruments},
+                       NULL, NULL, NULL
+                FROM range({per_day}) t(i)
+            """)
+        conn.execute("CHECKPOINT")
+    return per_day * len(days)
+
+
+def build_options(db, args, days):
+    """options_snapshots and pcr_history rows for every snapshot minute of every day."""
+    with db.connections.writer("bench_fixture", tables=("options_snapshots", "pcr_history")) as conn:
+        for day in days:
+            open_utc = datetime(day.year, day.month, day.day, 9, 15, tzinfo=IST).astimezone(timezone.utc).replace(tzinfo=None)
+            conn.execute(f"""
+                INSERT INTO options_snapshots (timestamp, underlying, symbol, expiry, strike, option_type, oi, oi_change,
+                                               volume, ltp, iv, delta, gamma, theta, vega, intrinsic_value, time_value, source)
+                SELECT TIMESTAMP '{open_utc}' + INTERVAL (m) MINUTE, u, u || '_' || s || '_' || ot, DATE '{day}' + 7,
+                       25000 + (s - {args.strikes // 2}) * 50, ot,
+                       CAST(random() * 1000000 AS BIGINT), CAST((random() - 0.5) * 20000 AS BIGINT),
+                       CAST(random() * 500000 AS BIGINT), round(random() * 300, 2), 0.1 + random() * 0.1,
+                       random(), random() / 100, -random() * 10, random() * 20, 0, 0, 'bench'
+                FROM range(0, {SESSION_MINUTES}, {args.snapshot_every}) m(m),
+                     (SELECT unnest(['{"','".join(UNDERLYINGS)}']) AS u),
+                     range({args.strikes}) s(s),
+                     (SELECT unnest(['call', 'put']) AS ot)
+            """)
+            conn.execute(f"""
+                INSERT INTO pcr_history (timestamp, underlying, pcr_oi, pcr_vol, pcr_oi_change, underlying_price,
+                                         max_pain, spot_price, total_oi, total_oi_change)
+                SELECT TIMESTAMP '{open_utc}' + INTERVAL (m) MINUTE, u, 0.7 + random() * 0.6, 0.7 + random() * 0.6,
+                       random() - 0.5, 25000 + random() * 100, 25000, 25000 + random() * 100,
+                       CAST(random() * 1e8 AS BIGINT), CAST((random() - 0.5) * 1e6 AS BIGINT)
+                FROM range(0, {SESSION_MINUTES}, {args.snapshot_every}) m(m),
+                     (SELECT unnest(['{"','".join(UNDERLYINGS)}']) AS u)
+            """)
+        conn.execute("CHECKPOINT")
+
+
+def bench_inserts(db, args):
+    """insert_ticks (dict rows) and insert_tick_batch (columnar) throughput on today's date."""
+    from core.tick_buffer import TickBufferPool
+
+    now_ms = int(time.time() * 1000)
+    keys = [f"NSE:INS{i}" for i in range(args.instruments)]
+    rows = [{
+        "instrumentKey": keys[i % len(keys)], "ts_ms": now_ms + i, "last_price": 100.0 + (i % 50) / 10,
+        "ltq": 1 + i % 20, "volume": i, "oi": 1000, "source": "bench"
+    } for i in range(args.insert_rows)]
+
+    results = {}
+    for batch_size in (100, 1000, 10000):
+        elapsed = 0.0
+        for start in range(0, len(rows), batch_size):
+            ms, _ = timed(db.insert_ticks, rows[start:start + batch_size])
+            elapsed += ms
+        results[f"insert_ticks_batch_{batch_size}"] = {"rows_per_sec": round(len(rows) / (elapsed / 1000), 1), "ms": round(elapsed, 1)}
+
+    pool = TickBufferPool(initial_capacity=1024, max_capacity=1 << 20)
+    for batch_size in (1000, 10000):
+        elapsed = 0.0
+        for start in range(0, len(rows), batch_size):
+            for r in rows[start:start + batch_size]:
+                pool.append(r["instrumentKey"], r["ts_ms"], r["last_price"], r["ltq"], "bench", oi=r["oi"], volume=r["volume"])
+            ms, _ = timed(db.insert_tick_batch, pool.drain())
+            elapsed += ms
+        results[f"insert_tick_batch_{batch_size}"] = {"rows_per_sec": round(len(rows) / (elapsed / 1000), 1), "ms": round(elapsed, 1)}
+    return results
+
+
+def bench_options_insert(db, args):
+    """Latency of one full-chain insert_options_snapshot call (strikes x CE/PE) and of insert_pcr_history."""
+    snap_ms, pcr_ms = [], []
+    base = datetime.now(timezone.utc)
+    for n in range(args.repeat):
+        ts = base + timedelta(seconds=n)
+        chain = [{
+            "timestamp": ts, "underlying": "NSE:BENCH", "symbol": f"BENCH{s}{ot}", "expiry": None,
+            "strike": 25000 + s * 50, "option_type": ot, "oi": 1000 + s, "oi_change": s, "volume": 10 * s,
+            "ltp": 100.0, "iv": 0.15, "delta": 0.5, "gamma": 0.01, "theta": -1.0, "vega": 5.0,
+            "intrinsic_value": 0.0, "time_value": 100.0, "source": "bench"
+        } for s in range(args.strikes) for ot in ("call", "put")]
+        ms, _ = timed(db.insert_options_snapshot, chain)
+        snap_ms.append(ms)
+        ms, _ = timed(db.insert_pcr_history, {"timestamp": ts, "underlying": "NSE:BENCH", "pcr_oi": 1.0, "pcr_vol": 1.0})
+        pcr_ms.append(ms)
+    return {"insert_options_snapshot_ms": summarize(snap_ms), "insert_pcr_history_ms": summarize(pcr_ms)}
+
+
+def bench_endpoints(api_server, args):
+    from fastapi.testclient import TestClient
+
+    client = TestClient(api_server.fastapi_app)
+    underlying = UNDERLYINGS[0]
+    requests = {
+        "pcr_trend": ("GET", f"/api/options/pcr-trend/{underlying}", None),
+        "oi_analysis": ("GET", f"/api/options/oi-analysis/{underlying}", None),
+        "oi_trend_detailed": ("GET", f"/api/options/oi-trend-detailed/{underlying}", None),
+        "ticks_history_raw": ("GET", f"/api/ticks/history/{underlying}?limit=10000", None),
+        "ticks_history_bars_5m": ("GET", f"/api/ticks/history/{underlying}?interval=5&limit=500", None),
+        "ticks_history_bars_D": ("GET", f"/api/ticks/history/{underlying}?interval=D&limit=30", None),
+        "db_tables": ("GET", "/api/db/tables", None),
+        "db_query_daily_ohlc": ("POST", "/api/db/query", {"sql": f"""
+            SELECT date, min(price) AS low, max(price) AS high, sum(qty) AS volume
+            FROM ticks_all WHERE instrumentKey = '{underlying}' GROUP BY date ORDER BY date"""}),
+    }
+    results = {}
+    for name, (method, url, body) in requests.items():
+        samples = []
+        for n in range(args.repeat + 1):
+            api_server.pcr_cache.invalidate()
+            ms, resp = timed(client.request, method, url, json=body)
+            if resp.status_code != 200:
+                raise RuntimeError(f"{name}: HTTP {resp.status_code} {resp.text[:200]}")
+            if n:  # first run is warm-up
+                samples.append(ms)
+        results[name] = summarize(samples)
+    return results
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nComparison with {baseline_path} (commit {baseline.get('commit')}):")
+    print(f"{'metric':55} {'baseline':>12} {'current':>12} {'change':>9}")
+
+    def walk(cur, base, prefix=""):
+        for key, value in cur.items():
+            if key not in base:
+                continue
+            if isinstance(value, dict):
+                walk(value, base[key], f"{prefix}{key}.")
+            elif isinstance(value, (int, float)) and key in ("p50", "p95", "rows_per_sec", "ms", "rows"):
+                old = base[key]
+                change = (value - old) / old * 100 if old else 0.0
+                print(f"{prefix + key:55} {old:>12g} {value:>12g} {change:>+8.1f}%")
+
+    walk(current["results"], baseline.get("results", {}))
+
+
+def main():
+    args = parse_args()
+    tmpdir = tempfile.mkdtemp(prefix="bench_duckdb_")
+    if not args.db:
+        args.db = os.path.join(tmpdir, "bench.db")
+    # Must be set before the backend modules create the LocalDB singleton
+    os.environ["DUCKDB_PATH"] = args.db
+    os.environ["TICK_ARCHIVE_PATH"] = os.path.join(tmpdir, "tick_archive")
+    if not args.query_cache:
+        os.environ["QUERY_CACHE_MB"] = "0"
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+
+    # Keep the background maintenance loop from archiving or pruning the fixtures mid-run
+    import config
+    config.DATABASE_CONFIG.update({"hot_days": 0, "retention_days": 100000})
+
+    import duckdb
+    from db.local_db import db
+
+    days = trading_days(args.days)
+    results = {"fixtures": {}, "maintenance": {}}
+
+    ms, rows = timed(build_ticks, db, args, days)
+    results["fixtures"]["ticks"] = {"rows": rows, "ms": round(ms, 1), "rows_per_sec": round(rows / (ms / 1000), 1)}
+    ms, _ = timed(build_options, db, args, days)
+    snapshots = db.query("SELECT count(*) AS c FROM options_snapshots")[0]["c"]
+    results["fixtures"]["options"] = {"rows": int(snapshots), "ms": round(ms, 1)}
+
+    ms, _ = timed(db.rebuild_bars_1m)
+    results["maintenance"]["rebuild_bars_1m"] = {"ms": round(ms, 1)}
+    ms, _ = timed(db.optimize_storage)
+    results["maintenance"]["optimize_storage"] = {"ms": round(ms, 1)}
+    if args.archive:
+        ms, _ = timed(db.archive_sealed_days, 1)
+        results["maintenance"]["archive_sealed_days"] = {"ms": round(ms, 1)}
+
+    results["writes"] = bench_inserts(db, args)
+    results["writes"].update(bench_options_insert(db, args))
+
+    import api_server
+    results["endpoints"] = bench_endpoints(api_server, args)
+
+    from core import data_engine
+    data_engine.tick_writer.stop()
+
+    output = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "duckdb_version": duckdb.__version__,
+        "params": {k: getattr(args, k) for k in ("ticks", "instruments", "days", "strikes", "snapshot_every",
+                                                  "insert_rows", "repeat", "archive", "query_cache")},
+        "db_size_mb": round(os.path.getsize(args.db) / 2 ** 20, 1),
+        "results": results,
+    }
+    print(json.dumps(output, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+    if args.compare:
+        compare(output, args.compare)
+
+    shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from config import LOGGING_CONFIG
+
+# The DB singleton opens on import: point it, and the tick archive / instrument index
+# directories kept next to it, at a scratch directory before any test module is collected
+_SCRATCH = tempfile.mkdtemp(prefix='protrade_test_')
+os.environ['DUCKDB_PATH'] = os.path.join(_SCRATCH, 'test.db')
+os.environ['TICK_ARCHIVE_PATH'] = os.path.join(_SCRATCH, 'tick_archive')
+# api_server applies LOGGING_CONFIG on import; its file handler expects a logs/ directory
+LOGGING_CONFIG['handlers']['file']['filename'] = os.path.join(_SCRATCH, 'protrade.log')
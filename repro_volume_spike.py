@@ -22,21 +22,19 @@ from core.symbol_mapper import symbol_mapper
 data_engine.latest_total_volumes = {}
 data_engine.UPSTOX_INDEX_MAP = {"NSE:NIFTY": "NSE_INDEX|Nifty 50"}
 data_engine.last_processed_tick = {}
-data_engine.last_emit_times = {}
-data_engine.room_subscribers = {
-    ("NSE:NIFTY", "1"): {"sid1"},
-    ("NSE:NIFTY", "5"): {"sid1"}
-}
+data_engine.room_subscribers = data_engine.SubscriptionRegistry(interval_mapper=data_engine.get_upstream_interval)
+data_engine.room_subscribers.add("NSE:NIFTY", "1", "sid1")
+data_engine.room_subscribers.add("NSE:NIFTY", "5", "sid1")
 
 def test_volume_logic():
     inst = "NSE:NIFTY"
 
     # We need to capture the emitted events
     emitted = []
-    def mock_emit(event, data, room=None):
+    def mock_publish_keyed(event, room, key, value, merge=None):
         if event == 'raw_tick':
-            emitted.append(data)
-    data_engine.emit_event = mock_emit
+            emitted.append({key: value})
+    data_engine.emitter.publish_keyed = mock_publish_keyed
 
     print("Starting Multi-Interval Volume Logic Test...")
 
@@ -54,7 +52,6 @@ def test_volume_logic():
     print(f"Tick 1 (1m Candle 500): ltq={tick1['ltq']}, source={tick1['source']}")
     assert tick1['ltq'] == 1, "Expected ltq=1 (first tick index)"
 
-    data_engine.last_emit_times = {}
 
     # 2. 5m Interval update: Should NOT generate a tick (since 1m is primary)
     prev_emitted_count = len(emitted)
@@ -70,7 +67,6 @@ def test_volume_logic():
     assert len(emitted) == prev_emitted_count, "Expected NO raw_tick from 5m interval when 1m is active"
     print("Tick 2 (5m Candle): Correctly suppressed.")
 
-    data_engine.last_emit_times = {}
 
     # 3. 1m Interval update again: Should generate a delta from PREVIOUS 1m volume
     msg3 = {
@@ -87,8 +83,7 @@ def test_volume_logic():
     assert tick3['ltq'] == 10, f"Expected ltq=10, got {tick3['ltq']}"
 
     # 4. Remove 1m subscriber, now 5m is primary
-    del data_engine.room_subscribers[("NSE:NIFTY", "1")]
-    data_engine.last_emit_times = {}
+    data_engine.room_subscribers.remove("NSE:NIFTY", "1", "sid1")
 
     msg4 = {
         'type': 'chart_update',
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import sys
+
+# Add backend to sys.path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from core.api_cache import APICache
+
+
+def test_single_flight_survives_caller_cancellation():
+    async def run():
+        cache = APICache("test_single_flight", ttl_seconds=60)
+        calls = 0
+        release = asyncio.Event()
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return {"value": calls}
+
+        first = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+
+        # The caller that started the computation goes away; the other one still gets the result
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await second == {"value": 1}
+        assert first.cancelled()
+        assert calls == 1
+        assert cache.coalesced == 1
+        # The shared result was still cached
+        assert cache.get("k") == {"value": 1}
+
+    asyncio.run(run())
+
+
+def test_lru_eviction():
+    cache = APICache("test_lru", ttl_seconds=60, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" is now the most recently used
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_stale_while_revalidate():
+    async def run():
+        cache = APICache("test_swr", ttl_seconds=0.05, stale_seconds=5)
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return calls
+
+        assert await cache.get_or_compute("k", compute) == 1
+        await asyncio.sleep(0.06)
+
+        # Expired but within the stale window: the old value is served at once and
+        # concurrent stale hits start only one background refresh
+        assert await cache.get_or_compute("k", compute) == 1
+        assert await cache.get_or_compute("k", compute) == 1
+        assert cache.stale_hits == 2
+        await asyncio.sleep(0.03)
+
+        assert calls == 2
+        assert await cache.get_or_compute("k", compute) == 2
+        assert cache.hits == 1
+
+    asyncio.run(run())
+
+
+def test_errors_are_shared_but_not_cached():
+    async def run():
+        cache = APICache("test_errors", ttl_seconds=60)
+
+        async def compute():
+            await asyncio.sleep(0)
+            return {"status": "error"}
+
+        result = await cache.get_or_compute("k", compute, cacheable=lambda r: r.get("status") != "error")
+        assert result == {"status": "error"}
+        assert cache.get("k") is None
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_single_flight_survives_caller_cancellation()
+    test_lru_eviction()
+    test_stale_while_revalidate()
+    test_errors_are_shared_but_not_cached()
+    print("API cache tests passed")
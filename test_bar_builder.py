@@ -0,0 +1,122 @@
+import os
+import sys
+from concurrent.futures import Future
+
+# Add backend to sys.path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from core.bar_builder import BarBuilder, bar_start
+
+# 2026-10-16 09:15 IST, the session open
+SESSION_OPEN = 1792122300
+KEY = 'NSE_EQ|TEST'
+
+
+def test_bar_start_is_anchored_at_the_session_open():
+    assert bar_start(SESSION_OPEN + 59, '1') == SESSION_OPEN
+    assert bar_start(SESSION_OPEN + 16 * 60, '15') == SESSION_OPEN + 15 * 60
+    assert bar_start(SESSION_OPEN + 5 * 3600, 'D') == SESSION_OPEN
+
+
+def test_rollover_reports_the_closed_bar_then_the_new_one():
+    builder = BarBuilder(['1', '5'])
+    builder.update(KEY, SESSION_OPEN * 1000, 100, 1)
+    builder.update(KEY, (SESSION_OPEN + 10) * 1000, 102, 2)
+    builder.update(KEY, (SESSION_OPEN + 20) * 1000, 99, 3)
+
+    changes = dict(builder.update(KEY, (SESSION_OPEN + 60) * 1000, 101, 4))
+    assert changes['1'] == [[SESSION_OPEN, 100, 102, 99, 99, 6], [SESSION_OPEN + 60, 101, 101, 101, 101, 4]]
+    assert changes['5'] == [[SESSION_OPEN, 100, 102, 99, 101, 10]]
+    assert builder.get_bar(KEY, '5') == [SESSION_OPEN, 100, 102, 99, 101, 10]
+
+
+def test_partial_bars_are_held_back_without_a_seed():
+    builder = BarBuilder(['1', '5'])
+    # First tick mid-way through a 5m bar: only the 1m bar that opens with it is complete
+    changes = dict(builder.update(KEY, (SESSION_OPEN + 120) * 1000, 100, 1))
+    assert list(changes) == ['1']
+    assert dict(builder.update(KEY, (SESSION_OPEN + 300) * 1000, 101, 1))['5'] == [[SESSION_OPEN + 300, 101, 101, 101, 101, 1]]
+
+
+def test_seeded_bars_are_reported_once_the_seed_arrives():
+    requests, seeded = [], []
+    stored = Future()
+
+    def seed(instrument_key, start_ts, end_ts):
+        requests.append((instrument_key, start_ts, end_ts))
+        return stored
+
+    builder = BarBuilder(['1', '5', 'D'], seed=seed, on_seeded=lambda key, changes: seeded.append((key, dict(changes))))
+    # The seed is in flight: partially observed bars are held back, and ticks keep flowing
+    assert builder.update(KEY, (SESSION_OPEN + 70) * 1000, 107, 2) == []
+    assert builder.update(KEY, (SESSION_OPEN + 80) * 1000, 106, 1) == []
+    assert requests == [(KEY, SESSION_OPEN, SESSION_OPEN + 70)]
+
+    stored.set_result([[SESSION_OPEN, 100, 105, 98, 104, 10], [SESSION_OPEN + 60, 104, 106, 103, 105, 5]])
+    assert len(seeded) == 1
+    key, changes = seeded[0]
+    assert key == KEY
+    assert changes['1'] == [[SESSION_OPEN + 60, 104, 107, 103, 106, 8]]
+    assert changes['5'] == [[SESSION_OPEN, 100, 107, 98, 106, 18]]
+    assert changes['D'] == [[SESSION_OPEN, 100, 107, 98, 106, 18]]
+
+    # Seeded bars are complete, so later ticks are reported straight away
+    assert dict(builder.update(KEY, (SESSION_OPEN + 90) * 1000, 108, 1))['5'] == [[SESSION_OPEN, 100, 108, 98, 108, 19]]
+    assert len(requests) == 1
+
+
+def test_seed_for_a_rolled_over_bar_is_not_merged():
+    stored = Future()
+    seeded = []
+    builder = BarBuilder(['1', '5'], seed=lambda *args: stored, on_seeded=lambda key, changes: seeded.append(dict(changes)))
+    builder.update(KEY, (SESSION_OPEN + 70) * 1000, 107, 2)
+    builder.update(KEY, (SESSION_OPEN + 130) * 1000, 108, 1)
+
+    stored.set_result([[SESSION_OPEN + 60, 104, 106, 103, 105, 5]])
+    assert seeded[0]['1'] == [[SESSION_OPEN + 120, 108, 108, 108, 108, 1]]
+    assert seeded[0]['5'] == [[SESSION_OPEN, 104, 108, 103, 108, 8]]
+
+
+def test_failed_seed_falls_back_to_complete_bars_only():
+    stored = Future()
+    seeded = []
+    builder = BarBuilder(['1', '5'], seed=lambda *args: stored, on_seeded=lambda key, changes: seeded.append(changes))
+    assert list(dict(builder.update(KEY, (SESSION_OPEN + 120) * 1000, 100, 1))) == ['1']
+    stored.set_exception(RuntimeError("db unavailable"))
+    assert seeded == []
+    assert list(dict(builder.update(KEY, (SESSION_OPEN + 130) * 1000, 101, 1))) == ['1']
+
+
+def test_seed_arriving_after_discard_is_ignored():
+    stored = Future()
+    seeded = []
+    builder = BarBuilder(['1'], seed=lambda *args: stored, on_seeded=lambda key, changes: seeded.append(changes))
+    builder.update(KEY, (SESSION_OPEN + 70) * 1000, 107, 2)
+    builder.discard(KEY)
+    stored.set_result([[SESSION_OPEN + 60, 104, 106, 103, 105, 5]])
+    assert seeded == []
+    assert builder.instruments() == []
+
+
+def test_discard_and_idle_eviction_release_state():
+    builder = BarBuilder(['1'], max_idle_seconds=3600)
+    builder.update('nse_eq|a', SESSION_OPEN * 1000, 100, 1)
+    builder.update('NSE_EQ|B', SESSION_OPEN * 1000, 100, 1)
+    builder.discard('NSE_EQ|A')
+    assert builder.instruments() == ['NSE_EQ|B']
+
+    builder.update('NSE_EQ|C', (SESSION_OPEN + 2 * 3600) * 1000, 100, 1)
+    assert builder.instruments() == ['NSE_EQ|C']
+    assert builder.evicted == 1
+
+
+if __name__ == "__main__":
+    test_bar_start_is_anchored_at_the_session_open()
+    test_rollover_reports_the_closed_bar_then_the_new_one()
+    test_partial_bars_are_held_back_without_a_seed()
+    test_seeded_bars_are_reported_once_the_seed_arrives()
+    test_seed_for_a_rolled_over_bar_is_not_merged()
+    test_failed_seed_falls_back_to_complete_bars_only()
+    test_seed_arriving_after_discard_is_ignored()
+    test_discard_and_idle_eviction_release_state()
+    print("Bar builder tests passed")
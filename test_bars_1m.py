@@ -0,0 +1,82 @@
+import os
+import sys
+
+# Add backend to sys.path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from db.local_db import db
+from core.tick_buffer import TickBufferPool
+
+# 2026-10-16 09:15 IST
+SESSION_OPEN_MS = 1792122300000
+
+
+def flush(key, ticks):
+    """Writes (offset_ms, price, qty[, bid, ask]) ticks through the live batch path."""
+    pool = TickBufferPool()
+    for offset, price, qty, *quote in ticks:
+        bid, ask = quote or (float('nan'), float('nan'))
+        pool.append(key, SESSION_OPEN_MS + offset, price, qty, 'live', bid=bid, ask=ask)
+    db.insert_tick_batch(pool.drain())
+
+
+def bars(key):
+    return db.connections.reader().execute(
+        "SELECT ts, open, high, low, close, volume, ticks, buy_volume, sell_volume FROM bars_1m "
+        "WHERE instrumentKey = ? ORDER BY ts", (key,)
+    ).fetchall()
+
+
+def test_tick_rule_carries_across_flushes():
+    key = 'NSE_EQ|BARS_CARRY'
+    flush(key, [(0, 100, 1), (1000, 101, 2)])
+    # The first tick of the second flush is an uptick against the first flush;
+    # unchanged prices keep the direction of the last change (zero-tick rule)
+    flush(key, [(2000, 102, 4), (3000, 102, 8), (4000, 101, 16), (5000, 101, 32)])
+
+    assert bars(key) == [(SESSION_OPEN_MS // 1000, 100, 102, 100, 101, 63, 6, 14, 48)]
+
+
+def test_quotes_take_precedence_over_the_tick_rule():
+    key = 'NSE_EQ|BARS_QUOTE'
+    # At the ask is a buy and at the bid a sell, whatever the previous price
+    flush(key, [(0, 100, 1), (1000, 99, 5, 98, 99), (2000, 101, 7, 101, 102)])
+    assert bars(key)[0][-2:] == (5, 7)
+
+
+def test_bars_fold_into_minutes_and_rebuild_matches():
+    key = 'NSE_EQ|BARS_REBUILD'
+    flush(key, [(0, 100, 1), (30000, 103, 1), (61000, 102, 2)])
+    flush(key, [(62000, 104, 3), (125000, 90, 5)])
+    live = bars(key)
+    assert [b[:7] for b in live] == [
+        (SESSION_OPEN_MS // 1000, 100, 103, 100, 103, 2, 2),
+        (SESSION_OPEN_MS // 1000 + 60, 102, 104, 102, 104, 5, 2),
+        (SESSION_OPEN_MS // 1000 + 120, 90, 90, 90, 90, 5, 1),
+    ]
+
+    db.rebuild_bars_1m('2026-10-16')
+    assert bars(key) == live
+
+
+def test_seed_rows_stop_at_the_first_live_tick():
+    from core.data_engine import _stored_bars_1m
+
+    key = 'NSE_EQ|BARS_SEED'
+    open_sec = SESSION_OPEN_MS // 1000
+    flush(key, [(0, 100, 1), (30000, 103, 1), (61000, 102, 2), (65000, 104, 3)])
+    # Ticks from the first live tick (open + 70s) on are counted by the live bars
+    flush(key, [(70000, 110, 5), (75000, 95, 7)])
+
+    assert _stored_bars_1m(key, open_sec, open_sec + 70) == [
+        [open_sec, 100, 103, 100, 103, 2],
+        [open_sec + 60, 102, 104, 102, 104, 5],
+    ]
+
+
+if __name__ == "__main__":
+    test_tick_rule_carries_across_flushes()
+    test_quotes_take_precedence_over_the_tick_rule()
+    test_bars_fold_into_minutes_and_rebuild_matches()
+    test_seed_rows_stop_at_the_first_live_tick()
+    print("bars_1m tests passed")
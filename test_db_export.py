@@ -0,0 +1,47 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# Add backend to sys.path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from db.local_db import db
+from core.db_export import DBExporter, select_statement
+
+
+def test_only_a_single_select_is_exported():
+    assert select_statement("SELECT 'please update me' AS note").query == "SELECT 'please update me' AS note"
+    assert select_statement("WITH x AS (SELECT 1 AS a) SELECT * FROM x")
+    for sql in ("DELETE FROM export_probe RETURNING id",
+                "SELECT 1; CREATE VIEW export_probe_v AS SELECT 1",
+                "SELECT 1; COPY (SELECT 1) TO 'export_probe.csv'",
+                "SELECT 1; CHECKPOINT",
+                "SELECT 1; SET threads=1",
+                "SELEC 1"):
+        with pytest.raises(ValueError):
+            select_statement(sql)
+
+
+def test_write_is_rejected_before_it_runs():
+    db.execute("CREATE TABLE IF NOT EXISTS export_probe (id INTEGER)")
+    db.execute("DELETE FROM export_probe")
+    db.execute("INSERT INTO export_probe VALUES (1), (2)")
+    exporter = DBExporter()
+
+    async def export(sql):
+        stream = await exporter.open(sql, 'csv')
+        return b''.join([chunk async for chunk in stream.chunks()])
+
+    with pytest.raises(ValueError):
+        asyncio.run(export("SELECT 1; DELETE FROM export_probe"))
+    assert exporter.stats()['active'] == 0
+    assert asyncio.run(export("SELECT id FROM export_probe ORDER BY id")).split() == [b'"id"', b'1', b'2']
+    assert db.query("SELECT count(*) AS n FROM export_probe") == [{'n': 2}]
+
+
+if __name__ == "__main__":
+    test_only_a_single_select_is_exported()
+    test_write_is_rejected_before_it_runs()
+    print("DB export tests passed")
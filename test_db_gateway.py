@@ -0,0 +1,78 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+# Add backend to sys.path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from db.gateway import DBGateway, QueryTimeout, INTERACTIVE, SNAPSHOT, MAINTENANCE
+
+
+def test_queued_calls_run_by_priority():
+    gateway = DBGateway(workers=1)
+    release = threading.Event()
+    order = []
+    blocker = gateway.submit(release.wait)
+    time.sleep(0.05)
+
+    jobs = [gateway.submit(order.append, name, priority=priority)
+            for name, priority in (('maintenance', MAINTENANCE), ('snapshot', SNAPSHOT),
+                                   ('interactive', INTERACTIVE), ('snapshot-2', SNAPSHOT))]
+    release.set()
+    for job in [blocker] + jobs:
+        job.future.result(timeout=5)
+
+    # Equal priorities keep their submission order
+    assert order == ['interactive', 'snapshot', 'snapshot-2', 'maintenance']
+
+
+def test_background_jobs_leave_a_worker_for_interactive_reads():
+    gateway = DBGateway(workers=2, background_workers=1)
+    release = threading.Event()
+    running = []
+
+    def background(name):
+        running.append(name)
+        release.wait()
+
+    first = gateway.submit(background, 'first', priority=MAINTENANCE)
+    second = gateway.submit(background, 'second', priority=SNAPSHOT)
+    deadline = time.monotonic() + 5
+    while gateway.stats()['deferred'] != 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # The second background job is parked, so the other worker picks up the UI read
+    assert gateway.submit(lambda: 'ui').future.result(timeout=5) == 'ui'
+    assert len(running) == 1
+
+    release.set()
+    first.future.result(timeout=5)
+    second.future.result(timeout=5)
+    assert sorted(running) == ['first', 'second']
+
+
+def test_timed_out_query_is_interrupted():
+    gateway = DBGateway(workers=1)
+
+    async def run():
+        started = time.perf_counter()
+        try:
+            await gateway.query_arrow("SELECT count(*) FROM range(100000000000) a", timeout=0.3)
+        except QueryTimeout:
+            pass
+        else:
+            raise AssertionError("expected QueryTimeout")
+        # The interrupted worker is free again right away
+        assert (await gateway.query_arrow("SELECT 42 AS answer")).column('answer').to_pylist() == [42]
+        assert time.perf_counter() - started < 10
+
+    asyncio.run(run())
+    assert gateway.timed_out[INTERACTIVE] == 1
+
+
+if __name__ == "__main__":
+    test_queued_calls_run_by_priority()
+    test_background_jobs_leave_a_worker_for_interactive_reads()
+    test_timed_out_query_is_interrupted()
+    print("DB gateway tests passed")
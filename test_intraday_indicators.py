@@ -0,0 +1,166 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add backend to sys.path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from core.intraday_indicators import IndicatorState, EMALine, indicator_registry, intraday_indicator_ids, INTRADAY_INDICATORS
+from brain.VolumeAnalyzer import VolumeAnalyzer
+from brain.MarketPsychologyAnalyzer import MarketPsychologyAnalyzer
+
+# 2026-10-16 09:15 IST
+SESSION_OPEN = 1792122300
+ENGINE_IDS = ['ema_9', 'ema_20', 'psych_signals', 'volume_bubbles', 'volume_nodes', 'volume_rays', 'evwma', 'dyn_pivot', 'rvol']
+# Indicators whose values on a bar depend only on a bounded trailing window, so a slid state
+# must agree with a rebuild (EMAs and EVWMA continue from their earlier seed instead)
+WINDOWED_IDS = ['volume_bubbles', 'volume_nodes', 'volume_rays', 'dyn_pivot', 'battle_zones']
+# Bars a rebuild needs before every windowed indicator has a full lookback (bubble_long_len)
+WARMUP = 100
+
+
+def make_candles(n, seed=7, start=SESSION_OPEN):
+    """Random-walk 1m candles with periodic absorption bars (volume spike, almost no range)."""
+    rng = np.random.default_rng(seed)
+    candles, price = [], 100.0
+    for i in range(n):
+        o = price
+        c = o + rng.normal(0, 0.3)
+        spread = abs(rng.normal(0, 0.4))
+        v = float(rng.integers(800, 1200))
+        if i % 37 == 0:
+            v *= 6 if i % 111 else 20
+            c = o + rng.choice([-0.05, 0.05])
+            spread = 0.05
+        h = max(o, c) + spread
+        l = min(o, c) - spread * rng.uniform(0.2, 2)
+        candles.append([start + 60 * i, round(o, 2), round(h, 2), round(l, 2), round(c, 2), v])
+        price = c
+    return candles
+
+
+def by_id(outputs):
+    return {o['id']: o for o in outputs}
+
+
+def since(points, t):
+    return [p for p in points if p.get('time', t) >= t]
+
+
+def assert_line_close(actual, expected):
+    assert [p['time'] for p in actual] == [p['time'] for p in expected]
+    np.testing.assert_allclose([p['value'] for p in actual], [p['value'] for p in expected], rtol=1e-9)
+
+
+def test_compute_matches_the_analyzers():
+    candles = make_candles(400)
+    outputs, rvol = IndicatorState().compute(candles, ENGINE_IDS)
+    out = by_id(outputs)
+
+    vol = VolumeAnalyzer().analyze(candles)
+    assert vol['markers'] and vol['lines'] and vol['volume_rays']
+    assert out['volume_bubbles']['data'] == vol['markers']
+    assert out['volume_nodes']['data'] == vol['lines']
+    assert out['volume_rays']['data'] == vol['volume_rays']
+    assert_line_close(out['evwma']['data'], vol['evwma'])
+    assert_line_close(out['dyn_pivot']['data'], vol['dyn_pivot'])
+    np.testing.assert_allclose(rvol, vol['rvol'], rtol=1e-12)
+
+    close = pd.Series([c[4] for c in candles])
+    for span in (9, 20):
+        ema = close.ewm(span=span, adjust=False).mean()
+        expected = [{"time": candles[i][0], "value": float(ema[i])} for i in range(span - 1, len(candles))]
+        assert_line_close(out[f'ema_{span}']['data'], expected)
+
+    zones, signals = MarketPsychologyAnalyzer().analyze(candles)
+    assert zones and signals
+    assert [(m['time'], m['text']) for m in out['psych_signals']['data']] == \
+        [(int(ts.timestamp()), sig_type) for ts, sig_type in signals.items()]
+    state_zones = by_id(IndicatorState().compute(candles, ['battle_zones'])[0])['battle_zones']['data']
+    assert [z['price'] for z in state_zones] == [z['price'] for z in zones]
+
+
+def test_amended_last_candle_matches_a_rebuild():
+    candles = make_candles(300)
+    state = IndicatorState()
+    state.compute(candles, ENGINE_IDS)
+
+    amended = candles[:-1] + [candles[-1][:4] + [candles[-1][4] + 0.1, candles[-1][5] * 30]]
+    assert state.update(amended, ENGINE_IDS) == len(candles) - 1
+    # Same window start, so even the seeded indicators agree with a from-scratch state
+    assert state.outputs(ENGINE_IDS) == IndicatorState().compute(amended, ENGINE_IDS)[0]
+    # Only the initial build started from scratch
+    assert state.resets == 1
+
+
+def test_slid_window_matches_a_rebuild():
+    candles = make_candles(320)
+    state = IndicatorState()
+    state.compute(candles[:300], ENGINE_IDS + ['battle_zones'])
+
+    window = candles[5:305]
+    assert state.update(window, ENGINE_IDS) == 295
+    assert state.resets == 1
+    fresh = IndicatorState()
+    fresh.compute(window, ENGINE_IDS + ['battle_zones'])
+    # The slid state keeps values on the first bars, where a rebuild is still warming up
+    warm = window[WARMUP][0]
+    slid, rebuilt = by_id(state.outputs(WINDOWED_IDS)), by_id(fresh.outputs(WINDOWED_IDS))
+    assert rebuilt.keys() == set(WINDOWED_IDS)
+    for indicator_id in ('volume_bubbles', 'volume_nodes', 'volume_rays', 'battle_zones'):
+        assert since(slid[indicator_id]['data'], warm) == since(rebuilt[indicator_id]['data'], warm)
+    assert_line_close(since(slid['dyn_pivot']['data'], warm), since(rebuilt['dyn_pivot']['data'], warm))
+    np.testing.assert_allclose(state.rvol()[WARMUP:], fresh.rvol()[WARMUP:], rtol=1e-12)
+
+
+def test_window_that_does_not_line_up_resets_the_state():
+    state = IndicatorState()
+    state.compute(make_candles(300), ENGINE_IDS)
+
+    shifted = make_candles(300, seed=11, start=SESSION_OPEN + 30)
+    assert state.update(shifted, ENGINE_IDS) == 0
+    assert state.resets == 2
+    assert state.outputs(ENGINE_IDS) == IndicatorState().compute(shifted, ENGINE_IDS)[0]
+
+
+def test_registry_resolves_requirements_first():
+    assert indicator_registry.resolve(['psych_signals']) == ['battle_zones', 'psych_signals']
+    assert indicator_registry.resolve(['volume_rays', 'ema_9']) == ['rvol', 'volume_bubbles', 'volume_rays', 'ema_9']
+    # Requirements already listed are not repeated
+    assert indicator_registry.resolve(['rvol', 'volume_bubbles', 'rvol']) == ['rvol', 'volume_bubbles']
+
+
+def test_registry_ema_family_and_unknown_ids():
+    assert indicator_registry.class_for('ema_34') is EMALine
+    for bad in ('ema_', 'ema_0', 'ema_x', 'vwap'):
+        with pytest.raises(ValueError):
+            indicator_registry.class_for(bad)
+    with pytest.raises(ValueError):
+        indicator_registry.resolve(['rvol', 'vwap'])
+
+
+def test_intraday_indicator_ids_parsing():
+    assert intraday_indicator_ids() == ['ema_9', 'ema_20', *INTRADAY_INDICATORS]
+    assert intraday_indicator_ids(None, 12, 50)[:2] == ['ema_12', 'ema_50']
+    # Comma-separated query string: trimmed, empty entries and duplicates dropped, order kept
+    assert intraday_indicator_ids(' rvol, ema_34,,rvol ,symmetry_signals') == ['rvol', 'ema_34', 'symmetry_signals']
+    assert intraday_indicator_ids(['volume_rays', 'ema_9']) == ['volume_rays', 'ema_9']
+
+
+def test_intraday_indicator_ids_rejects_unknown_ids():
+    with pytest.raises(ValueError):
+        intraday_indicator_ids('ema_9,vwap')
+
+
+def test_intraday_endpoint_rejects_unknown_indicators():
+    # api_server brings up the whole app on import, so only the test that needs it pulls it in
+    import asyncio
+    from fastapi import HTTPException
+    from api_server import get_intraday
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(get_intraday('NSE:NIFTY', indicators='ema_9,vwap'))
+    assert exc.value.status_code == 400
@@ -0,0 +1,73 @@
+import os
+import sys
+
+# Add backend to sys.path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from db.local_db import db
+from db.query_cache import QueryCache, referenced_tables
+
+
+def test_referenced_tables():
+    assert referenced_tables("SELECT * FROM ticks t JOIN metadata m ON t.instrumentKey = m.instrument_key") == {'ticks', 'metadata'}
+    assert referenced_tables("SELECT * FROM ticks AS t, bars_1m b WHERE t.ts_ms = b.ts") == {'ticks', 'bars_1m'}
+    assert referenced_tables("SELECT * FROM (SELECT * FROM ticks) sub, metadata") == {'ticks', 'metadata'}
+    assert referenced_tables("SELECT * FROM main.ticks") == {'ticks'}
+    # catalog.schema.table cannot be resolved safely
+    assert referenced_tables("SELECT * FROM other.main.ticks") is None
+
+
+def test_only_deterministic_reads_are_cacheable():
+    cache = QueryCache()
+    assert cache.tables_for("SELECT * FROM ticks_all") == ('tick_archive', 'ticks')
+    assert cache.tables_for("SELECT now(), * FROM ticks") is None
+    assert cache.tables_for("DELETE FROM ticks") is None
+    assert cache.tables_for("WITH x AS (SELECT 1) INSERT INTO ticks SELECT * FROM x") is None
+    assert QueryCache.write_targets("UPDATE metadata SET hrn = 'X'") == ('metadata',)
+
+
+def test_only_a_single_select_is_a_read():
+    assert QueryCache.is_read("SELECT 'please update me' AS note")
+    assert QueryCache.is_read("WITH x AS (SELECT 1) SELECT * FROM x")
+    assert QueryCache.is_read("FROM ticks")
+    for sql in ("DELETE FROM ticks RETURNING *",
+                "SELECT 1; CREATE VIEW cache_probe_v AS SELECT 1",
+                "SELECT 1; COPY (SELECT 1) TO 'cache_probe.csv'",
+                "SELECT 1; CHECKPOINT",
+                "SELECT 1; SET threads=1",
+                "SELEC 1"):
+        assert not QueryCache.is_read(sql)
+
+
+def test_write_invalidates_cached_reads():
+    db.execute("CREATE TABLE IF NOT EXISTS cache_probe (id INTEGER, label VARCHAR)")
+    db.execute("DELETE FROM cache_probe")
+    db.execute("INSERT INTO cache_probe VALUES (1, 'a')")
+
+    sql = "SELECT count(*) AS n FROM cache_probe"
+    assert db.query(sql) == [{'n': 1}]
+    hits = db.cache.hits
+    assert db.query(sql) == [{'n': 1}]
+    assert db.cache.hits == hits + 1
+
+    # A write sent through query() runs on the writer and bumps the table afterwards
+    acquisitions = db.connections.acquisitions
+    db.query("INSERT INTO cache_probe VALUES (2, 'b')")
+    assert db.connections.acquisitions == acquisitions + 1
+    assert db.query(sql) == [{'n': 2}]
+    assert db.query_arrow(sql).column('n').to_pylist() == [2]
+
+    db.query_arrow("DELETE FROM cache_probe WHERE id = 1")
+    assert db.query(sql) == [{'n': 1}]
+
+    # A write hidden behind a SELECT in a multi-statement string goes through the writer too
+    db.query("SELECT 1; INSERT INTO cache_probe VALUES (3, 'c')")
+    assert db.query(sql) == [{'n': 2}]
+
+
+if __name__ == "__main__":
+    test_referenced_tables()
+    test_only_deterministic_reads_are_cacheable()
+    test_only_a_single_select_is_a_read()
+    test_write_invalidates_cached_reads()
+    print("Query cache tests passed")
@@ -0,0 +1,64 @@
+import os
+import sys
+
+# Add backend to sys.path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from core.subscription_registry import SubscriptionRegistry
+
+KEY = 'NSE:NIFTY'
+
+
+def test_primary_interval_hands_over_to_the_next_smallest():
+    registry = SubscriptionRegistry()
+    registry.add(KEY, '5', 'a')
+    assert registry.primary_interval(KEY) == '5'
+    registry.add(KEY, '1', 'b')
+    registry.add(KEY, 'D', 'c')
+    assert registry.primary_interval(KEY) == '1'
+
+    # The 1m chart closes: the 5m session becomes the tick source
+    assert registry.remove(KEY, '1', 'b') == 0
+    assert registry.primary_interval(KEY) == '5'
+    registry.remove(KEY, '5', 'a')
+    assert registry.primary_interval(KEY) == 'D'
+    registry.remove(KEY, 'D', 'c')
+    assert registry.primary_interval(KEY, default='none') == 'none'
+    assert len(registry) == 0
+
+
+def test_primary_interval_follows_the_upstream_mapping():
+    # Intervals served from a shared upstream session count as that session
+    registry = SubscriptionRegistry(interval_mapper=lambda interval: '1' if interval in ('3', '5') else interval)
+    registry.add(KEY, '5', 'a')
+    registry.add(KEY, '3', 'b')
+    assert registry.primary_interval(KEY) == '1'
+    registry.remove(KEY, '5', 'a')
+    assert registry.primary_interval(KEY) == '1'
+    registry.add(KEY, '15', 'c')
+    registry.remove(KEY, '3', 'b')
+    assert registry.primary_interval(KEY) == '15'
+
+
+def test_sid_index_stays_in_step():
+    registry = SubscriptionRegistry()
+    assert registry.add(KEY, '1', 'a') == 1
+    assert registry.add(KEY, '1', 'b') == 2
+    registry.add('NSE:BANKNIFTY', '5', 'a')
+
+    assert sorted(registry.keys_for_sid('a')) == [('NSE:BANKNIFTY', '5'), (KEY, '1')]
+    assert registry.is_sid_using('a', KEY)
+    assert (KEY, '1') in registry
+    assert registry.remove(KEY, '1', 'missing') is None
+
+    registry.remove(KEY, '1', 'a')
+    assert not registry.is_sid_using('a', KEY)
+    assert registry.sids(KEY, '1') == {'b'}
+    assert registry.keys_for_sid('a') == [('NSE:BANKNIFTY', '5')]
+
+
+if __name__ == "__main__":
+    test_primary_interval_hands_over_to_the_next_smallest()
+    test_primary_interval_follows_the_upstream_mapping()
+    test_sid_index_stays_in_step()
+    print("Subscription registry tests passed")
@@ -0,0 +1,74 @@
+import os
+import sys
+
+# Add backend to sys.path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from db.local_db import db
+
+
+def make_ticks(key, date, start_ms, prices):
+    return [{'instrumentKey': key, 'date': date, 'ts_ms': start_ms + i * 1000, 'last_price': p, 'ltq': 1}
+            for i, p in enumerate(prices)]
+
+
+def archived_rows(key):
+    return db.connections.reader().execute(
+        "SELECT count(*) FROM ticks_all WHERE instrumentKey = ?", (key,)
+    ).fetchone()[0]
+
+
+def test_late_ticks_are_added_to_an_archived_day():
+    key, date = 'NSE_EQ|ARCHIVE_LATE', '2020-03-02'
+    start = 1583120000000
+    db.insert_ticks(make_ticks(key, date, start, [100, 101, 102]))
+    assert db.archive_day(date) == 3
+    db.refresh_ticks_view()
+    assert archived_rows(key) == 3
+
+    # A straggler for the sealed day is archived next to the existing rows
+    db.insert_ticks(make_ticks(key, date, start + 60000, [103]))
+    assert db.archive_day(date) == 1
+    db.refresh_ticks_view()
+    assert archived_rows(key) == 4
+    assert db.connections.reader().execute("SELECT count(*) FROM ticks WHERE date = ?", (date,)).fetchone()[0] == 0
+
+    # An explicit re-export replaces the partition
+    db.insert_ticks(make_ticks(key, date, start + 120000, [104, 105]))
+    assert db.archive_day(date, replace=True) == 2
+    db.refresh_ticks_view()
+    assert archived_rows(key) == 2
+
+
+def test_ticks_all_unions_hot_and_archived_rows():
+    key = 'NSE_EQ|ARCHIVE_UNION'
+    db.insert_ticks(make_ticks(key, '2020-03-03', 1583206400000, [10, 11]))
+    db.archive_day('2020-03-03')
+    db.insert_ticks(make_ticks(key, '2020-03-04', 1583292800000, [12, 13, 14]))
+    db.refresh_ticks_view()
+
+    rows = db.connections.reader().execute(
+        "SELECT CAST(date AS VARCHAR), count(*) FROM ticks_all WHERE instrumentKey = ? GROUP BY ALL ORDER BY 1", (key,)
+    ).fetchall()
+    assert rows == [('2020-03-03', 2), ('2020-03-04', 3)]
+    assert '2020-03-03' in db.archived_dates()
+
+
+def test_retention_drops_archived_partitions_and_hot_rows():
+    key = 'NSE_EQ|ARCHIVE_RETENTION'
+    db.insert_ticks(make_ticks(key, '2020-03-05', 1583379200000, [1, 2]))
+    db.archive_day('2020-03-05')
+    db.insert_ticks(make_ticks(key, '2020-03-06', 1583465600000, [3]))
+    db.refresh_ticks_view()
+    assert archived_rows(key) == 3
+
+    db.cleanup_old_data(days=30)
+    assert '2020-03-05' not in db.archived_dates()
+    assert archived_rows(key) == 0
+
+
+if __name__ == "__main__":
+    test_late_ticks_are_added_to_an_archived_day()
+    test_ticks_all_unions_hot_and_archived_rows()
+    test_retention_drops_archived_partitions_and_hot_rows()
+    print("Tick archive tests passed")
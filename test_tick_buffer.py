@@ -0,0 +1,77 @@
+import os
+import sys
+
+# Add backend to sys.path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from core.tick_buffer import TickBufferPool
+
+
+def add(pool, key, ts_ms, price, raw=None):
+    return pool.append(key, ts_ms, price, 1, 'live', raw=raw)
+
+
+def test_drain_groups_rows_by_instrument_in_time_order():
+    pool = TickBufferPool(initial_capacity=2, max_capacity=16)
+    for i in range(5):
+        add(pool, 'A', 1000 + i, 100 + i)
+    add(pool, 'B', 2000, 50)
+
+    batch = pool.drain()
+    assert batch.instrument_keys == ['A', 'B']
+    assert batch.ts_ms.tolist() == [1000, 1001, 1002, 1003, 1004, 2000]
+    assert pool.drain() is None
+
+
+def test_requeued_rows_go_back_ahead_of_newer_ticks():
+    pool = TickBufferPool(initial_capacity=4, max_capacity=16)
+    add(pool, 'A', 1000, 100)
+    add(pool, 'A', 1001, 101)
+    add(pool, 'B', 1000, 50)
+    failed = pool.drain()
+
+    # Ticks that arrived while the flush was failing
+    add(pool, 'A', 1002, 102)
+    pool.requeue(failed)
+    assert len(pool) == 4
+
+    batch = pool.drain()
+    assert batch.instrument_keys == ['A', 'B']
+    assert batch.ts_ms.tolist() == [1000, 1001, 1002, 1000]
+    assert batch.price.tolist() == [100, 101, 102, 50]
+
+
+def test_requeue_never_evicts_newer_ticks():
+    pool = TickBufferPool(initial_capacity=4, max_capacity=4, overflow='drop_oldest')
+    for i in range(3):
+        add(pool, 'A', 1000 + i, 100)
+    failed = pool.drain()
+    for i in range(2):
+        add(pool, 'A', 2000 + i, 200)
+
+    pool.requeue(failed)
+    # Room for two of the three requeued rows: the oldest one is dropped
+    assert pool.drain().ts_ms.tolist() == [1001, 1002, 2000, 2001]
+    assert pool.overwritten == 1
+
+
+def test_raw_payloads_follow_their_rows():
+    pool = TickBufferPool(initial_capacity=2, max_capacity=16, keep_raw=True)
+    # Two ticks in the same millisecond keep their own payloads
+    add(pool, 'A', 1000, 100, raw={'n': 1})
+    add(pool, 'A', 1000, 101, raw={'n': 2})
+    add(pool, 'A', 1001, 102)
+    failed = pool.drain()
+    assert failed.raw == [('A', 1000, {'n': 1}), ('A', 1000, {'n': 2})]
+
+    add(pool, 'A', 1002, 103, raw={'n': 3})
+    pool.requeue(failed)
+    assert pool.drain().raw == [('A', 1000, {'n': 1}), ('A', 1000, {'n': 2}), ('A', 1002, {'n': 3})]
+
+
+if __name__ == "__main__":
+    test_drain_groups_rows_by_instrument_in_time_order()
+    test_requeued_rows_go_back_ahead_of_newer_ticks()
+    test_requeue_never_evicts_newer_ticks()
+    test_raw_payloads_follow_their_rows()
+    print("Tick buffer tests passed")